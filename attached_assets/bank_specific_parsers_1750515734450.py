@@ -1,36 +1,149 @@
 # bank_specific_parsers.py
 
 import re
+from collections.abc import Iterable
 from datetime import datetime
 import pandas as pd
 
 # Importa as funções auxiliares de parsing de data e valor
-# from data_parsing import parse_date_string, parse_financial_value, _identificar_tipo_transacao_simples
-
-
-def parse_nubank_extrato_pdf(text_content: str, doc_type: str) -> list[dict]:
+# from data_parsing import parse_date_string, parse_financial_value, _identificar_tipo_transacao_simples, registrar_padrao, ParserDatasDocumento
+
+# Padrões compilados uma vez, na carga do módulo (ver data_parsing.REGISTRO_PADROES)
+# Padrão Nubank: DD/MM - Descrição - R$ VALOR (pode haver saldo no final da linha)
+_RE_NUBANK_EXTRATO = registrar_padrao('nubank_extrato', r'(\d{1,2}/\d{1,2})\s+-\s+(.+?)\s+-\s*R?\$?\s*([-]?[\d\.,]+)(?:\s+Saldo R?\$?\s*[\d\.,]+)?')
+_RE_C6_FATURA_COMPRA = registrar_padrao('c6_fatura_compra', r'(\d{1,2}\s+[A-Za-z]{3,})\s+(.+?)\s+R?\$?\s*([\d\.,]+)', re.IGNORECASE)
+_RE_C6_TABULAR_EXTRATO = registrar_padrao('c6_tabular_extrato', r'(\d{2}/\d{2})\s+(Entrada PIX|Saida PIX|Débito de Cartão|Pagamento|Outros gastos)\s+(.+?)\s+(R\$?\s*[-]?[\d\.,]+)', re.IGNORECASE)
+# Linhas de cabeçalho, rodapé e resumos da fatura C6 que não são transações individuais
+_RE_C6_LINHAS_IGNORADAS = registrar_padrao('c6_linhas_ignoradas', '|'.join(re.escape(termo) for termo in [
+    'saldo total', 'limite total', 'vencimento', 'pagamento mínimo',
+    'c6 black', 'subtotal', 'total a pagar', 'parcelamento de fatura',
+    'juros rotativo', 'cet do financiamento', 'iof do rotativo', 'encargos', 'impostos',
+    'compras nacionais', 'compras internacionais', 'valores creditados'
+]))
+_RE_DIGITO = registrar_padrao('digito', r'\d')
+
+# --- Registro declarativo de parsers por banco ---
+# Cada parser declara banco, tipo de documento, tipos de arquivo e uma impressão digital de conteúdo
+# barata: cabeçalhos (textos que aparecem no início do documento) ou o conjunto de colunas da tabela.
+# O despacho usa tabelas de consulta montadas a partir do registro, então o custo não cresce com o
+# número de parsers, e a impressão digital encaminha corretamente arquivos com nome enganoso.
+
+REGISTRO_PARSERS: list[dict] = []
+_DESPACHO_PARSERS = None # Tabelas de consulta, montadas sob demanda a partir de REGISTRO_PARSERS
+# Só o início do texto é comparado com os cabeçalhos: custo constante, qualquer que seja o tamanho do documento
+CARACTERES_IMPRESSAO_DIGITAL = 4096
+
+def registrar_parser(funcao, nome: str, banco: str, doc_type: str, tipos_arquivo: tuple[str, ...],
+                     cabecalhos: tuple[str, ...] = (), colunas: tuple[str, ...] = ()):
+    """
+    Registra um parser. Parsers de 'pdf' recebem o texto (ou linhas) e devolvem list[dict]; os de
+    'csv'/'xlsx' recebem um DataFrame por tabela e devolvem um DataFrame.
+    :param cabecalhos: Textos (sem diferenciar maiúsculas) que, todos presentes no início do documento, o identificam.
+    :param colunas: Colunas que, todas presentes na tabela, a identificam. Deixar vazio quando forem genéricas
+                    demais (ex.: só Data/Descrição/Valor), para não desviar CSVs de outros bancos.
+    """
+    global _DESPACHO_PARSERS
+    REGISTRO_PARSERS.append({
+        'funcao': funcao, 'nome': nome, 'banco': banco, 'doc_type': doc_type,
+        'tipos_arquivo': tuple(tipos_arquivo),
+        'cabecalhos': tuple(cabecalho.lower() for cabecalho in cabecalhos),
+        'colunas': tuple(colunas),
+    })
+    _DESPACHO_PARSERS = None
+    return funcao
+
+def _obter_despacho_parsers() -> dict:
+    """
+    Monta (uma vez por versão do registro) as tabelas de consulta:
+    - por_nome: (tipo de arquivo, doc_type, banco) -> parser, para o caminho pelo nome do arquivo;
+    - cabecalhos/colunas: índice invertido impressão -> posições dos parsers que a exigem, e uma única
+      regex com todos os cabeçalhos, para achar os candidatos numa só varredura do texto.
+    """
+    global _DESPACHO_PARSERS
+    if _DESPACHO_PARSERS is None:
+        por_nome, por_cabecalho, por_coluna = {}, {}, {}
+        for posicao, parser in enumerate(REGISTRO_PARSERS):
+            for tipo_arquivo in parser['tipos_arquivo']:
+                por_nome.setdefault((tipo_arquivo, parser['doc_type'], parser['banco']), parser)
+            for cabecalho in parser['cabecalhos']:
+                por_cabecalho.setdefault(cabecalho, []).append(posicao)
+            for coluna in parser['colunas']:
+                por_coluna.setdefault(coluna, []).append(posicao)
+        # Cabeçalhos mais longos primeiro, para que um cabeçalho que contém outro não seja encoberto
+        cabecalhos = sorted(por_cabecalho, key=len, reverse=True)
+        _DESPACHO_PARSERS = {
+            'por_nome': por_nome,
+            'por_cabecalho': por_cabecalho,
+            'por_coluna': por_coluna,
+            're_cabecalhos': re.compile('|'.join(re.escape(c) for c in cabecalhos)) if cabecalhos else None,
+        }
+    return _DESPACHO_PARSERS
+
+def _parser_por_impressao(encontradas, indice: dict, campo: str, tipo_arquivo: str) -> dict | None:
+    """Parser cujas impressões exigidas estão todas em `encontradas`; o mais específico (mais impressões) vence."""
+    contagem = {}
+    for impressao in encontradas:
+        for posicao in indice.get(impressao, ()):
+            contagem[posicao] = contagem.get(posicao, 0) + 1
+    melhor = None
+    for posicao, quantidade in contagem.items():
+        parser = REGISTRO_PARSERS[posicao]
+        if quantidade == len(parser[campo]) and tipo_arquivo in parser['tipos_arquivo']:
+            if melhor is None or quantidade > len(melhor[campo]):
+                melhor = parser
+    return melhor
+
+def selecionar_parser(file_type: str, doc_type: str, bank_name: str, text_content: str | None = None,
+                      table: pd.DataFrame | None = None) -> dict | None:
+    """
+    Escolhe o parser registrado para um documento (PDF, pelo texto) ou uma tabela (CSV/XLSX).
+    A impressão digital do conteúdo tem prioridade; sem ela, vale o banco/tipo detectado pelo nome do arquivo.
+    Colunas dizem menos que cabeçalhos: uma tabela reconhecida só pelas colunas não troca um doc_type já
+    detectado por outro (ex.: um extrato não vira fatura por ter as colunas de um parser de fatura).
+    Retorna o registro do parser (ver registrar_parser) ou None.
+    """
+    despacho = _obter_despacho_parsers()
+    parser = None
+    if table is not None and despacho['por_coluna']:
+        colunas = {str(coluna).strip() for coluna in table.columns}
+        parser = _parser_por_impressao(colunas, despacho['por_coluna'], 'colunas', file_type)
+        if parser is not None and doc_type not in ('desconhecido', parser['doc_type']):
+            parser = None
+    elif text_content and despacho['re_cabecalhos'] is not None:
+        inicio = text_content[:CARACTERES_IMPRESSAO_DIGITAL].lower()
+        parser = _parser_por_impressao(set(despacho['re_cabecalhos'].findall(inicio)), despacho['por_cabecalho'], 'cabecalhos', file_type)
+    return parser or despacho['por_nome'].get((file_type, doc_type, bank_name))
+
+
+def _linhas_do_texto(text_content: str | Iterable[str]) -> Iterable[str]:
+    """Aceita o texto inteiro ou um iterável de linhas (ex.: file_io_utils.iter_pdf_lines, página a página)."""
+    return text_content.split('\n') if isinstance(text_content, str) else text_content
+
+def parse_nubank_extrato_pdf(text_content: str | Iterable[str], doc_type: str) -> list[dict]:
     """
     Parser específico para extratos do Nubank em PDF (texto extraído via pdfplumber ou OCR).
     Adapta a saída para o formato de transação padrão do sistema.
+    Aceita o texto inteiro ou as linhas geradas incrementalmente por iter_pdf_lines.
     """
     transactions = []
-    lines = text_content.split('\n')
-    current_year = datetime.now().year
+    lines = _linhas_do_texto(text_content)
+    parse_date = ParserDatasDocumento() # Formato vencedor e não-datas memorizados por documento
 
     for line in lines:
+        # Pré-filtro: o padrão exige "/" na data e "-" como separador
+        if '/' not in line or '-' not in line:
+            continue
         line_clean = line.strip()
-        # Padrão Nubank: DD/MM - Descrição - R$ VALOR (pode haver saldo no final da linha)
         # Ex: 12/03 - Pix recebido de FULANO - R$ 20.000,00 Saldo R$ 5.851,34
         # Padrão flexível para capturar o valor corretamente, com ou sem "R$"
-        padrao_nubank = r'(\d{1,2}/\d{1,2})\s+-\s+(.+?)\s+-\s*R?\$?\s*([-]?[\d\.,]+)(?:\s+Saldo R?\$?\s*[\d\.,]+)?'
-        match = re.search(padrao_nubank, line_clean)
+        match = _RE_NUBANK_EXTRATO.search(line_clean)
 
         if match:
             data_raw = match.group(1)
             description = match.group(2).strip()
             value_str = match.group(3)
 
-            date_obj = parse_date_string(data_raw, current_year)
+            date_obj = parse_date(data_raw)
             value_num = parse_financial_value(value_str)
 
             if date_obj is None or value_num is None:
@@ -54,25 +167,24 @@ def parse_nubank_extrato_pdf(text_content: str, doc_type: str) -> list[dict]:
             })
     return transactions
 
-def parse_c6_fatura_pdf(text_content: str, doc_type: str) -> list[dict]:
+def parse_c6_fatura_pdf(text_content: str | Iterable[str], doc_type: str) -> list[dict]:
     """
     Parser específico para faturas do C6 Bank em PDF (texto extraído via pdfplumber ou OCR).
     Adapta a saída para o formato de transação padrão do sistema.
+    Aceita o texto inteiro ou as linhas geradas incrementalmente por iter_pdf_lines.
     """
     transactions = []
-    lines = text_content.split('\n')
-    current_year = datetime.now().year
+    lines = _linhas_do_texto(text_content)
+    parse_date = ParserDatasDocumento() # Formato vencedor e não-datas memorizados por documento
     
     for line in lines:
+        # Pré-filtro: os dois padrões de transação exigem dígitos (data e valor)
+        if not _RE_DIGITO.search(line):
+            continue
         line_clean = line.strip()
         
         # Ignorar linhas de cabeçalho, rodapé e resumos que não são transações individuais de compra/crédito
-        if any(keyword in line_clean.lower() for keyword in [
-            'saldo total', 'limite total', 'vencimento', 'pagamento mínimo',
-            'c6 black', 'subtotal', 'total a pagar', 'parcelamento de fatura',
-            'juros rotativo', 'cet do financiamento', 'iof do rotativo', 'encargos', 'impostos',
-            'compras nacionais', 'compras internacionais', 'valores creditados'
-        ]):
+        if _RE_C6_LINHAS_IGNORADAS.search(line_clean.lower()):
             continue
         
         # Padrões para transações de fatura C6:
@@ -82,11 +194,8 @@ def parse_c6_fatura_pdf(text_content: str, doc_type: str) -> list[dict]:
         # Ex: "12/03 Débito de Cartão MEEP PA CLUBE NAUTICO SETE LAGOAS BRA R$ 31,00"
         # 3. Inclusão de Pagamento/Estorno: "DD MMM Inclusao de Pagamento R$ VALOR"
         
-        padrao_fatura_compra = r'(\d{1,2}\s+[A-Za-z]{3,})\s+(.+?)\s+R?\$?\s*([\d\.,]+)'
-        padrao_tabular_extrato_style = r'(\d{2}/\d{2})\s+(Entrada PIX|Saida PIX|Débito de Cartão|Pagamento|Outros gastos)\s+(.+?)\s+(R\$?\s*[-]?[\d\.,]+)'
-        
-        match_fatura_compra = re.search(padrao_fatura_compra, line_clean, re.IGNORECASE)
-        match_tabular_extrato = re.search(padrao_tabular_extrato_style, line_clean, re.IGNORECASE)
+        match_tabular_extrato = _RE_C6_TABULAR_EXTRATO.search(line_clean)
+        match_fatura_compra = None if match_tabular_extrato else _RE_C6_FATURA_COMPRA.search(line_clean)
 
         data_raw, description, value_str, original_type_op = None, None, None, None
 
@@ -102,7 +211,7 @@ def parse_c6_fatura_pdf(text_content: str, doc_type: str) -> list[dict]:
             original_type_op = 'Débito de Cartão' # Assumir débito para padrão de fatura, será ajustado abaixo
         
         if data_raw and description and value_str:
-            date_obj = parse_date_string(data_raw, current_year)
+            date_obj = parse_date(data_raw)
             value_num = parse_financial_value(value_str)
             
             if date_obj is None or value_num is None:
@@ -130,4 +239,9 @@ def parse_c6_fatura_pdf(text_content: str, doc_type: str) -> list[dict]:
 
 # Adicione aqui outros parsers específicos para PDFs de outros bancos
 # def parse_bancox_extrato_pdf(text_content: str, doc_type: str) -> list[dict]: ...
-# def parse_bancoy_fatura_pdf(text_content: str, doc_type: str) -> list[dict]: ...
\ No newline at end of file
+# def parse_bancoy_fatura_pdf(text_content: str, doc_type: str) -> list[dict]: ...
+
+registrar_parser(parse_nubank_extrato_pdf, 'Nubank Extrato PDF', 'Nubank', 'extrato_bancario', ('pdf',),
+                 cabecalhos=('nu pagamentos', 'movimentações'))
+registrar_parser(parse_c6_fatura_pdf, 'C6 Fatura PDF', 'C6 Bank', 'fatura_cartao', ('pdf',),
+                 cabecalhos=('c6 bank', 'total a pagar'))
\ No newline at end of file
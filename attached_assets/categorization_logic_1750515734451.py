@@ -1,42 +1,181 @@
 # categorization_logic.py
 
 import pandas as pd
+import numpy as np
+import os
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
 
 # Importa a lista de processadoras não-aposta de config.py
 # from config import PROCESSADORAS_PAGAMENTO_NAO_APOSTA, SITES_APOSTAS
 
 
+# Termos por categoria, em ordem de precedência: a primeira categoria com algum termo presente na descrição vence.
+# 'Apostas e Jogos de Azar' recebe também os termos de config.SITES_APOSTAS na montagem do autômato.
+CATEGORIAS_GRANULARES = {
+    'Alimentação': ['restaurante', 'lanchonete', 'padaria', 'mercado', 'supermercado', 'ifood', 'uber eats', 'rappi', 'food', 'alimentacao', 'cafe', 'bar', 'pizzaria', 'hamburgueria', 'delivery', 'comida', 'chopp sete', 'varejao e padaria uni', 'burger sf', 'doceria mosaico', 'nutrebem', 'spoleto sete lagoas', 'grillus restaurante e', 'casa de bolos'],
+    'Transporte': ['uber', '99', 'taxi', 'combustivel', 'posto', 'transporte', 'metro', 'onibus', 'estacionamento', 'pedágio', 'veiculo', 'carro', 'gasolina', 'etanol', 'diesel', 'posto volkssete', 'posto interlagos', '840 bh saida br 040 nova lima', 'expresso tropical'],
+    'Saúde': ['farmacia', 'drogaria', 'hospital', 'clinica', 'medico', 'laboratorio', 'exame', 'consulta', 'odontologia', 'fisioterapia', 'saude', 'medicina', 'unimed', 'amil', 'bradesco saude', 'drogaria araujo'],
+    'Vestuário e Acessórios': ['loja', 'moda', 'roupa', 'calcado', 'sapato', 'magazine', 'shopping', 'vestuario', 'boutique', 'acessorios', 'oticas', 'joias', 'relojoaria', 'shein', 'clube melissa', 'pgz rosamake', 'silvania kids'],
+    'Lazer e Entretenimento': ['cinema', 'streaming', 'netflix', 'spotify', 'parque', 'diversao', 'show', 'teatro', 'concerto', 'evento', 'balada', 'hospedagem', 'clube', 'ingresso', 'games', 'jogos', 'lazer', 'entretenimento', 'turismo', 'hotéis', 'pousadas', 'resorts', 'parque tematico', 'boate', 'exposicao', 'museu', 'disney plus', 'grupo cine 7 lagoas', 'meep pa clube nautico', 'baladapp'],
+    'Tecnologia e Eletrônicos': ['apple', 'google', 'microsoft', 'eletrônicos', 'celular', 'software', 'internet', 'hardware', 'tecnologia', 'recarga celular', 'eletronico', 'info', 'telefonia', 'informatica', 'servicos online', 'aplicativos', 'eletrodomesticos', 'assistencia tecnica', 'tim 5 a'],
+    'Serviços Essenciais e Contas': ['banco', 'cartorio', 'correios', 'telefonia', 'internet', 'serviços', 'consultoria', 'advocacia', 'contabilidade', 'reparos', 'manutenção', 'conta', 'boleto', 'pagamento', 'agua', 'luz', 'energia', 'gas', 'condominio', 'aluguel', 'assinatura', 'iptu', 'taxas', 'saneamento', 'tv por assinatura', 'mensalidade', 'seguros', 'protecao veicular', 'consorcio', 'credito consignado', 'pgto fat cartao c6', 'pagarme pagamentos sa', 'nu pagamentos sa', 'receita federal', 'cooperlider associacao de protecao dev', 'sociedade educacional leonardo', 'nucleo de psicanalise e evolucao existen', 'carpecas', 'randon', 'banco pan sa', 'travesia securitizadora', 'shpp brasil instituicao de pag', 'easy food pagamentos', 'nuvi servicos administrativos'], # Expandido
+    'Casa e Moradia': ['casa', 'construcao', 'eletrica', 'hidraulica', 'reforma', 'moveis', 'decoracao', 'eletrodomesticos', 'utilidades', 'imobiliaria', 'material de construção', 'ferramentas', 'limpeza', 'jardinagem', 'lar', 'mudanca', 'helena casa & construcao', 'com mat eletri norte', 'supermercados bh', 'agro mar rações'],
+    'Educação': ['escola', 'universidade', 'curso', 'livro', 'educacao', 'ensino', 'faculdade', 'pos-graduacao', 'mestrado', 'doutorado', 'certificacao', 'treinamento', 'workshop', 'palestra', 'seminario', 'congresso', 'colegio elite master', 'rrpm cursos preparatorios ltda', 'uniasselvi'],
+    'Investimentos e Poupança': ['investimento', 'poupanca', 'aplicacao', 'renda fixa', 'renda variavel', 'acao', 'fundo', 'tesouro', 'cdb', 'lci', 'lca', 'debenture', 'cri', 'cra', 'fidc', 'fii', 'etf', 'previdencia', 'tesouro nacional'],
+    'Taxas e Juros (Extrato/Fatura)': ['taxa', 'tarifa', 'juro', 'multa', 'encargo', 'iof', 'anuidade', 'manutencao conta', 'saque', 'ted', 'doc', 'pix'], # PIX/TED/DOC podem gerar tarifas
+    'Apostas e Jogos de Azar': ['aposta', 'jogo', 'cassino', 'loteria', 'bingo', 'poker', 'blaze', 'stake', 'gaming', 'sorte online'],
+    'Animais de Estimação': ['pet shop', 'veterinario', 'racao', 'pata sem dono', 'associacao protetora dos animais', 'patinhas do cipo', 'instituto de protecao de animais jose paulo alves-pro-anima'],
+    'Salário/Renda Principal': ['salario', 'pagamento de salario', 'remuneração', 'pro-labore', 'renda'],
+    'Outros/Diversos': ['outros gastos', 'diversos', 'variados', 'sem categoria', 'receita federal', 'transferencia', 'pix'] # Catch-all para o que sobrar
+}
+
+CATEGORIA_APOSTAS = 'Apostas e Jogos de Azar'
+
+# Categorias atribuídas apenas no refinamento dos créditos de fatura (categorize_transactions_detailed)
+CATEGORIAS_CREDITO_FATURA = ['Estorno na Fatura', 'Pagamento de Fatura (Crédito)', 'Crédito Diverso na Fatura']
+
+
+# --- Autômato de múltiplos termos (Aho-Corasick) ---
+# Cada grupo de termos recebe um bit; uma única passada pela descrição devolve a máscara
+# com os bits de todos os grupos que têm algum termo presente (inclusive termos sobrepostos),
+# reproduzindo exatamente a semântica de `any(termo in descricao for termo in termos)`.
+
+def construir_automato_termos(grupos_termos: list[list[str]]) -> tuple[list[dict[str, int]], list[int]]:
+    """
+    Constrói um autômato Aho-Corasick determinístico para os grupos de termos informados.
+    O termo pertencente ao grupo i marca o bit (1 << i) na saída dos estados em que termina.
+    :return: (transicoes, saidas) - transições por estado (apenas as que não voltam à raiz) e máscara de saída por estado.
+    """
+    filhos = [{}]
+    saidas = [0]
+    for bit, termos in enumerate(grupos_termos):
+        for termo in termos:
+            estado = 0
+            for ch in termo:
+                proximo = filhos[estado].get(ch)
+                if proximo is None:
+                    proximo = len(filhos)
+                    filhos[estado][ch] = proximo
+                    filhos.append({})
+                    saidas.append(0)
+                estado = proximo
+            saidas[estado] |= 1 << bit
+
+    # Busca em largura para calcular os links de falha e "achatar" as transições (DFA completo)
+    transicoes = [dict() for _ in filhos]
+    falha = [0] * len(filhos)
+    fila = []
+    for ch, filho in filhos[0].items():
+        transicoes[0][ch] = filho
+        fila.append(filho)
+    for estado in fila:
+        saidas[estado] |= saidas[falha[estado]]
+        transicoes_falha = transicoes[falha[estado]]
+        for ch, destino in transicoes_falha.items():
+            transicoes[estado][ch] = destino
+        for ch, filho in filhos[estado].items():
+            falha[filho] = transicoes_falha.get(ch, 0)
+            transicoes[estado][ch] = filho
+            fila.append(filho)
+    return transicoes, saidas
+
+def buscar_mascara_termos(texto: str, automato: tuple[list[dict[str, int]], list[int]]) -> int:
+    """Percorre o texto uma única vez e retorna a máscara de bits dos grupos com algum termo presente."""
+    transicoes, saidas = automato
+    estado = 0
+    mascara = 0
+    for ch in texto:
+        estado = transicoes[estado].get(ch, 0)
+        mascara |= saidas[estado]
+    return mascara
+
+# Regras compiladas a partir das tabelas vigentes (ver _obter_regras_categorizacao)
+_REGRAS_CATEGORIAS = None
+
+def _tabela_categorias() -> dict[str, list[str]]:
+    """Tabela completa de categorias, incluindo os sites de apostas de config.py."""
+    tabela = dict(CATEGORIAS_GRANULARES)
+    tabela[CATEGORIA_APOSTAS] = SITES_APOSTAS + CATEGORIAS_GRANULARES[CATEGORIA_APOSTAS]
+    return tabela
+
+def _copiar_regras() -> tuple:
+    """Cópia do conteúdo das tabelas de regras: termos por categoria, ordem das categorias, processadoras e sites."""
+    return ({categoria: list(termos) for categoria, termos in CATEGORIAS_GRANULARES.items()}, list(CATEGORIAS_GRANULARES),
+            list(PROCESSADORAS_PAGAMENTO_NAO_APOSTA), list(SITES_APOSTAS))
+
+def _regras_inalteradas(copia: tuple) -> bool:
+    """
+    Se as tabelas ainda têm o conteúdo da cópia. A comparação não copia nada e as strings iguais são os
+    mesmos objetos, então custa cerca de 1 µs mesmo percorrendo todos os termos.
+    """
+    tabela, categorias, processadoras, sites = copia
+    return (CATEGORIAS_GRANULARES == tabela and PROCESSADORAS_PAGAMENTO_NAO_APOSTA == processadoras
+            and SITES_APOSTAS == sites and list(CATEGORIAS_GRANULARES) == categorias)
+
+def _obter_regras_categorizacao() -> dict:
+    """
+    Regras compiladas das tabelas vigentes: autômato com as categorias, as processadoras não-aposta e os sites
+    de apostas, a versão (hash do conteúdo) e as posições dos bits de cada grupo na máscara do autômato.
+    Qualquer mudança de conteúdo (termo acrescentado ou removido, categoria nova, tabela substituída) é
+    detectada na chamada seguinte e remonta tudo junto, inclusive as posições dos bits.
+    """
+    global _REGRAS_CATEGORIAS
+    if _REGRAS_CATEGORIAS is None or not _regras_inalteradas(_REGRAS_CATEGORIAS['copia']):
+        copia = _copiar_regras()
+        tabela = _tabela_categorias()
+        nomes = list(tabela)
+        conteudo = json.dumps([list(tabela.items()), PROCESSADORAS_PAGAMENTO_NAO_APOSTA, SITES_APOSTAS], ensure_ascii=False)
+        _REGRAS_CATEGORIAS = {
+            'copia': copia,
+            'versao': hashlib.sha256(conteudo.encode('utf-8')).hexdigest()[:16],
+            'automato': construir_automato_termos(list(tabela.values()) + [PROCESSADORAS_PAGAMENTO_NAO_APOSTA, SITES_APOSTAS]),
+            'nomes': nomes,
+            'bit_apostas': 1 << nomes.index(CATEGORIA_APOSTAS),
+            'bit_processadoras': 1 << len(nomes),
+            'bit_sites_apostas': 1 << (len(nomes) + 1),
+            'mascara_categorias': (1 << len(nomes)) - 1,
+        }
+    return _REGRAS_CATEGORIAS
+
+def versao_regras_categorizacao() -> str:
+    """Hash das tabelas de categorização (categorias, processadoras e sites de apostas). Muda sempre que alguma regra muda."""
+    return _obter_regras_categorizacao()['versao']
+
+def _categoria_da_mascara(mascara: int, regras: dict) -> str:
+    """Aplica as regras de precedência sobre a máscara de termos encontrados."""
+    categorias_encontradas = mascara & regras['mascara_categorias']
+
+    # Prevenir que processadoras legítimas sejam classificadas como aposta por acidente:
+    # processadora presente sem termo explícito de site de aposta prioriza as outras categorias
+    if mascara & regras['bit_processadoras'] and not mascara & regras['bit_sites_apostas']:
+        categorias_encontradas &= ~regras['bit_apostas']
+        if not categorias_encontradas:
+            return 'Serviços Essenciais e Contas' # Fallback comum para processadoras sem outra categoria clara
+
+    if not categorias_encontradas:
+        return 'Outros/Diversos'
+    # O bit menos significativo é a categoria de maior precedência
+    return regras['nomes'][(categorias_encontradas & -categorias_encontradas).bit_length() - 1]
+
 def categorizar_transacao_granular(descricao: str) -> str:
     """Categoriza uma transação baseada na descrição em categorias granulares."""
-    categorias = {
-        'Alimentação': ['restaurante', 'lanchonete', 'padaria', 'mercado', 'supermercado', 'ifood', 'uber eats', 'rappi', 'food', 'alimentacao', 'cafe', 'bar', 'pizzaria', 'hamburgueria', 'delivery', 'comida', 'chopp sete', 'varejao e padaria uni', 'burger sf', 'doceria mosaico', 'nutrebem', 'spoleto sete lagoas', 'grillus restaurante e', 'casa de bolos'],
-        'Transporte': ['uber', '99', 'taxi', 'combustivel', 'posto', 'transporte', 'metro', 'onibus', 'estacionamento', 'pedágio', 'veiculo', 'carro', 'gasolina', 'etanol', 'diesel', 'posto volkssete', 'posto interlagos', '840 bh saida br 040 nova lima', 'expresso tropical'],
-        'Saúde': ['farmacia', 'drogaria', 'hospital', 'clinica', 'medico', 'laboratorio', 'exame', 'consulta', 'odontologia', 'fisioterapia', 'saude', 'medicina', 'unimed', 'amil', 'bradesco saude', 'drogaria araujo'],
-        'Vestuário e Acessórios': ['loja', 'moda', 'roupa', 'calcado', 'sapato', 'magazine', 'shopping', 'vestuario', 'boutique', 'acessorios', 'oticas', 'joias', 'relojoaria', 'shein', 'clube melissa', 'pgz rosamake', 'silvania kids'],
-        'Lazer e Entretenimento': ['cinema', 'streaming', 'netflix', 'spotify', 'parque', 'diversao', 'show', 'teatro', 'concerto', 'evento', 'balada', 'hospedagem', 'clube', 'ingresso', 'games', 'jogos', 'lazer', 'entretenimento', 'turismo', 'hotéis', 'pousadas', 'resorts', 'parque tematico', 'boate', 'exposicao', 'museu', 'disney plus', 'grupo cine 7 lagoas', 'meep pa clube nautico', 'baladapp'],
-        'Tecnologia e Eletrônicos': ['apple', 'google', 'microsoft', 'eletrônicos', 'celular', 'software', 'internet', 'hardware', 'tecnologia', 'recarga celular', 'eletronico', 'info', 'telefonia', 'informatica', 'servicos online', 'aplicativos', 'eletrodomesticos', 'assistencia tecnica', 'tim 5 a'],
-        'Serviços Essenciais e Contas': ['banco', 'cartorio', 'correios', 'telefonia', 'internet', 'serviços', 'consultoria', 'advocacia', 'contabilidade', 'reparos', 'manutenção', 'conta', 'boleto', 'pagamento', 'agua', 'luz', 'energia', 'gas', 'condominio', 'aluguel', 'assinatura', 'iptu', 'taxas', 'saneamento', 'tv por assinatura', 'mensalidade', 'seguros', 'protecao veicular', 'consorcio', 'credito consignado', 'pgto fat cartao c6', 'pagarme pagamentos sa', 'nu pagamentos sa', 'receita federal', 'cooperlider associacao de protecao dev', 'sociedade educacional leonardo', 'nucleo de psicanalise e evolucao existen', 'carpecas', 'randon', 'banco pan sa', 'travesia securitizadora', 'shpp brasil instituicao de pag', 'easy food pagamentos', 'nuvi servicos administrativos'], # Expandido
-        'Casa e Moradia': ['casa', 'construcao', 'eletrica', 'hidraulica', 'reforma', 'moveis', 'decoracao', 'eletrodomesticos', 'utilidades', 'imobiliaria', 'material de construção', 'ferramentas', 'limpeza', 'jardinagem', 'lar', 'mudanca', 'helena casa & construcao', 'com mat eletri norte', 'supermercados bh', 'agro mar rações'],
-        'Educação': ['escola', 'universidade', 'curso', 'livro', 'educacao', 'ensino', 'faculdade', 'pos-graduacao', 'mestrado', 'doutorado', 'certificacao', 'treinamento', 'workshop', 'palestra', 'seminario', 'congresso', 'colegio elite master', 'rrpm cursos preparatorios ltda', 'uniasselvi'],
-        'Investimentos e Poupança': ['investimento', 'poupanca', 'aplicacao', 'renda fixa', 'renda variavel', 'acao', 'fundo', 'tesouro', 'cdb', 'lci', 'lca', 'debenture', 'cri', 'cra', 'fidc', 'fii', 'etf', 'previdencia', 'tesouro nacional'],
-        'Taxas e Juros (Extrato/Fatura)': ['taxa', 'tarifa', 'juro', 'multa', 'encargo', 'iof', 'anuidade', 'manutencao conta', 'saque', 'ted', 'doc', 'pix'], # PIX/TED/DOC podem gerar tarifas
-        'Apostas e Jogos de Azar': SITES_APOSTAS + ['aposta', 'jogo', 'cassino', 'loteria', 'bingo', 'poker', 'blaze', 'stake', 'gaming', 'sorte online'],
-        'Animais de Estimação': ['pet shop', 'veterinario', 'racao', 'pata sem dono', 'associacao protetora dos animais', 'patinhas do cipo', 'instituto de protecao de animais jose paulo alves-pro-anima'],
-        'Salário/Renda Principal': ['salario', 'pagamento de salario', 'remuneração', 'pro-labore', 'renda'],
-        'Outros/Diversos': ['outros gastos', 'diversos', 'variados', 'sem categoria', 'receita federal', 'transferencia', 'pix'] # Catch-all para o que sobrar
-    }
+    regras = _obter_regras_categorizacao()
+    return _categoria_da_mascara(buscar_mascara_termos(descricao.lower(), regras['automato']), regras)
 
+def _categorizar_transacao_granular_por_varredura(descricao: str) -> str:
+    """Implementação original (varredura termo a termo), mantida como referência para conferência e benchmark."""
+    categorias = _tabela_categorias()
     descricao_lower = descricao.lower()
 
-    # Prevenir que processadoras legítimas sejam classificadas como aposta por acidente
     if any(proc in descricao_lower for proc in PROCESSADORAS_PAGAMENTO_NAO_APOSTA):
-        # Se contiver um termo de processadora E NÃO for um termo de aposta explícito
         if not any(site in descricao_lower for site in SITES_APOSTAS):
-            # Prioriza outras categorias se houver termos de outras categorias
             for categoria, termos in categorias.items():
-                if categoria != 'Apostas e Jogos de Azar' and any(termo in descricao_lower for termo in termos):
+                if categoria != CATEGORIA_APOSTAS and any(termo in descricao_lower for termo in termos):
                     return categoria
-            return 'Serviços Essenciais e Contas' # Fallback comum para processadoras sem outra categoria clara
+            return 'Serviços Essenciais e Contas'
 
     for categoria, termos in categorias.items():
         if any(termo in descricao_lower for termo in termos):
@@ -44,6 +183,205 @@ def categorizar_transacao_granular(descricao: str) -> str:
 
     return 'Outros/Diversos'
 
+def benchmark_categorizacao(descricoes: list[str], repeticoes: int = 3) -> dict[str, float]:
+    """
+    Compara o custo por linha (em microssegundos) da varredura original com o autômato compilado
+    (a equivalência dos dois é conferida em tests/test_categorization_logic.py).
+    """
+    import time
+
+    _obter_regras_categorizacao() # Custo de montagem fica fora da medição
+    resultados = {}
+    for nome, funcao in [('varredura', _categorizar_transacao_granular_por_varredura), ('automato', categorizar_transacao_granular)]:
+        melhor = float('inf')
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            for descricao in descricoes:
+                funcao(descricao)
+            melhor = min(melhor, time.perf_counter() - inicio)
+        resultados[f'{nome}_us_por_linha'] = melhor / max(len(descricoes), 1) * 1e6
+
+    resultados['aceleracao'] = resultados['varredura_us_por_linha'] / resultados['automato_us_por_linha'] if resultados['automato_us_por_linha'] else float('inf')
+    print(f"Categorização: varredura {resultados['varredura_us_por_linha']:.2f} µs/linha | autômato {resultados['automato_us_por_linha']:.2f} µs/linha | "
+          f"{resultados['aceleracao']:.1f}x")
+    return resultados
+
+# --- Cache descrição -> categoria ---
+
+class CacheCategorias:
+    """
+    Cache descrição -> categoria com LRU em memória e, opcionalmente, um armazenamento SQLite em disco
+    compartilhado entre análises de clientes diferentes. A chave é a descrição normalizada (minúsculas)
+    junto com a versão das regras, então qualquer mudança nas tabelas de categorização invalida o cache.
+    A conexão SQLite é aberta no primeiro uso e pertence a um processo: um processo criado por fork (workers
+    de process_documents e run_batch) abre a sua, sem usar nem fechar a herdada, como pede o SQLite.
+    """
+
+    def __init__(self, tamanho_maximo: int = 50_000, caminho_sqlite: str | None = None):
+        self.tamanho_maximo = tamanho_maximo
+        self.caminho_sqlite = caminho_sqlite
+        self.versao = None
+        self.acertos_memoria = 0
+        self.acertos_disco = 0
+        self.falhas = 0
+        self._lru = OrderedDict()
+        self._conexao = None
+        self._pid_conexao = None
+        self._conexoes_herdadas = [] # Conexões de processos pais: mantidas abertas e sem uso após o fork
+
+    def _obter_conexao(self) -> sqlite3.Connection | None:
+        """Conexão SQLite do processo atual (None sem caminho_sqlite), aberta no primeiro uso neste processo."""
+        if not self.caminho_sqlite:
+            return None
+        if self._pid_conexao != os.getpid():
+            if self._conexao is not None:
+                # Fechar a conexão herdada no filho liberaria locks de arquivo que ainda valem no pai
+                self._conexoes_herdadas.append(self._conexao)
+            self._conexao = sqlite3.connect(self.caminho_sqlite, timeout=30)
+            self._pid_conexao = os.getpid()
+            self._conexao.execute(
+                "CREATE TABLE IF NOT EXISTS categorias ("
+                "versao TEXT NOT NULL, descricao TEXT NOT NULL, categoria TEXT NOT NULL, "
+                "PRIMARY KEY (versao, descricao))"
+            )
+            self._conexao.commit()
+        return self._conexao
+
+    def _ajustar_versao(self, versao: str):
+        """Ao mudar a versão das regras, esvazia a memória e remove do disco as entradas de versões anteriores."""
+        if versao == self.versao:
+            return
+        self._lru.clear()
+        self.versao = versao
+        conexao = self._obter_conexao()
+        if conexao is not None:
+            with conexao:
+                conexao.execute("DELETE FROM categorias WHERE versao != ?", (versao,))
+
+    def _guardar_em_memoria(self, chave: str, categoria: str):
+        self._lru[chave] = categoria
+        if len(self._lru) > self.tamanho_maximo:
+            self._lru.popitem(last=False) # Remove o item usado há mais tempo
+
+    def _buscar_no_disco(self, conexao: sqlite3.Connection, chaves: list[str]) -> dict[str, str]:
+        encontrados = {}
+        for inicio in range(0, len(chaves), 500): # Respeita o limite de parâmetros por consulta do SQLite
+            lote = chaves[inicio:inicio + 500]
+            marcadores = ','.join('?' * len(lote))
+            cursor = conexao.execute(
+                f"SELECT descricao, categoria FROM categorias WHERE versao = ? AND descricao IN ({marcadores})",
+                [self.versao, *lote]
+            )
+            encontrados.update(cursor.fetchall())
+        return encontrados
+
+    def categorizar_varias(self, descricoes: list[str]) -> list[str]:
+        """Categoriza uma lista de descrições consultando memória, depois disco, e só então o autômato."""
+        regras = _obter_regras_categorizacao()
+        self._ajustar_versao(regras['versao'])
+        automato = regras['automato']
+        conexao = self._obter_conexao()
+
+        resultado = [None] * len(descricoes)
+        pendentes = {} # chave -> posições no resultado
+        for i, descricao in enumerate(descricoes):
+            chave = descricao.lower()
+            categoria = self._lru.get(chave)
+            if categoria is not None:
+                self._lru.move_to_end(chave)
+                self.acertos_memoria += 1
+                resultado[i] = categoria
+            else:
+                pendentes.setdefault(chave, []).append(i)
+
+        encontrados_disco = self._buscar_no_disco(conexao, list(pendentes)) if pendentes and conexao is not None else {}
+        novos = []
+        for chave, posicoes in pendentes.items():
+            categoria = encontrados_disco.get(chave)
+            if categoria is None:
+                categoria = _categoria_da_mascara(buscar_mascara_termos(chave, automato), regras)
+                self.falhas += 1
+                novos.append((self.versao, chave, categoria))
+            else:
+                self.acertos_disco += 1
+            self._guardar_em_memoria(chave, categoria)
+            for i in posicoes:
+                resultado[i] = categoria
+
+        if novos and conexao is not None:
+            with conexao:
+                conexao.executemany("INSERT OR REPLACE INTO categorias (versao, descricao, categoria) VALUES (?, ?, ?)", novos)
+        return resultado
+
+    def categorizar(self, descricao: str) -> str:
+        """Versão com cache de categorizar_transacao_granular para uma única descrição."""
+        return self.categorizar_varias([descricao])[0]
+
+    def estatisticas(self) -> dict[str, int | float | str | None]:
+        """Contadores de acertos/falhas para acompanhar o efeito do cache."""
+        consultas = self.acertos_memoria + self.acertos_disco + self.falhas
+        return {
+            'acertos_memoria': self.acertos_memoria,
+            'acertos_disco': self.acertos_disco,
+            'falhas': self.falhas,
+            'taxa_acerto': (self.acertos_memoria + self.acertos_disco) / consultas if consultas else 0.0,
+            'itens_em_memoria': len(self._lru),
+            'versao_regras': self.versao,
+        }
+
+    def limpar(self):
+        """Esvazia a memória e o armazenamento em disco e zera os contadores."""
+        self._lru.clear()
+        self.acertos_memoria = self.acertos_disco = self.falhas = 0
+        conexao = self._obter_conexao()
+        if conexao is not None:
+            with conexao:
+                conexao.execute("DELETE FROM categorias")
+
+    def fechar(self):
+        """Fecha a conexão aberta por este processo (uma conexão herdada por fork não é fechada)."""
+        if self._conexao is not None and self._pid_conexao == os.getpid():
+            self._conexao.close()
+        elif self._conexao is not None:
+            self._conexoes_herdadas.append(self._conexao)
+        self._conexao = None
+        self._pid_conexao = None
+
+_CACHE_CATEGORIAS = CacheCategorias()
+
+def configurar_cache_categorias(caminho_sqlite: str | None = None, tamanho_maximo: int = 50_000) -> CacheCategorias:
+    """
+    Substitui o cache global de categorias, por exemplo para ativar o armazenamento SQLite
+    compartilhado entre análises (as descrições de estabelecimentos se repetem entre clientes).
+    """
+    global _CACHE_CATEGORIAS
+    _CACHE_CATEGORIAS.fechar()
+    _CACHE_CATEGORIAS = CacheCategorias(tamanho_maximo=tamanho_maximo, caminho_sqlite=caminho_sqlite)
+    return _CACHE_CATEGORIAS
+
+def estatisticas_cache_categorias() -> dict[str, int | float | str | None]:
+    """Contadores de acertos/falhas do cache global de categorias."""
+    return _CACHE_CATEGORIAS.estatisticas()
+
+def categorize_batch(descricoes: pd.Series) -> pd.Categorical:
+    """
+    Categoriza uma coluna inteira de descrições. Extratos repetem o mesmo estabelecimento
+    centenas de vezes, então cada descrição distinta é categorizada uma única vez e o
+    resultado é propagado para as linhas pelos códigos de um pd.Categorical.
+    Descrições ausentes (NaN) recebem 'Outros/Diversos'.
+    """
+    codigos_descricao, descricoes_unicas = pd.factorize(descricoes)
+    categorias_unicas = _CACHE_CATEGORIAS.categorizar_varias([str(descricao) for descricao in descricoes_unicas])
+    categorias = _obter_regras_categorizacao()['nomes'] + CATEGORIAS_CREDITO_FATURA
+    posicao_categoria = {categoria: i for i, categoria in enumerate(categorias)}
+    codigos_unicos = np.fromiter(
+        (posicao_categoria[categoria] for categoria in categorias_unicas),
+        dtype=np.int16, count=len(categorias_unicas)
+    )
+    # A última posição atende o código -1 que pd.factorize usa para NaN
+    codigos_unicos = np.append(codigos_unicos, posicao_categoria['Outros/Diversos']).astype(np.int16)
+    return pd.Categorical.from_codes(codigos_unicos[codigos_descricao], categories=categorias)
+
 def categorize_transactions_detailed(transactions_df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
     Classifica transações em 'Entradas'/'Saídas' e categorias específicas granulares,
@@ -56,32 +394,32 @@ def categorize_transactions_detailed(transactions_df: pd.DataFrame) -> tuple[pd.
     transactions_df.dropna(subset=['value'], inplace=True)
     
     # Adiciona a coluna 'category' (Entrada/Saída) e 'specific_category' (granular)
-    transactions_df['category'] = transactions_df['value'].apply(lambda x: 'Entrada' if x >= 0 else 'Saída')
-    transactions_df['specific_category'] = transactions_df['description'].apply(categorizar_transacao_granular)
+    entrada = (transactions_df['value'] >= 0).to_numpy()
+    transactions_df['category'] = np.where(entrada, 'Entrada', 'Saída')
+    transactions_df['specific_category'] = categorize_batch(transactions_df['description'])
 
-    # Divisão dos DataFrames finais
-    inputs_extrato_df = transactions_df[
-        (transactions_df['doc_type'] == 'extrato_bancario') &
-        (transactions_df['category'] == 'Entrada')
-    ].copy()
+    return separar_transacoes_categorizadas(
+        transactions_df,
+        extrato=(transactions_df['doc_type'] == 'extrato_bancario').to_numpy(),
+        fatura=(transactions_df['doc_type'] == 'fatura_cartao').to_numpy(),
+        entrada=entrada,
+    )
 
-    outputs_extrato_df = transactions_df[
-        (transactions_df['doc_type'] == 'extrato_bancario') &
-        (transactions_df['category'] == 'Saída')
-    ].copy()
+def separar_transacoes_categorizadas(transactions_df: pd.DataFrame, extrato: np.ndarray, fatura: np.ndarray,
+                                     entrada: np.ndarray) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Divide as transações já categorizadas nos DataFrames finais (entradas e saídas do extrato, compras e
+    créditos da fatura) a partir das máscaras de tipo de documento e de sinal já calculadas.
+    """
+    inputs_extrato_df = transactions_df[extrato & entrada].copy()
+    outputs_extrato_df = transactions_df[extrato & ~entrada].copy()
 
     # Fatura de Cartão: Compras/Débitos (valores negativos na fatura)
-    card_transactions_df = transactions_df[
-        (transactions_df['doc_type'] == 'fatura_cartao') &
-        (transactions_df['value'] < 0)
-    ].copy()
+    card_transactions_df = transactions_df[fatura & ~entrada].copy()
     # Para compras de cartão, a specific_category já foi atribuída por categorizar_transacao_granular
 
     # Fatura de Cartão: Créditos/Pagamentos (valores positivos na fatura)
-    card_credits_df = transactions_df[
-        (transactions_df['doc_type'] == 'fatura_cartao') &
-        (transactions_df['value'] >= 0)
-    ].copy()
+    card_credits_df = transactions_df[fatura & entrada].copy()
     # Refinar categorias para créditos na fatura
     card_credits_df.loc[card_credits_df['description'].str.contains('estorno', case=False, na=False), 'specific_category'] = 'Estorno na Fatura'
     card_credits_df.loc[card_credits_df['description'].str.contains('pagamento|inclusao de pagamento|pgto fat', case=False, na=False), 'specific_category'] = 'Pagamento de Fatura (Crédito)'
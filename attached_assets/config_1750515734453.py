@@ -36,4 +36,32 @@ MAPPING_COLUNAS_PADRAO_GENERICO = {
     "valor": ['valor', 'value', 'montante', 'quantia'],
     "debito": ['débito', 'debito', 'saída', 'saida'],
     "credito": ['crédito', 'credito', 'entrada']
+}
+
+# Palavras-chave da classificação de documentos por conteúdo (data_parsing.classificar_documento), com o
+# peso de cada uma. Comparadas sem acentos e sem diferenciar maiúsculas, como palavras inteiras.
+PALAVRAS_CHAVE_TIPO_DOCUMENTO = {
+    'extrato_bancario': [
+        ('extrato', 2), ('saldo anterior', 3), ('saldo do dia', 3), ('saldo disponivel', 2), ('saldo final', 2),
+        ('conta corrente', 2), ('movimentacoes', 2), ('lancamentos', 1), ('agencia', 1), ('data mov.', 3),
+        ('identificador', 1),
+    ],
+    'fatura_cartao': [
+        ('fatura', 3), ('total a pagar', 3), ('pagamento minimo', 3), ('limite disponivel', 2), ('cartao de credito', 2),
+        ('vencimento', 1), ('melhor dia de compra', 3), ('estabelecimento', 2), ('data da transacao', 2),
+    ],
+    'contracheque': [
+        ('contracheque', 4), ('holerite', 4), ('demonstrativo de pagamento', 3), ('salario bruto', 3),
+        ('salario liquido', 3), ('liquido a receber', 3), ('vencimento base', 3), ('proventos', 2), ('inss', 1), ('fgts', 1),
+    ],
+}
+PALAVRAS_CHAVE_BANCOS = {
+    'Nubank': [('nubank', 3), ('nu pagamentos', 3), ('nu financeira', 3)],
+    'C6 Bank': [('c6 bank', 3), ('banco c6', 3), ('c6 s.a', 2)],
+    'Caixa Econômica Federal': [('caixa economica', 3), ('data mov.', 1)],
+    'Banco Inter': [('banco inter', 3), ('inter&co', 3)],
+    'PicPay': [('picpay', 3)],
+    'Bradesco': [('bradesco', 3)],
+    'Itaú': [('itau', 3), ('itau unibanco', 3)],
+    'Santander': [('santander', 3)],
 }
\ No newline at end of file
@@ -1,11 +1,13 @@
 # dataframe_parsers.py
 
 import pandas as pd
+import numpy as np
 from datetime import datetime
 
 # Importa as funções auxiliares de parsing de data e valor
-# from data_parsing import parse_date_string, parse_financial_value, _identificar_tipo_transacao_simples
+# from data_parsing import parse_date_series, parse_financial_values, identificar_tipos_transacao
 # from config import MAPPING_COLUNAS_PADRAO_GENERICO # Para o parser genérico
+# from bank_specific_parsers import registrar_parser
 
 
 def _mapear_colunas_automaticamente(df: pd.DataFrame) -> dict[str, str]:
@@ -22,216 +24,156 @@ def _mapear_colunas_automaticamente(df: pd.DataFrame) -> dict[str, str]:
     
     return mapeamento
 
-def process_dataframe_generic(df: pd.DataFrame, doc_type: str) -> list[dict]:
+# --- Auxiliares colunares ---
+# Todos os parsers devolvem um DataFrame já no esquema canônico de transações, sem iterar linha a linha.
+
+COLUNAS_TRANSACAO = ['date', 'description', 'value', 'currency', 'doc_type', 'original_type_op']
+
+def _obter_coluna(df: pd.DataFrame, coluna) -> pd.Series | None:
+    """Retorna a coluna (a primeira, se o nome estiver repetido) ou None se ela não existir."""
+    if coluna is None or coluna not in df.columns:
+        return None
+    serie = df.loc[:, coluna]
+    return serie.iloc[:, 0] if isinstance(serie, pd.DataFrame) else serie
+
+def _coluna_texto(df: pd.DataFrame, coluna) -> pd.Series:
+    """Equivalente colunar de str(row.get(coluna, '')).strip()."""
+    serie = _obter_coluna(df, coluna)
+    if serie is None:
+        return pd.Series('', index=df.index, dtype=object)
+    # astype(object): numa coluna vazia, map(str) mantém o dtype original (ex.: float) e .str falharia
+    return serie.map(str).astype(object).str.strip()
+
+def _coluna_valor(df: pd.DataFrame, coluna, padrao: float = np.nan) -> np.ndarray:
+    """Valores numéricos da coluna (NaN onde não houver valor); `padrao` quando a coluna não existe."""
+    serie = _obter_coluna(df, coluna)
+    if serie is None:
+        return np.full(len(df), padrao)
+    return parse_financial_values(serie)
+
+def _linhas_com_data(datas: pd.Series) -> np.ndarray:
+    """Linhas com data preenchida (os parsers ignoram linhas sem data)."""
+    return ((datas != '') & (datas != 'nan')).to_numpy(dtype=bool)
+
+def _montar_transacoes(datas: pd.Series, descricoes: pd.Series, valores: np.ndarray, doc_type: str, tipos_operacao) -> pd.DataFrame:
+    """Monta o DataFrame no esquema canônico a partir das colunas já filtradas."""
+    return pd.DataFrame({
+        'date': parse_date_series(datas).to_numpy(),
+        'description': descricoes.to_numpy(dtype=object),
+        'value': np.asarray(valores, dtype=np.float64),
+        'currency': 'BRL',
+        'doc_type': doc_type,
+        'original_type_op': tipos_operacao,
+    }, columns=COLUNAS_TRANSACAO)
+
+def transacoes_vazias() -> pd.DataFrame:
+    """DataFrame de transações vazio, com as colunas canônicas."""
+    return pd.DataFrame(columns=COLUNAS_TRANSACAO)
+
+def process_dataframe_generic(df: pd.DataFrame, doc_type: str) -> pd.DataFrame:
     """Processa DataFrames genéricos (CSV/XLSX) tentando mapear colunas automaticamente."""
-    transacoes = []
-    
     mapeamento = _mapear_colunas_automaticamente(df)
-    
-    for _, row in df.iterrows():
-        data_raw = str(row.get(mapeamento.get('data'), '')).strip()
-        descricao = str(row.get(mapeamento.get('descricao'), '')).strip()
-        valor_str = str(row.get(mapeamento.get('valor'), '0')).strip()
-        
-        if not data_raw or data_raw == 'nan':
-            continue
-        
-        valor_num = parse_financial_value(valor_str)
-        
-        # Se não conseguiu parsear o valor principal, tentar colunas separadas para débito e crédito
-        if valor_num is None or valor_num == 0: 
-            debito_col = mapeamento.get('debito')
-            credito_col = mapeamento.get('credito')
-            
-            debito_val = parse_financial_value(str(row.get(debito_col, '')).strip()) if debito_col else None
-            credito_val = parse_financial_value(str(row.get(credito_col, '')).strip()) if credito_col else None
-            
-            if debito_val is not None and debito_val != 0:
-                valor_num = -abs(debito_val)
-            elif credito_val is not None and credito_val != 0:
-                valor_num = abs(credito_val)
-            else:
-                continue # Não há valor válido na linha
-
-        eh_entrada = valor_num >= 0
-        original_type_op = "Entrada" if eh_entrada else "Saída"
-        
-        transacoes.append({
-            'date': parse_date_string(data_raw),
-            'description': descricao,
-            'value': valor_num,
-            'currency': 'BRL',
-            'doc_type': doc_type,
-            'original_type_op': original_type_op,
-        })
-    
-    return transacoes
+
+    datas = _coluna_texto(df, mapeamento.get('data'))
+    descricoes = _coluna_texto(df, mapeamento.get('descricao'))
+    valores = _coluna_valor(df, mapeamento.get('valor'), padrao=0.0)
+
+    # Se não conseguiu parsear o valor principal, tentar colunas separadas para débito e crédito
+    sem_valor = np.isnan(valores) | (valores == 0)
+    debitos = _coluna_valor(df, mapeamento.get('debito'))
+    creditos = _coluna_valor(df, mapeamento.get('credito'))
+    usa_debito = sem_valor & ~np.isnan(debitos) & (debitos != 0)
+    usa_credito = sem_valor & ~usa_debito & ~np.isnan(creditos) & (creditos != 0)
+    valores = np.select([usa_debito, usa_credito], [-np.abs(debitos), np.abs(creditos)], default=valores)
+
+    validas = _linhas_com_data(datas) & (~sem_valor | usa_debito | usa_credito) # Sem valor válido na linha: descartada
+    valores = valores[validas]
+    return _montar_transacoes(
+        datas[validas], descricoes[validas], valores, doc_type,
+        np.where(valores >= 0, 'Entrada', 'Saída').astype(object)
+    )
 
 # --- Parsers Específicos para DataFrames de Bancos (Baseados na sua versão `dataframe_parsers.py`) ---
 
-def process_nubank_extrato_csv(df: pd.DataFrame, doc_type: str) -> list[dict]:
+def _process_extrato_simples(df: pd.DataFrame, doc_type: str, coluna_data: str, coluna_descricao: str) -> pd.DataFrame:
+    """Extratos com uma única coluna 'Valor' já com sinal (Nubank, Inter)."""
+    datas = _coluna_texto(df, coluna_data)
+    descricoes = _coluna_texto(df, coluna_descricao)
+    valores = _coluna_valor(df, 'Valor', padrao=0.0)
+
+    validas = _linhas_com_data(datas) & ~np.isnan(valores)
+    descricoes = descricoes[validas]
+    return _montar_transacoes(datas[validas], descricoes, valores[validas], doc_type, identificar_tipos_transacao(descricoes))
+
+def _process_fatura_simples(df: pd.DataFrame, doc_type: str, coluna_data: str, coluna_descricao: str) -> pd.DataFrame:
+    """Faturas com uma coluna 'Valor' sem sinal confiável: todo lançamento é saída (Nubank, Inter)."""
+    datas = _coluna_texto(df, coluna_data)
+    descricoes = _coluna_texto(df, coluna_descricao)
+    valores = -np.abs(np.nan_to_num(_coluna_valor(df, 'Valor', padrao=0.0), nan=0.0)) # Faturas são sempre saídas
+
+    validas = _linhas_com_data(datas)
+    descricoes = descricoes[validas]
+    return _montar_transacoes(datas[validas], descricoes, valores[validas], doc_type, identificar_tipos_transacao(descricoes))
+
+def process_nubank_extrato_csv(df: pd.DataFrame, doc_type: str) -> pd.DataFrame:
     """Processa CSV de extrato do Nubank."""
-    transacoes = []
-    for _, row in df.iterrows():
-        data = str(row.get('Data', '')).strip()
-        descricao = str(row.get('Descrição', '')).strip()
-        valor_str = str(row.get('Valor', '0')).strip()
-        
-        if not data or data == 'nan': continue
-        
-        valor_num = parse_financial_value(valor_str)
-        if valor_num is None: continue
-
-        eh_entrada = valor_num >= 0
-        original_type_op = "Entrada" if eh_entrada else "Saída"
-        
-        transacoes.append({
-            'date': parse_date_string(data),
-            'description': descricao,
-            'value': valor_num,
-            'currency': 'BRL',
-            'doc_type': doc_type,
-            'original_type_op': _identificar_tipo_transacao_simples(descricao)
-        })
-    return transacoes
-
-def process_nubank_fatura_csv(df: pd.DataFrame, doc_type: str) -> list[dict]:
+    return _process_extrato_simples(df, doc_type, 'Data', 'Descrição')
+
+def process_nubank_fatura_csv(df: pd.DataFrame, doc_type: str) -> pd.DataFrame:
     """Processa CSV de fatura do Nubank."""
-    transacoes = []
-    for _, row in df.iterrows():
-        data = str(row.get('Data da transação', '')).strip()
-        estabelecimento = str(row.get('Estabelecimento', '')).strip()
-        valor_str = str(row.get('Valor', '0')).strip()
-        
-        if not data or data == 'nan': continue
-        
-        valor_num = -abs(parse_financial_value(valor_str) or 0) # Faturas são sempre saídas
-        
-        transacoes.append({
-            'date': parse_date_string(data),
-            'description': estabelecimento,
-            'value': valor_num,
-            'currency': 'BRL',
-            'doc_type': doc_type,
-            'original_type_op': _identificar_tipo_transacao_simples(estabelecimento)
-        })
-    return transacoes
-
-def process_inter_extrato_csv(df: pd.DataFrame, doc_type: str) -> list[dict]:
+    return _process_fatura_simples(df, doc_type, 'Data da transação', 'Estabelecimento')
+
+def process_inter_extrato_csv(df: pd.DataFrame, doc_type: str) -> pd.DataFrame:
     """Processa CSV de extrato do Inter."""
-    transacoes = []
-    for _, row in df.iterrows():
-        data = str(row.get('Data', '')).strip()
-        historico = str(row.get('Histórico', '')).strip()
-        valor_str = str(row.get('Valor', '0')).strip()
-        
-        if not data or data == 'nan': continue
-        
-        valor_num = parse_financial_value(valor_str)
-        if valor_num is None: continue
-
-        eh_entrada = valor_num >= 0
-        original_type_op = "Entrada" if eh_entrada else "Saída"
-        
-        transacoes.append({
-            'date': parse_date_string(data),
-            'description': historico,
-            'value': valor_num,
-            'currency': 'BRL',
-            'doc_type': doc_type,
-            'original_type_op': _identificar_tipo_transacao_simples(historico)
-        })
-    return transacoes
-
-def process_inter_fatura_csv(df: pd.DataFrame, doc_type: str) -> list[dict]:
+    return _process_extrato_simples(df, doc_type, 'Data', 'Histórico')
+
+def process_inter_fatura_csv(df: pd.DataFrame, doc_type: str) -> pd.DataFrame:
     """Processa CSV de fatura do Inter."""
-    transacoes = []
-    for _, row in df.iterrows():
-        data = str(row.get('Data', '')).strip()
-        descricao = str(row.get('Descrição', '')).strip()
-        valor_str = str(row.get('Valor', '0')).strip()
-        
-        if not data or data == 'nan': continue
-        
-        valor_num = -abs(parse_financial_value(valor_str) or 0) # Faturas são sempre saídas
-        
-        transacoes.append({
-            'date': parse_date_string(data),
-            'description': descricao,
-            'value': valor_num,
-            'currency': 'BRL',
-            'doc_type': doc_type,
-            'original_type_op': _identificar_tipo_transacao_simples(descricao)
-        })
-    return transacoes
-
-def process_caixa_extrato_csv(df: pd.DataFrame, doc_type: str) -> list[dict]:
+    return _process_fatura_simples(df, doc_type, 'Data', 'Descrição')
+
+def process_caixa_extrato_csv(df: pd.DataFrame, doc_type: str) -> pd.DataFrame:
     """Processa CSV/Excel de extrato da Caixa."""
-    transacoes = []
-    for _, row in df.iterrows():
-        data = str(row.get('Data Mov.', '')).strip()
-        historico = str(row.get('Histórico', '')).strip()
-        
-        if not data or data == 'nan': continue
-        
-        # A Caixa pode ter colunas separadas para débito e crédito
-        debito_val = parse_financial_value(str(row.get('Débito', '')).strip())
-        credito_val = parse_financial_value(str(row.get('Crédito', '')).strip())
-        
-        valor_num = None
-        original_type_op = 'Outros'
-
-        if debito_val is not None and debito_val != 0:
-            valor_num = -abs(debito_val)
-            original_type_op = 'Saída (Débito)'
-        elif credito_val is not None and credito_val != 0:
-            valor_num = abs(credito_val)
-            original_type_op = 'Entrada (Crédito)'
-        else: # Fallback para coluna 'Valor' se D/C não for usado
-            valor_num = parse_financial_value(str(row.get('Valor', '0')).strip())
-            if valor_num is None: continue
-            original_type_op = "Entrada" if valor_num >= 0 else "Saída"
-
-        transacoes.append({
-            'date': parse_date_string(data),
-            'description': historico,
-            'value': valor_num,
-            'currency': 'BRL',
-            'doc_type': doc_type,
-            'original_type_op': _identificar_tipo_transacao_simples(historico) # Reavalia com descrição
-        })
-    return transacoes
-
-def process_picpay_fatura_csv(df: pd.DataFrame, doc_type: str) -> list[dict]:
+    datas = _coluna_texto(df, 'Data Mov.')
+    historicos = _coluna_texto(df, 'Histórico')
+
+    # A Caixa pode ter colunas separadas para débito e crédito
+    debitos = _coluna_valor(df, 'Débito')
+    creditos = _coluna_valor(df, 'Crédito')
+    usa_debito = ~np.isnan(debitos) & (debitos != 0)
+    usa_credito = ~usa_debito & ~np.isnan(creditos) & (creditos != 0)
+    # Fallback para coluna 'Valor' se D/C não for usado
+    valores = np.select([usa_debito, usa_credito], [-np.abs(debitos), np.abs(creditos)], default=_coluna_valor(df, 'Valor', padrao=0.0))
+
+    validas = _linhas_com_data(datas) & ~np.isnan(valores)
+    historicos = historicos[validas]
+    return _montar_transacoes(datas[validas], historicos, valores[validas], doc_type, identificar_tipos_transacao(historicos)) # Reavalia com descrição
+
+def process_picpay_fatura_csv(df: pd.DataFrame, doc_type: str) -> pd.DataFrame:
     """Processa CSV de fatura do PicPay."""
-    transacoes = []
-    for _, row in df.iterrows():
-        data = str(row.get('Data', '')).strip()
-        descricao = str(row.get('Descrição', '')).strip()
-        valor_str = str(row.get('Valor', '0')).strip()
-        tipo_col = str(row.get('Tipo', '')).strip().lower() # Tipo na coluna (recebido/pago)
-        
-        if not data or data == 'nan': continue
-        
-        valor_num = parse_financial_value(valor_str)
-        if valor_num is None: continue
-
-        # Determinar entrada/saída pelo tipo da coluna ou valor
-        if 'recebido' in tipo_col or 'entrada' in tipo_col:
-            valor_num = abs(valor_num)
-            original_type_op = 'Entrada'
-        elif 'pago' in tipo_col or 'saida' in tipo_col:
-            valor_num = -abs(valor_num)
-            original_type_op = 'Saída'
-        else:
-            original_type_op = "Entrada" if valor_num >= 0 else "Saída"
-
-        transacoes.append({
-            'date': parse_date_string(data),
-            'description': descricao,
-            'value': valor_num,
-            'currency': 'BRL',
-            'doc_type': doc_type,
-            'original_type_op': _identificar_tipo_transacao_simples(descricao)
-        })
-    return transacoes
\ No newline at end of file
+    datas = _coluna_texto(df, 'Data')
+    descricoes = _coluna_texto(df, 'Descrição')
+    valores = _coluna_valor(df, 'Valor', padrao=0.0)
+    tipos_coluna = _coluna_texto(df, 'Tipo').str.lower() # Tipo na coluna (recebido/pago)
+
+    # Determinar entrada/saída pelo tipo da coluna ou valor
+    entrada = tipos_coluna.str.contains('recebido|entrada', regex=True).to_numpy(dtype=bool)
+    saida = ~entrada & tipos_coluna.str.contains('pago|saida', regex=True).to_numpy(dtype=bool)
+    valores = np.select([entrada, saida], [np.abs(valores), -np.abs(valores)], default=valores)
+
+    validas = _linhas_com_data(datas) & ~np.isnan(valores)
+    descricoes = descricoes[validas]
+    return _montar_transacoes(datas[validas], descricoes, valores[validas], doc_type, identificar_tipos_transacao(descricoes))
+
+# Registro dos parsers de tabela (ver bank_specific_parsers.registrar_parser). Os do Inter e do PicPay não
+# declaram colunas: Data/Histórico/Valor e Data/Descrição/Valor(/Tipo) são cabeçalhos comuns a extratos e
+# faturas de vários bancos, e como impressão digital desviariam esses CSVs para esses parsers. Eles são
+# escolhidos pelo banco detectado (palavras-chave do conteúdo ou nome do arquivo).
+registrar_parser(process_nubank_extrato_csv, 'Nubank Extrato CSV', 'Nubank', 'extrato_bancario', ('csv', 'xlsx'),
+                 colunas=('Data', 'Valor', 'Identificador', 'Descrição'))
+registrar_parser(process_nubank_fatura_csv, 'Nubank Fatura CSV', 'Nubank', 'fatura_cartao', ('csv', 'xlsx'),
+                 colunas=('Data da transação', 'Estabelecimento', 'Valor'))
+registrar_parser(process_inter_extrato_csv, 'Inter Extrato CSV', 'Banco Inter', 'extrato_bancario', ('csv', 'xlsx'))
+registrar_parser(process_inter_fatura_csv, 'Inter Fatura CSV', 'Banco Inter', 'fatura_cartao', ('csv', 'xlsx'))
+registrar_parser(process_caixa_extrato_csv, 'Caixa Extrato CSV', 'Caixa Econômica Federal', 'extrato_bancario', ('csv', 'xlsx'),
+                 colunas=('Data Mov.', 'Histórico'))
+registrar_parser(process_picpay_fatura_csv, 'PicPay Fatura CSV', 'PicPay', 'fatura_cartao', ('csv', 'xlsx'))
\ No newline at end of file
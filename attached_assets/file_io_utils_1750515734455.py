@@ -5,6 +5,11 @@ import io
 import os
 import re
 from datetime import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import shutil
 
 # As instalações de biblioteca serão no arquivo principal (main.py)
 # Imports para o Code Interpreter (serão validados pelo main.py)
@@ -39,6 +44,39 @@ try:
 except ImportError:
     pass # Será instalado pelo main.py
 
+try:
+    import pyarrow # Tabelas do cache de extração em Parquet
+    _PARQUET_DISPONIVEL = True
+except ImportError:
+    _PARQUET_DISPONIVEL = False
+
+# Parâmetros do OCR de PDFs escaneados (perform_ocr / iter_ocr_pages)
+OCR_DPI = 300
+# DPI adaptativo: cada página é lida na primeira resolução e só é renderizada de novo na seguinte
+# quando a confiança média das palavras reconhecidas pelo Tesseract fica abaixo do mínimo
+OCR_DPIS_ADAPTATIVOS = (150, 300)
+OCR_CONFIANCA_MINIMA = 70
+# Páginas de PDF com menos caracteres que isso na camada de texto, e com imagens, passam por OCR
+OCR_MIN_CARACTERES_PAGINA = 20
+OCR_MAX_WORKERS = None # None = os.cpu_count()
+OCR_MEMORY_BUDGET_MB = 2048 # Memória total que os workers de OCR podem ocupar ao mesmo tempo
+# Páginas escaneadas seguidas que iter_pdf_pages junta antes de passar ao pool de OCR (iter_ocr_pages)
+OCR_LOTE_PAGINAS = 16
+# Pico estimado por página em renderização + Tesseract, em múltiplos do tamanho do pixmap RGB
+_OCR_FATOR_MEMORIA_PAGINA = 4
+
+# Backend de extração de PDFs (ver BACKENDS_PDF): 'pdfplumber' ou 'pymupdf'
+PDF_BACKEND = 'pdfplumber'
+# Tolerância vertical (em pontos) para juntar palavras na mesma linha no backend PyMuPDF, como no pdfplumber
+_PYMUPDF_TOLERANCIA_LINHA = 3
+
+# Cache de extração em disco (ver CacheExtracao), desativado até configurar_cache_extracao ser chamado.
+# Incrementar VERSAO_EXTRATOR sempre que a extração de texto/tabelas mudar, para que resultados antigos
+# deixem de ser usados. O diretório padrão é do usuário (~/.cache), nunca um /tmp compartilhado: as
+# entradas contêm o texto financeiro dos documentos.
+VERSAO_EXTRATOR = '2'
+DIRETORIO_CACHE_EXTRACAO = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'cache_extracao')
+
 
 def detect_file_type_by_filename(filename: str) -> str:
     """Detecta o tipo de documento (extrato, fatura, contracheque) pelo nome do arquivo."""
@@ -72,38 +110,389 @@ def detect_bank_from_filename(filename: str) -> str:
         return 'Santander'
     return 'Desconhecido'
 
-def handle_uploaded_file(file_path: str, file_type: str) -> dict:
+# --- Cache de extração endereçado por conteúdo ---
+
+class CacheExtracao:
+    """
+    Cache em disco do texto e das tabelas extraídos de documentos. A chave é o SHA-256 dos bytes do
+    arquivo, a etapa (tipo de arquivo, OCR, tabula) e VERSAO_EXTRATOR, então o mesmo documento enviado de
+    novo (com qualquer nome) não passa outra vez por pdfplumber, tabula ou Tesseract.
+    Cada entrada é um diretório com meta.json (texto e rótulos das colunas) e uma tabela Parquet por
+    DataFrame; extrações com tabelas que o Parquet não aceita não são guardadas (nada é lido com pickle).
+    O diretório é criado com permissão 0700 e recusado se pertencer a outro usuário. O total em disco é
+    acompanhado a cada gravação; quando passa de tamanho_maximo_mb, as entradas usadas há mais tempo são removidas.
+    """
+
+    def __init__(self, diretorio: str, tamanho_maximo_mb: float = 1024):
+        self.diretorio = diretorio
+        self.tamanho_maximo_mb = tamanho_maximo_mb
+        self.acertos = 0
+        self.falhas = 0
+        self.gravacoes = 0
+        self.remocoes = 0
+        self._hashes = {} # (caminho, tamanho, mtime) -> SHA-256, para não reler o arquivo a cada etapa
+        self._criar_diretorio()
+        self._bytes_em_disco = sum(tamanho for _, tamanho, _ in self._entradas())
+
+    def _criar_diretorio(self):
+        """Cria o diretório só para o usuário atual (0700); um diretório de outro usuário não é usado."""
+        os.makedirs(self.diretorio, mode=0o700, exist_ok=True)
+        if hasattr(os, 'getuid'):
+            info = os.stat(self.diretorio)
+            if info.st_uid != os.getuid():
+                raise PermissionError(f"O diretório do cache de extração {self.diretorio} pertence a outro usuário.")
+            if info.st_mode & 0o077:
+                os.chmod(self.diretorio, 0o700)
+
+    def _hash_conteudo(self, origem: str | bytes) -> str:
+        if isinstance(origem, bytes):
+            return hashlib.sha256(origem).hexdigest()
+        info = os.stat(origem)
+        chave_arquivo = (os.path.abspath(origem), info.st_size, info.st_mtime_ns)
+        if chave_arquivo not in self._hashes:
+            sha = hashlib.sha256()
+            with open(origem, 'rb') as arquivo:
+                for bloco in iter(lambda: arquivo.read(1 << 20), b''):
+                    sha.update(bloco)
+            self._hashes[chave_arquivo] = sha.hexdigest()
+        return self._hashes[chave_arquivo]
+
+    def _caminho_entrada(self, origem: str | bytes, etapa: str) -> str:
+        sha = self._hash_conteudo(origem)
+        return os.path.join(self.diretorio, sha[:2], f"{sha}_{etapa}_v{VERSAO_EXTRATOR}")
+
+    def obter(self, origem: str | bytes, etapa: str) -> dict | None:
+        """Retorna {'text', 'tables'} guardado para o conteúdo e a etapa, ou None."""
+        try:
+            caminho = self._caminho_entrada(origem, etapa)
+            with open(os.path.join(caminho, 'meta.json'), encoding='utf-8') as arquivo:
+                meta = json.load(arquivo)
+            tables = []
+            for tabela in meta['tables']:
+                if not tabela['arquivo'].endswith('.parquet'): # Entradas antigas em pickle não são lidas
+                    raise ValueError(tabela['arquivo'])
+                df = pd.read_parquet(os.path.join(caminho, tabela['arquivo']))
+                df.columns = tabela['colunas']
+                tables.append(df)
+            os.utime(os.path.join(caminho, 'meta.json')) # Marca como usada recentemente (para a remoção)
+        except (OSError, ValueError, KeyError):
+            self.falhas += 1
+            return None
+        self.acertos += 1
+        return {"text": meta['text'], "tables": tables}
+
+    def guardar(self, origem: str | bytes, etapa: str, extracted: dict):
+        """Grava texto e tabelas de uma extração. A entrada é montada em um diretório temporário e renomeada."""
+        try:
+            caminho = self._caminho_entrada(origem, etapa)
+            temporario = f"{caminho}.tmp{os.getpid()}"
+            os.makedirs(temporario, exist_ok=True)
+            meta = {'text': extracted['text'], 'tables': []}
+            for i, df in enumerate(extracted['tables']):
+                meta['tables'].append(self._gravar_tabela(df, temporario, i))
+            with open(os.path.join(temporario, 'meta.json'), 'w', encoding='utf-8') as arquivo:
+                json.dump(meta, arquivo, ensure_ascii=False)
+            tamanho = sum(entrada.stat().st_size for entrada in os.scandir(temporario))
+            try:
+                os.rename(temporario, caminho)
+            except OSError: # Outro processo gravou a mesma entrada antes
+                shutil.rmtree(temporario, ignore_errors=True)
+                return
+        except ValueError: # Tabela que o Parquet não aceita: a extração não é guardada
+            shutil.rmtree(temporario, ignore_errors=True)
+            return
+        except OSError as e:
+            print(f"Aviso: não foi possível gravar no cache de extração: {e}")
+            return
+        self.gravacoes += 1
+        self._bytes_em_disco += tamanho
+        if self._bytes_em_disco > self.tamanho_maximo_mb * 1024 * 1024:
+            self._remover_excedente()
+
+    @staticmethod
+    def _gravar_tabela(df: pd.DataFrame, diretorio: str, i: int) -> dict:
+        """Grava a tabela em Parquet; ValueError se o Parquet não estiver disponível ou não aceitar a tabela."""
+        if not _PARQUET_DISPONIVEL:
+            raise ValueError("pyarrow não disponível")
+        colunas = list(df.columns)
+        try:
+            json.dumps(colunas) # Rótulos vão para o meta.json; o Parquet exige nomes de coluna únicos
+            df.set_axis([str(j) for j in range(len(colunas))], axis=1).to_parquet(os.path.join(diretorio, f"{i}.parquet"))
+        except (TypeError, ValueError, pyarrow.ArrowException) as e: # Rótulos ou colunas de tipos mistos
+            raise ValueError(str(e)) from e
+        return {'arquivo': f"{i}.parquet", 'colunas': colunas}
+
+    def _entradas(self) -> list[tuple[float, int, str]]:
+        """(último uso, bytes, caminho) de cada entrada em disco."""
+        entradas = []
+        for prefixo in os.listdir(self.diretorio):
+            diretorio_prefixo = os.path.join(self.diretorio, prefixo)
+            if not os.path.isdir(diretorio_prefixo):
+                continue
+            for nome in os.listdir(diretorio_prefixo):
+                caminho = os.path.join(diretorio_prefixo, nome)
+                try:
+                    ultimo_uso = os.path.getmtime(os.path.join(caminho, 'meta.json'))
+                    tamanho = sum(entrada.stat().st_size for entrada in os.scandir(caminho))
+                except OSError: # Entrada em gravação ou removida por outro processo
+                    continue
+                entradas.append((ultimo_uso, tamanho, caminho))
+        return entradas
+
+    def _remover_excedente(self):
+        """
+        Chamado só quando o total acompanhado passa do limite: lista as entradas (para a ordem de uso e para
+        incluir o que outros processos gravaram) e remove as usadas há mais tempo.
+        """
+        entradas = sorted(self._entradas())
+        self._bytes_em_disco = sum(tamanho for _, tamanho, _ in entradas)
+        for _, tamanho, caminho in entradas: # Da usada há mais tempo para a mais recente
+            if self._bytes_em_disco <= self.tamanho_maximo_mb * 1024 * 1024:
+                break
+            shutil.rmtree(caminho, ignore_errors=True)
+            self._bytes_em_disco -= tamanho
+            self.remocoes += 1
+
+    def estatisticas(self) -> dict[str, int | float | str]:
+        """Contadores de acertos/falhas deste processo e ocupação atual do diretório do cache."""
+        consultas = self.acertos + self.falhas
+        entradas = self._entradas()
+        return {
+            'acertos': self.acertos,
+            'falhas': self.falhas,
+            'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+            'gravacoes': self.gravacoes,
+            'remocoes': self.remocoes,
+            'entradas_em_disco': len(entradas),
+            'mb_em_disco': sum(tamanho for _, tamanho, _ in entradas) / (1024 * 1024),
+            'tamanho_maximo_mb': self.tamanho_maximo_mb,
+            'diretorio': self.diretorio,
+        }
+
+    def limpar(self):
+        """Remove todas as entradas do disco e zera os contadores."""
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+        self._criar_diretorio()
+        self._bytes_em_disco = 0
+        self.acertos = self.falhas = self.gravacoes = self.remocoes = 0
+        self._hashes.clear()
+
+_CACHE_EXTRACAO = None # Desativado por padrão (ver configurar_cache_extracao)
+
+def configurar_cache_extracao(diretorio: str | None = DIRETORIO_CACHE_EXTRACAO, tamanho_maximo_mb: float = 1024) -> CacheExtracao | None:
+    """
+    Ativa o cache global de extração (por padrão em DIRETORIO_CACHE_EXTRACAO, do usuário atual) ou troca
+    o diretório dele. Com diretorio=None o cache é desativado.
+    """
+    global _CACHE_EXTRACAO
+    _CACHE_EXTRACAO = CacheExtracao(diretorio, tamanho_maximo_mb) if diretorio else None
+    return _CACHE_EXTRACAO
+
+def cache_extracao_ativo() -> bool:
+    """Se o cache global de extração está ativado (ver configurar_cache_extracao)."""
+    return _CACHE_EXTRACAO is not None
+
+def estatisticas_cache_extracao() -> dict[str, int | float | str]:
+    """Relatório do cache global de extração (vazio se estiver desativado)."""
+    return _CACHE_EXTRACAO.estatisticas() if _CACHE_EXTRACAO is not None else {}
+
+def _com_cache_extracao(origem: str | bytes, etapa: str, extrair) -> dict:
+    """Consulta o cache para (conteúdo, etapa); na falta, chama extrair() e guarda o resultado se não for vazio."""
+    if _CACHE_EXTRACAO is None:
+        return extrair()
+    extracted = _CACHE_EXTRACAO.obter(origem, etapa)
+    if extracted is None:
+        extracted = extrair()
+        if extracted['text'].strip() or extracted['tables']: # Falhas (ex.: biblioteca ausente) não são guardadas
+            _CACHE_EXTRACAO.guardar(origem, etapa, extracted)
+    return extracted
+
+def handle_uploaded_file(file_path: str, file_type: str, backend: str | None = None) -> dict:
     """
     Lida com o upload e leitura de diferentes tipos de arquivos.
-    Retorna texto e/ou DataFrames de tabelas.
+    Retorna texto e/ou DataFrames de tabelas. Com o cache de extração ativado, arquivos com conteúdo já visto são lidos dele.
+    :param backend: Backend de extração de PDF (chave de BACKENDS_PDF); None = PDF_BACKEND.
+    """
+    backend = backend or PDF_BACKEND
+    if not os.path.isfile(file_path):
+        return _extract_uploaded_file(file_path, file_type, backend)
+    etapa = f"{file_type}-{backend}" if file_type == 'pdf' else file_type
+    return _com_cache_extracao(file_path, etapa, lambda: _extract_uploaded_file(file_path, file_type, backend))
+
+def extract_tables_tabula(file_path: str) -> list[pd.DataFrame]:
+    """
+    Tabelas de um PDF via tabula-py (usado quando o pdfplumber não encontra conteúdo), com cache de extração.
+    Levanta ImportError se o tabula-py não estiver instalado.
+    """
+    def extrair():
+        import tabula
+        temp_dfs = tabula.read_pdf(file_path, pages='all', multiple_tables=True, pandas_options={'header': None})
+        return {"text": "", "tables": [df for df in temp_dfs if not df.empty]}
+    return _com_cache_extracao(file_path, 'tabula', extrair)['tables']
+
+def _tabelas_para_dataframes(tables: list[list[list]], backend: str) -> tuple[list[pd.DataFrame], list[str]]:
+    """Converte tabelas extraídas (listas de linhas) em DataFrames; as que não convertem voltam como texto."""
+    page_tables = []
+    trechos = []
+    for table in tables:
+        if table:
+            try:
+                if table and len(table) > 1 and all(table[0]):
+                    df = pd.DataFrame(table[1:], columns=table[0])
+                else:
+                    df = pd.DataFrame(table)
+                page_tables.append(df)
+            except Exception as df_e:
+                print(f"Aviso: Não foi possível converter parte da tabela em DataFrame com {backend}: {df_e}. Extraindo como texto.")
+                trechos.append("\n".join([str(item) for sublist in table for item in sublist if item is not None]) + "\n")
+    return page_tables, trechos
+
+def _paginas_pdfplumber(file_path: str):
+    """
+    Backend pdfplumber: gera (page_num, texto, tabelas, sem_camada_de_texto) por página. sem_camada_de_texto
+    indica página que parece escaneada (sem texto, só imagem) e precisa de OCR.
+    """
+    import pdfplumber
+    with pdfplumber.open(file_path) as pdf:
+        for page_num, page in enumerate(pdf.pages):
+            page_text = page.extract_text()
+            sem_camada_de_texto = len((page_text or "").strip()) < OCR_MIN_CARACTERES_PAGINA and bool(page.images)
+            page_tables, trechos_tabelas = _tabelas_para_dataframes(page.extract_tables(), 'pdfplumber')
+            page.close() # Libera os objetos de layout da página antes de seguir para a próxima
+            yield page_num, "".join(([page_text + "\n"] if page_text else []) + trechos_tabelas), page_tables, sem_camada_de_texto
+
+def _texto_pagina_pymupdf(page) -> str:
+    """
+    Reconstrói as linhas de uma página a partir das caixas de palavras do PyMuPDF: palavras cujo topo está
+    a até _PYMUPDF_TOLERANCIA_LINHA pontos do topo da linha corrente formam uma linha, ordenadas por x.
+    Inclui o texto fora da área visível da página, como o pdfplumber.
     """
+    import fitz # PyMuPDF
+
+    linhas = []
+    topo_linha = None
+    for x0, y0, x1, y1, palavra, *_ in sorted(page.get_text('words', clip=fitz.INFINITE_RECT()), key=lambda w: (w[1], w[0])):
+        if topo_linha is None or y0 - topo_linha > _PYMUPDF_TOLERANCIA_LINHA:
+            linhas.append([])
+            topo_linha = y0
+        linhas[-1].append((x0, palavra))
+    return "\n".join(" ".join(palavra for _, palavra in sorted(linha)) for linha in linhas)
+
+def _pagina_tem_linhas_pymupdf(page) -> bool:
+    """Se a página desenha linhas ou retângulos, sem os quais find_tables não encontra tabelas."""
+    return any(item[0] in ('l', 're') for desenho in page.get_cdrawings() for item in desenho.get('items', ()))
+
+def _paginas_pymupdf(file_path: str):
+    """
+    Backend PyMuPDF: uma única leitura do documento; texto remontado das caixas de palavras e tabelas
+    simples (com linhas de grade) por page.find_tables(). Mesmo formato de _paginas_pdfplumber.
+    """
+    import fitz # PyMuPDF
+    with fitz.open(file_path) as pdf_document:
+        for page_num, page in enumerate(pdf_document):
+            page_text = _texto_pagina_pymupdf(page)
+            sem_camada_de_texto = len(page_text.strip()) < OCR_MIN_CARACTERES_PAGINA and bool(page.get_images())
+            # find_tables (estratégia por linhas de grade) é a parte cara: só para páginas com linhas/retângulos vetoriais
+            tabelas = page.find_tables() if _pagina_tem_linhas_pymupdf(page) else []
+            page_tables, trechos_tabelas = _tabelas_para_dataframes([tabela.extract() for tabela in tabelas], 'PyMuPDF')
+            yield page_num, "".join(([page_text + "\n"] if page_text else []) + trechos_tabelas), page_tables, sem_camada_de_texto
+
+# Backends de extração de PDF, selecionáveis por chamada em handle_uploaded_file / iter_pdf_pages
+BACKENDS_PDF = {
+    'pdfplumber': _paginas_pdfplumber,
+    'pymupdf': _paginas_pymupdf,
+}
+
+def _ocr_disponivel() -> bool:
+    """Se pytesseract, PyMuPDF e o binário do Tesseract estão disponíveis; avisa quando não estão."""
+    try:
+        import pytesseract
+        import fitz # PyMuPDF
+    except ImportError:
+        print("Aviso: pytesseract ou PyMuPDF não encontrados. Páginas escaneadas do PDF ficarão sem texto.")
+        return False
+    try:
+        pytesseract.get_tesseract_version()
+    except pytesseract.TesseractNotFoundError:
+        print("Aviso: Tesseract OCR não encontrado. Páginas escaneadas do PDF ficarão sem texto.")
+        return False
+    return True
+
+def iter_pdf_pages(file_path: str, ocr: bool = True, backend: str | None = None):
+    """
+    Extração de PDF página a página: gera (page_num, texto, tabelas) sem acumular o documento, então a
+    memória do gerador fica limitada a uma página (mais as páginas escaneadas de um lote de OCR, que quase não
+    têm conteúdo). O que fica guardado depende de quem consome: iter_pdf_lines não guarda nada, já o
+    _extract_document de main guarda o texto de todas as páginas (ver _PdfPageStream).
+    Com ocr=True, páginas sem camada de texto seguidas são juntadas (até OCR_LOTE_PAGINAS) e passam pelo
+    OCR em paralelo de iter_ocr_pages (DPI adaptativo); cada página sai assim que o OCR dela termina.
+    O texto de cada página termina em "\n", como em handle_uploaded_file.
+    :param backend: Backend de extração (chave de BACKENDS_PDF); None = PDF_BACKEND.
+    """
+    backend = backend or PDF_BACKEND
+    escaneadas = [] # (page_num, texto, tabelas) das páginas aguardando o OCR do lote
+    ocr_verificado = False
+    try:
+        for page_num, page_text, page_tables, sem_camada_de_texto in BACKENDS_PDF[backend](file_path):
+            if sem_camada_de_texto and ocr and not ocr_verificado:
+                ocr = _ocr_disponivel()
+                ocr_verificado = True
+            if sem_camada_de_texto and ocr:
+                escaneadas.append((page_num, page_text, page_tables))
+                if len(escaneadas) >= OCR_LOTE_PAGINAS:
+                    yield from _paginas_com_ocr(file_path, escaneadas)
+                    escaneadas = []
+                continue
+            if escaneadas: # Mantém a ordem das páginas: o lote pendente sai antes desta
+                yield from _paginas_com_ocr(file_path, escaneadas)
+                escaneadas = []
+            yield page_num, page_text, page_tables
+        yield from _paginas_com_ocr(file_path, escaneadas)
+    except ImportError:
+        print(f"{backend} não está instalado ou acessível. Não foi possível extrair texto/tabelas de PDF diretamente.")
+    except Exception as e:
+        print(f"Erro ao ler PDF com {backend}: {e}.")
+
+def _paginas_com_ocr(file_path: str, escaneadas: list[tuple[int, str, list[pd.DataFrame]]]):
+    """Um lote de iter_pdf_pages: texto do OCR antes da camada de texto de cada página, na ordem das páginas."""
+    if not escaneadas:
+        return
+    textos_ocr = _ocr_paginas_sem_texto(file_path, [page_num for page_num, _, _ in escaneadas])
+    for page_num, page_text, page_tables in escaneadas:
+        _, ocr_text = next(textos_ocr, (page_num, "")) # OCR interrompido: as páginas restantes ficam sem ele
+        if ocr_text.strip():
+            page_text = ocr_text + "\n" + page_text
+        yield page_num, page_text, page_tables
+
+def iter_pdf_lines(file_path: str, ocr: bool = True, backend: str | None = None):
+    """Linhas de texto de um PDF, página a página (ver iter_pdf_pages), para os parsers que aceitam linhas."""
+    for page_num, page_text, page_tables in iter_pdf_pages(file_path, ocr=ocr, backend=backend):
+        yield from page_text.split('\n')
+
+def _extract_uploaded_file(file_path: str, file_type: str, backend: str = PDF_BACKEND) -> dict:
+    """Leitura efetiva de handle_uploaded_file, sem cache."""
     extracted_text = ""
     extracted_tables = []
 
     if file_type == 'pdf':
+        paginas_texto = [] # Texto de cada página, para inserir o OCR na posição da página
+        paginas_sem_texto = []
         try:
-            import pdfplumber
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        extracted_text += page_text + "\n"
-                    tables = page.extract_tables()
-                    for table in tables:
-                        if table:
-                            try:
-                                if table and len(table) > 1 and all(table[0]):
-                                    df = pd.DataFrame(table[1:], columns=table[0])
-                                else:
-                                    df = pd.DataFrame(table)
-                                extracted_tables.append(df)
-                            except Exception as df_e:
-                                print(f"Aviso: Não foi possível converter parte da tabela em DataFrame com pdfplumber: {df_e}. Extraindo como texto.")
-                                extracted_text += "\n".join([str(item) for sublist in table for item in sublist if item is not None]) + "\n"
+            for page_num, page_text, page_tables, sem_camada_de_texto in BACKENDS_PDF[backend](file_path):
+                paginas_texto.append(page_text)
+                extracted_tables.extend(page_tables)
+                if sem_camada_de_texto:
+                    paginas_sem_texto.append(page_num)
         except ImportError:
-            print("pdfplumber não está instalado ou acessível. Não foi possível extrair texto/tabelas de PDF diretamente.")
+            print(f"{backend} não está instalado ou acessível. Não foi possível extrair texto/tabelas de PDF diretamente.")
         except Exception as e:
-            print(f"Erro ao ler PDF com pdfplumber: {e}.")
+            print(f"Erro ao ler PDF com {backend}: {e}.")
+
+        # OCR só das páginas sem camada de texto (o restante do documento já foi lido acima)
+        for page_num, page_text in _ocr_paginas_sem_texto(file_path, paginas_sem_texto):
+            if page_text.strip():
+                paginas_texto[page_num] = page_text + "\n" + paginas_texto[page_num]
+        extracted_text = "".join(paginas_texto)
 
     elif file_type == 'docx':
         try:
@@ -156,6 +545,12 @@ def perform_ocr(file_path_or_bytes: str | bytes) -> str:
     :param file_path_or_bytes: Caminho do arquivo ou bytes (para arquivos em memória).
     :return: Texto extraído via OCR.
     """
+    if isinstance(file_path_or_bytes, str) and not os.path.isfile(file_path_or_bytes):
+        return _perform_ocr(file_path_or_bytes)
+    return _com_cache_extracao(file_path_or_bytes, "ocr", lambda: {"text": _perform_ocr(file_path_or_bytes), "tables": []})['text']
+
+def _perform_ocr(file_path_or_bytes: str | bytes) -> str:
+    """OCR efetivo de perform_ocr, sem cache."""
     text = ""
     try:
         import pytesseract
@@ -167,13 +562,8 @@ def perform_ocr(file_path_or_bytes: str | bytes) -> str:
                 img = Image.open(file_path_or_bytes)
                 text = pytesseract.image_to_string(img, lang='por+eng')
             elif file_path_or_bytes.lower().endswith('.pdf'):
-                pdf_document = fitz.open(file_path_or_bytes)
-                for page_num in range(pdf_document.page_count):
-                    page = pdf_document.load_page(page_num)
-                    pix = page.get_pixmap(matrix=fitz.Matrix(300/72, 300/72)) # Aumentar DPI para melhor OCR
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    text += pytesseract.image_to_string(img, lang='por+eng') + "\n"
-                pdf_document.close()
+                for page_num, page_text in iter_ocr_pages(file_path_or_bytes, dpi=None):
+                    text += page_text + "\n"
         elif isinstance(file_path_or_bytes, bytes):
             img = Image.open(io.BytesIO(file_path_or_bytes))
             text = pytesseract.image_to_string(img, lang='por+eng')
@@ -183,4 +573,149 @@ def perform_ocr(file_path_or_bytes: str | bytes) -> str:
         print("Erro: Tesseract OCR não encontrado. Certifique-se de que está instalado no ambiente e configurado no PATH.")
     except Exception as e:
         print(f"Erro durante o OCR: {e}")
-    return text
\ No newline at end of file
+    return text
+
+# --- OCR de PDF página a página, em paralelo ---
+
+_OCR_DOCUMENTO = None # Documento aberto em cada worker do pool (ver _iniciar_worker_ocr)
+# Processos que podem estar fazendo OCR ao mesmo tempo na máquina (ver definir_processos_ocr_concorrentes)
+_OCR_PROCESSOS_CONCORRENTES = 1
+
+def definir_processos_ocr_concorrentes(processos: int):
+    """
+    Informa quantos processos deste mesmo tipo rodam em paralelo (ex.: os workers de process_documents
+    ou run_batch), para que cada pool de iter_ocr_pages use só a sua parte das CPUs e de OCR_MEMORY_BUDGET_MB.
+    """
+    global _OCR_PROCESSOS_CONCORRENTES
+    _OCR_PROCESSOS_CONCORRENTES = max(1, int(processos))
+
+def _texto_e_confianca_ocr(dados: dict) -> tuple[str, float]:
+    """Remonta as linhas de um resultado de pytesseract.image_to_data e calcula a confiança média das palavras."""
+    linhas = {}
+    confiancas = []
+    for i, palavra in enumerate(dados['text']):
+        confianca = float(dados['conf'][i])
+        if confianca < 0 or not palavra.strip(): # -1: blocos/linhas, não palavras
+            continue
+        confiancas.append(confianca)
+        linhas.setdefault((dados['block_num'][i], dados['par_num'][i], dados['line_num'][i]), []).append(palavra)
+    texto = "\n".join(" ".join(palavras) for palavras in linhas.values())
+    return texto, (sum(confiancas) / len(confiancas) if confiancas else 0.0)
+
+def _ocr_pdf_page(pdf_document, page_num: int, dpi: int | None) -> str:
+    """
+    Renderiza uma página do PDF e aplica o Tesseract. Com dpi=None usa OCR_DPIS_ADAPTATIVOS:
+    começa na menor resolução e só sobe enquanto a confiança média ficar abaixo de OCR_CONFIANCA_MINIMA.
+    """
+    import pytesseract
+    from PIL import Image
+    import fitz # PyMuPDF
+
+    page = pdf_document.load_page(page_num)
+    if dpi:
+        pix = page.get_pixmap(matrix=fitz.Matrix(dpi/72, dpi/72)) # Aumentar DPI para melhor OCR
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        return pytesseract.image_to_string(img, lang='por+eng')
+
+    for dpi_atual in OCR_DPIS_ADAPTATIVOS:
+        pix = page.get_pixmap(matrix=fitz.Matrix(dpi_atual/72, dpi_atual/72))
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        dados = pytesseract.image_to_data(img, lang='por+eng', output_type=pytesseract.Output.DICT)
+        texto, confianca = _texto_e_confianca_ocr(dados)
+        if confianca >= OCR_CONFIANCA_MINIMA:
+            break
+    return texto
+
+def _iniciar_worker_ocr(file_path: str):
+    """Abre o PDF uma vez por worker (documentos do PyMuPDF não podem ser enviados entre processos)."""
+    global _OCR_DOCUMENTO
+    import fitz # PyMuPDF
+    _OCR_DOCUMENTO = fitz.open(file_path)
+
+def _ocr_pagina(pdf_document, page_num: int, dpi: int | None) -> tuple[int, str, str | None]:
+    """(page_num, texto, erro): um erro no OCR de uma página é devolvido em vez de interromper o documento."""
+    try:
+        return page_num, _ocr_pdf_page(pdf_document, page_num, dpi), None
+    except Exception as e:
+        return page_num, "", str(e)
+
+def _ocr_pagina_worker(page_num: int, dpi: int | None) -> tuple[int, str, str | None]:
+    return _ocr_pagina(_OCR_DOCUMENTO, page_num, dpi)
+
+def _workers_ocr(pdf_document, pages: list[int], dpi: int | None, max_workers: int | None, memory_budget_mb: float) -> int:
+    """
+    Quantidade de workers de OCR: limitada por max_workers, pelo número de páginas e pelo orçamento
+    de memória, estimado a partir da maior página renderizada no maior DPI possível. CPUs e orçamento
+    são divididos entre os processos concorrentes (ver definir_processos_ocr_concorrentes).
+    """
+    max_workers = max_workers or max(1, (os.cpu_count() or 1) // _OCR_PROCESSOS_CONCORRENTES)
+    memory_budget_mb = memory_budget_mb / _OCR_PROCESSOS_CONCORRENTES
+    dpi = dpi or max(OCR_DPIS_ADAPTATIVOS)
+    maior_pagina = max((pdf_document[page_num].rect.width * pdf_document[page_num].rect.height for page_num in pages), default=0)
+    bytes_por_pagina = maior_pagina * (dpi / 72) ** 2 * 3 * _OCR_FATOR_MEMORIA_PAGINA
+    por_memoria = int(memory_budget_mb * 1024 * 1024 // bytes_por_pagina) if bytes_por_pagina else max_workers
+    return max(1, min(max_workers, len(pages), por_memoria))
+
+def iter_ocr_pages(file_path: str, dpi: int | None = OCR_DPI, max_workers: int | None = OCR_MAX_WORKERS,
+                   memory_budget_mb: float = OCR_MEMORY_BUDGET_MB, pages: list[int] | None = None):
+    """
+    Aplica OCR a cada página de um PDF escaneado em um pool de processos e gera (page_num, texto)
+    em ordem de página, cada página assim que ela e as anteriores estiverem prontas, para que o
+    parsing possa começar antes do fim do documento. Uma página em que o OCR falha sai com texto vazio
+    (e um aviso) e as demais seguem.
+    :param file_path: Caminho do PDF.
+    :param dpi: Resolução da renderização (None = DPI adaptativo, ver OCR_DPIS_ADAPTATIVOS).
+    :param max_workers: Máximo de processos (None = os.cpu_count() dividido pelos processos concorrentes).
+    :param memory_budget_mb: Orçamento de memória para as páginas em processamento simultâneo, dividido
+        pelos processos concorrentes.
+    :param pages: Índices (base 0) das páginas a processar; None = todas.
+    """
+    import pytesseract
+    import fitz # PyMuPDF
+
+    # Falha aqui, no processo principal, se o binário do Tesseract não estiver disponível
+    pytesseract.get_tesseract_version()
+
+    with fitz.open(file_path) as pdf_document:
+        pages = list(range(pdf_document.page_count)) if pages is None else sorted(pages)
+        workers = _workers_ocr(pdf_document, pages, dpi, max_workers, memory_budget_mb)
+        if workers == 1:
+            for page_num in pages:
+                yield _resultado_ocr_pagina(*_ocr_pagina(pdf_document, page_num, dpi))
+            return
+
+    # 'fork' porque os módulos são carregados no namespace principal da sessão: com 'spawn'/'forkserver'
+    # os workers não encontrariam as funções
+    try:
+        mp_context = multiprocessing.get_context('fork')
+    except ValueError:
+        mp_context = None
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context,
+                             initializer=_iniciar_worker_ocr, initargs=(file_path,)) as executor:
+        futures = [executor.submit(_ocr_pagina_worker, page_num, dpi) for page_num in pages]
+        try:
+            for future in futures:
+                yield _resultado_ocr_pagina(*future.result())
+        finally:
+            for future in futures: # Consumidor parou antes do fim: não processar as páginas restantes
+                future.cancel()
+
+def _resultado_ocr_pagina(page_num: int, texto: str, erro: str | None) -> tuple[int, str]:
+    if erro is not None:
+        print(f"Aviso: falha no OCR da página {page_num + 1}: {erro}. Seguindo com a próxima página.")
+    return page_num, texto
+
+def _ocr_paginas_sem_texto(file_path: str, pages: list[int]):
+    """OCR (DPI adaptativo) das páginas escaneadas encontradas por handle_uploaded_file; nada se o OCR estiver indisponível."""
+    if not pages:
+        return
+    try:
+        import pytesseract
+        yield from iter_ocr_pages(file_path, dpi=None, pages=pages)
+    except ImportError:
+        print("Aviso: pytesseract ou PyMuPDF não encontrados. Páginas escaneadas do PDF ficarão sem texto.")
+    except pytesseract.TesseractNotFoundError:
+        print("Aviso: Tesseract OCR não encontrado. Páginas escaneadas do PDF ficarão sem texto.")
+    except Exception as e:
+        print(f"Erro durante o OCR das páginas escaneadas: {e}")
\ No newline at end of file
@@ -8,7 +8,11 @@ import re
 # Importa as configurações globais para detecção de apostas
 # from config import SITES_APOSTAS, PROCESSADORAS_PAGAMENTO_NAO_APOSTA
 # Importa as funções de parsing
-# from data_parsing import parse_financial_value
+# from data_parsing import parse_financial_value, formatar_reais, extrair_metadados_fatura
+# Importa a categorização usada pelo contexto de análise
+# from categorization_logic import categorize_batch, separar_transacoes_categorizadas
+# Importa as somas por categoria usadas pelos agregados incrementais
+# from report_generation import totais_extrato_por_categoria
 
 
 def calculate_totals(df: pd.DataFrame) -> dict[str, float]:
@@ -26,7 +30,10 @@ def calculate_score(df: pd.DataFrame) -> int:
     """Calcula um score financeiro baseado nas entradas e saídas."""
     total_entrada = df[df["value"] >= 0]["value"].sum()
     total_saida = abs(df[df["value"] < 0]["value"].sum()) # Valor absoluto para cálculo
+    return _score_financeiro(total_entrada, total_saida)
 
+def _score_financeiro(total_entrada: float, total_saida: float) -> int:
+    """Score de 0 a 1000 a partir do total de entradas e do total de saídas (em valor absoluto)."""
     if total_entrada == 0 and total_saida == 0:
         return 0
     elif total_saida == 0:
@@ -40,16 +47,19 @@ def group_by_month(df: pd.DataFrame) -> dict[str, dict[str, float]]:
     """Agrupa transações por mês, calculando entradas e saídas."""
     if df.empty:
         return {}
+    return _resumo_mensal(_totais_mes(df))
+
+def _totais_mes(df: pd.DataFrame) -> pd.Series:
+    """Soma de 'value' por (mês 'AAAA-MM', category); transações sem data válida ficam de fora."""
     df_copy = df.copy()
     df_copy["mes"] = pd.to_datetime(df_copy["date"], errors="coerce").dt.to_period("M").astype(str)
     df_copy.dropna(subset=['mes'], inplace=True) # Remove transações sem data válida
-    
-    agrupado = df_copy.groupby(["mes", "category"])["value"].sum().reset_index()
+    return df_copy.groupby(["mes", "category"])["value"].sum()
+
+def _resumo_mensal(totais_mes: pd.Series) -> dict[str, dict[str, float]]:
+    """Formato de group_by_month a partir das somas por (mês, Entrada/Saída)."""
     resultado = {}
-    for _, row in agrupado.iterrows():
-        mes = row["mes"]
-        tipo = row["category"]
-        valor = row["value"]
+    for (mes, tipo), valor in totais_mes.items():
         if mes not in resultado:
             resultado[mes] = {"Entrada": 0.0, "Saída": 0.0, "Saldo": 0.0}
         resultado[mes][tipo] += valor
@@ -74,137 +84,339 @@ def extrair_maiores_transacoes(transactions_df: pd.DataFrame, type_of_flow: str
         filtered_df['abs_value'] = abs(filtered_df['value'])
         filtered_df.sort_values(by='abs_value', ascending=False, inplace=True)
 
-    results = []
-    for _, row in filtered_df.head(limit).iterrows():
-        results.append({
-            'DATA': row['date'].strftime('%d/%m/%Y'),
-            'TIPO': row['original_type_op'], # Tipo original como PIX, Débito, etc.
-            'CATEGORIA_ESPECIFICA': row['specific_category'],
-            'DESCRICAO': row['description'],
-            'VALOR': f"R$ {abs(row['value']):,.2f}".replace('.', '#').replace(',', '.').replace('#', ','),
-        })
-    return results
+    maiores = filtered_df.head(limit)
+    return pd.DataFrame({
+        'DATA': pd.to_datetime(maiores['date']).dt.strftime('%d/%m/%Y'),
+        'TIPO': maiores['original_type_op'], # Tipo original como PIX, Débito, etc.
+        'CATEGORIA_ESPECIFICA': maiores['specific_category'],
+        'DESCRICAO': maiores['description'],
+        'VALOR': formatar_reais(maiores['value'].abs()),
+    }).to_dict('records')
+
+# Detectores por janela móvel (detectar_padroes_janelas): janelas e limites padrão, os mesmos das regras por dia
+JANELAS_DETECCAO = ('24h', '72h', '7D')
+LIMITES_JANELAS = {
+    'entrada_minima': 500,      # Pass-through: entradas na janela acima deste valor...
+    'fracao_repassada': 0.85,   # ...e pelo menos esta fração delas saindo na mesma janela
+    'valor_pequeno': 1000,      # Estruturação: saídas abaixo deste valor contam como pequenas...
+    'quantidade_minima': 5,     # ...alerta com ao menos esta quantidade delas...
+    'total_minimo': 1500,       # ...somando mais que este valor
+}
+
+class ContextoAnalise:
+    """
+    Colunas derivadas das transações, calculadas uma única vez e compartilhadas pela categorização e pelos
+    detectores (analyze_risk, detectar_apostas_aprimorado, detectar_movimentacoes_suspeitas,
+    detectar_padroes_janelas), que aceitam o contexto no lugar do DataFrame.
+    Trabalha sobre uma única cópia: o DataFrame recebido não é alterado.
+    - df: transações com valor numérico, 'date' como datetime, 'category' e 'specific_category';
+    - entrada, extrato, fatura, com_data: máscaras booleanas alinhadas a df.
+    Descrições em minúsculas e somas por dia do extrato são montadas no primeiro uso.
+    """
 
-def detectar_apostas_aprimorado(transactions_df: pd.DataFrame) -> list[dict]:
-    """Detecta transações relacionadas a apostas com base em palavras-chave e valores."""
+    def __init__(self, transactions_df: pd.DataFrame):
+        df = transactions_df.copy()
+        if not df.empty:
+            df['value'] = pd.to_numeric(df['value'], errors='coerce')
+            df.dropna(subset=['value'], inplace=True)
+            df['date'] = pd.to_datetime(df['date'], errors='coerce')
+        self.df = df
+        self.entrada = (df['value'] >= 0).to_numpy(dtype=bool) if not df.empty else np.zeros(0, dtype=bool)
+        self.extrato = (df['doc_type'] == 'extrato_bancario').to_numpy(dtype=bool) if not df.empty else self.entrada
+        self.fatura = (df['doc_type'] == 'fatura_cartao').to_numpy(dtype=bool) if not df.empty else self.entrada
+        self.com_data = df['date'].notna().to_numpy(dtype=bool) if not df.empty else self.entrada
+        if not df.empty:
+            # 'category' (Entrada/Saída) e 'specific_category' (granular), como em categorize_transactions_detailed
+            df['category'] = np.where(self.entrada, 'Entrada', 'Saída')
+            df['specific_category'] = categorize_batch(df['description'])
+        self._descricoes_minusculas = None
+        self._por_dia_extrato = None
+
+    def transacoes_categorizadas(self) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """Mesmo retorno de categorize_transactions_detailed, a partir das máscaras já calculadas."""
+        if self.df.empty:
+            return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+        return separar_transacoes_categorizadas(self.df, self.extrato, self.fatura, self.entrada)
+
+    def descricoes_minusculas(self) -> tuple[np.ndarray, pd.Series]:
+        """Códigos de pd.factorize por linha (-1 para NaN) e as descrições distintas em minúsculas."""
+        if self._descricoes_minusculas is None:
+            codigos, unicas = pd.factorize(self.df['description'])
+            self._descricoes_minusculas = (codigos, pd.Series(unicas, dtype=object).str.lower())
+        return self._descricoes_minusculas
+
+    def por_dia_extrato(self) -> pd.DataFrame:
+        """
+        Por dia do extrato (linhas com data): total de entradas, total de saídas (positivo) e quantidade e
+        total das saídas pequenas (abaixo de LIMITES_JANELAS['valor_pequeno']).
+        """
+        if self._por_dia_extrato is None:
+            linhas = self.extrato & self.com_data
+            valores = self.df['value'][linhas]
+            pequena_saida = (valores < 0) & (valores.abs() < LIMITES_JANELAS['valor_pequeno'])
+            por_dia = pd.DataFrame({
+                'entrada': valores.where(valores >= 0),
+                'saida': valores.where(valores < 0),
+                'pequenas': pequena_saida,
+                'total_pequenas': valores.where(pequena_saida),
+            }).groupby(self.df['date'][linhas].dt.normalize()).sum()
+            por_dia['saida'] = por_dia['saida'].abs()
+            por_dia['total_pequenas'] = por_dia['total_pequenas'].abs()
+            self._por_dia_extrato = por_dia
+        return self._por_dia_extrato
+
+def _contexto_analise(transactions_df: pd.DataFrame | ContextoAnalise) -> ContextoAnalise:
+    """O próprio contexto, ou um novo montado a partir do DataFrame de transações."""
+    return transactions_df if isinstance(transactions_df, ContextoAnalise) else ContextoAnalise(transactions_df)
+
+_PADROES_APOSTAS = {} # limites_palavra -> (regex das processadoras, regex dos sites), compiladas no primeiro uso
+
+def _obter_padroes_apostas(limites_palavra: bool) -> tuple[re.Pattern, re.Pattern]:
+    """
+    Uma regex para PROCESSADORAS_PAGAMENTO_NAO_APOSTA e outra para SITES_APOSTAS (termos mais longos primeiro).
+    Com limites_palavra, os termos só casam como palavras inteiras: 'sorte' não casa em 'sorteio' nem 'bin' em 'bingo'.
+    """
+    if limites_palavra not in _PADROES_APOSTAS:
+        def compilar(termos):
+            alternativas = '|'.join(re.escape(termo) for termo in sorted(set(termos), key=len, reverse=True))
+            return re.compile(r'(?<!\w)(?:' + alternativas + r')(?!\w)' if limites_palavra else alternativas)
+        _PADROES_APOSTAS[limites_palavra] = (compilar(PROCESSADORAS_PAGAMENTO_NAO_APOSTA), compilar(SITES_APOSTAS))
+    return _PADROES_APOSTAS[limites_palavra]
+
+def detectar_apostas_aprimorado(transactions_df: pd.DataFrame | ContextoAnalise, limites_palavra: bool = False) -> list[dict]:
+    """
+    Detecta transações relacionadas a apostas com base em palavras-chave e valores.
+    As regex são aplicadas uma vez por descrição distinta (Series.str) e o resultado volta às linhas por índice.
+    :param limites_palavra: Casar os termos só como palavras inteiras, evitando falsos positivos de substring.
+    """
     apostas_detectadas = []
+    contexto = _contexto_analise(transactions_df)
+    if contexto.df.empty:
+        return apostas_detectadas
+
+    re_processadoras, re_sites = _obter_padroes_apostas(limites_palavra)
+    codigos, unicas_lower = contexto.descricoes_minusculas() # NaN recebe o código -1 e fica de fora
 
-    # Certificar que SITES_APOSTAS e PROCESSADORAS_PAGAMENTO_NAO_APOSTA estão acessíveis
-    # Eles devem ser importados do módulo config.py
-    try:
-        from config import SITES_APOSTAS, PROCESSADORAS_PAGAMENTO_NAO_APOSTA
-    except ImportError:
-        print("Erro: config.py não carregado ou variáveis não acessíveis para detecção de apostas.")
+    # Ignorar processadoras legítimas; verificar sites de apostas
+    aposta_unica = (~unicas_lower.str.contains(re_processadoras, na=False) & unicas_lower.str.contains(re_sites, na=False)).to_numpy(dtype=bool)
+    aposta = np.zeros(len(contexto.df), dtype=bool)
+    aposta[codigos >= 0] = aposta_unica[codigos[codigos >= 0]]
+    if not aposta.any():
         return apostas_detectadas
 
-    for _, t in transactions_df.iterrows():
-        if pd.isna(t['description']):
-            continue
-        descricao_lower = t['description'].lower()
+    # Transações sem data também são alertadas, com DATA 'N/I'
+    detectadas = contexto.df.loc[aposta, ['date', 'description', 'value']]
+    datas = detectadas['date'].dt.strftime('%d/%m/%Y').where(detectadas['date'].notna(), 'N/I')
+    for data, descricao, valor, valor_formatado in zip(datas, detectadas['description'],
+                                                       detectadas['value'], formatar_reais(detectadas['value'].abs())):
+        transaction_info = {
+            'DATA': data,
+            'DESCRICAO': descricao,
+            'VALOR': valor_formatado,
+            'ALERTA': ''
+        }
+        if valor < 0:
+            transaction_info['TIPO'] = 'Saída - Aposta Online'
+            transaction_info['ALERTA'] = 'Detectada transação de SAÍDA para site de aposta.'
+        else:
+            transaction_info['TIPO'] = 'Entrada - Retorno de Aposta/Ganho'
+            transaction_info['ALERTA'] = 'Detectada transação de ENTRADA de site de aposta.'
         
-        # Ignorar processadoras legítimas
-        if any(proc in descricao_lower for proc in PROCESSADORAS_PAGAMENTO_NAO_APOSTA):
-            continue
-
-        # Verificar sites de apostas
-        if any(site in descricao_lower for site in SITES_APOSTAS):
-            transaction_info = {
-                'DATA': t['date'].strftime('%d/%m/%Y') if pd.notna(t['date']) else 'N/I',
-                'DESCRICAO': t['description'],
-                'VALOR': f"R$ {abs(t['value']):,.2f}".replace('.', '#').replace(',', '.').replace('#', ','),
-                'ALERTA': ''
-            }
-            if t['value'] < 0:
-                transaction_info['TIPO'] = 'Saída - Aposta Online'
-                transaction_info['ALERTA'] = 'Detectada transação de SAÍDA para site de aposta.'
-            else:
-                transaction_info['TIPO'] = 'Entrada - Retorno de Aposta/Ganho'
-                transaction_info['ALERTA'] = 'Detectada transação de ENTRADA de site de aposta.'
-            
-            apostas_detectadas.append(transaction_info)
+        apostas_detectadas.append(transaction_info)
 
     return apostas_detectadas
 
-def detectar_movimentacoes_suspeitas(transactions_df: pd.DataFrame) -> list[dict]:
-    """Detecta padrões suspeitos de movimentação."""
-    suspeitas = []
-    if transactions_df.empty: return suspeitas
+def detectar_movimentacoes_suspeitas(transactions_df: pd.DataFrame | ContextoAnalise) -> list[dict]:
+    """
+    Detecta padrões suspeitos de movimentação. As regras por dia saem da agregação diária do contexto
+    (ContextoAnalise.por_dia_extrato) e a de horário atípico de uma máscara booleana; só as linhas que geram
+    alerta são percorridas.
+    """
+    contexto = _contexto_analise(transactions_df)
+    if not contexto.com_data.any(): return []
+    return _alertas_diarios(contexto.por_dia_extrato()) + _alertas_madrugada(contexto)
 
-    transactions_df['date'] = pd.to_datetime(transactions_df['date'], errors='coerce')
-    transactions_df.dropna(subset=['date', 'value'], inplace=True)
-    if transactions_df.empty: return suspeitas # Pode ficar vazio após dropna
-    
-    # 1. Padrão Circular: Recebe e repassa a maior parte no mesmo dia (apenas extrato)
-    extrato_df = transactions_df[transactions_df['doc_type'] == 'extrato_bancario'].copy()
-    if not extrato_df.empty:
-        daily_transactions = extrato_df.groupby(extrato_df['date'].dt.date)
-        for date, group in daily_transactions:
-            total_entrada_dia = group[group['value'] >= 0]['value'].sum()
-            total_saida_dia = abs(group[group['value'] < 0]['value'].sum())
-
-            if total_entrada_dia > 500 and total_saida_dia >= total_entrada_dia * 0.85 and total_saida_dia > 0: # Alto volume e quase tudo sai
-                suspeitas.append({
-                    'DATA': date.strftime('%d/%m/%Y'),
-                    'TIPO': 'Movimentação Circular (Pass-through)',
-                    'DESCRICAO': f'Recebeu R$ {total_entrada_dia:,.2f} e repassou R$ {total_saida_dia:,.2f} no mesmo dia.',
-                    'VALOR': f"R$ {total_entrada_dia:,.2f}".replace('.', '#').replace(',', '.').replace('#', ','),
-                    'ALERTA': 'Padrão circular pode indicar "pass-through" de recursos. Verificar origem/destino.'
-                })
+def _alertas_diarios(por_dia: pd.DataFrame) -> list[dict]:
+    """Regras por dia de detectar_movimentacoes_suspeitas, sobre as somas de ContextoAnalise.por_dia_extrato."""
+    suspeitas = []
+    if not por_dia.empty:
+        datas_dia = por_dia.index.strftime('%d/%m/%Y')
+
+        # 1. Padrão Circular: Recebe e repassa a maior parte no mesmo dia (apenas extrato)
+        circular = (por_dia['entrada'] > 500) & (por_dia['saida'] >= por_dia['entrada'] * 0.85) & (por_dia['saida'] > 0) # Alto volume e quase tudo sai
+        entradas = por_dia['entrada'][circular]
+        for data, entrada, saida, entrada_formatada in zip(datas_dia[circular.to_numpy()], entradas, por_dia['saida'][circular], formatar_reais(entradas)):
+            suspeitas.append({
+                'DATA': data,
+                'TIPO': 'Movimentação Circular (Pass-through)',
+                'DESCRICAO': f'Recebeu R$ {entrada:,.2f} e repassou R$ {saida:,.2f} no mesmo dia.',
+                'VALOR': entrada_formatada,
+                'ALERTA': 'Padrão circular pode indicar "pass-through" de recursos. Verificar origem/destino.'
+            })
 
         # 2. Múltiplas transações pequenas e sequenciais (possível estruturação)
-        for date, group in daily_transactions:
-            saidas_dia = group[group['value'] < 0].copy().sort_values(by='date')
-            pequenas_saidas = saidas_dia[abs(saidas_dia['value']) < 1000] # Limite para "pequenas"
-
-            if len(pequenas_saidas) >= 5 and abs(pequenas_saidas['value'].sum()) > 1500: # 5+ pequenas saídas somando mais de R$1500
-                suspeitas.append({
-                    'DATA': date.strftime('%d/%m/%Y'),
-                    'TIPO': 'Possível Estruturação (Pequenas Saídas)',
-                    'DESCRICAO': f'{len(pequenas_saidas)} transações de baixo valor totalizando R$ {abs(pequenas_saidas["value"].sum()):,.2f}.',
-                    'VALOR': f"R$ {abs(pequenas_saidas['value'].sum()):,.2f}".replace('.', '#').replace(',', '.').replace('#', ','),
-                    'ALERTA': 'Múltiplas pequenas saídas no mesmo dia. Pode ser tentativa de disfarçar transações maiores.'
-                })
-    
+        estruturacao = (por_dia['pequenas'] >= 5) & (por_dia['total_pequenas'] > 1500) # 5+ pequenas saídas somando mais de R$1500
+        totais = por_dia['total_pequenas'][estruturacao]
+        for data, quantidade, total, total_formatado in zip(datas_dia[estruturacao.to_numpy()], por_dia['pequenas'][estruturacao], totais, formatar_reais(totais)):
+            suspeitas.append({
+                'DATA': data,
+                'TIPO': 'Possível Estruturação (Pequenas Saídas)',
+                'DESCRICAO': f'{quantidade} transações de baixo valor totalizando R$ {total:,.2f}.',
+                'VALOR': total_formatado,
+                'ALERTA': 'Múltiplas pequenas saídas no mesmo dia. Pode ser tentativa de disfarçar transações maiores.'
+            })
+    return suspeitas
+
+def _alertas_madrugada(contexto: ContextoAnalise) -> list[dict]:
+    """Regra de horário atípico de detectar_movimentacoes_suspeitas: depende só de cada transação."""
+    suspeitas = []
     # 3. Transações em horários atípicos (madrugada)
-    for _, t in transactions_df.iterrows():
-        if pd.notna(t['date']) and pd.notna(t['value']):
-            hora = t['date'].hour
-            if 0 <= hora <= 5 and abs(t['value']) > 500: # Valor considerável
-                suspeitas.append({
-                    'DATA': t['date'].strftime('%d/%m/%Y %H:%M'),
-                    'TIPO': 'Horário Atípico (Madrugada)',
-                    'DESCRICAO': t['description'],
-                    'VALOR': f"R$ {abs(t['value']):,.2f}".replace('.', '#').replace(',', '.').replace('#', ','),
-                    'ALERTA': 'Transação de valor considerável em horário incomum. Verificar legitimidade.'
-                })
+    madrugada = contexto.com_data & (contexto.df['date'].dt.hour <= 5).to_numpy() & (contexto.df['value'].abs() > 500).to_numpy() # Valor considerável
+    atipicas = contexto.df.loc[madrugada, ['date', 'description', 'value']]
+    for data, descricao, valor_formatado in zip(atipicas['date'].dt.strftime('%d/%m/%Y %H:%M'), atipicas['description'], formatar_reais(atipicas['value'].abs())):
+        suspeitas.append({
+            'DATA': data,
+            'TIPO': 'Horário Atípico (Madrugada)',
+            'DESCRICAO': descricao,
+            'VALOR': valor_formatado,
+            'ALERTA': 'Transação de valor considerável em horário incomum. Verificar legitimidade.'
+        })
+
+    return suspeitas
+
+def _episodios(disparos: np.ndarray, pontuacao: np.ndarray) -> np.ndarray:
+    """
+    Reduz os disparos de uma regra a um por episódio (sequência de transações consecutivas que disparam),
+    ficando com a posição de maior pontuação de cada episódio.
+    """
+    posicoes = np.flatnonzero(disparos)
+    if posicoes.size == 0:
+        return posicoes
+    episodio = np.cumsum(np.diff(posicoes, prepend=-2) > 1)
+    return pd.Series(pontuacao[posicoes], index=posicoes).groupby(episodio).idxmax().to_numpy()
+
+def detectar_padroes_janelas(transactions_df: pd.DataFrame | ContextoAnalise, janelas: tuple[str, ...] = JANELAS_DETECCAO,
+                             limites: dict[str, float] | None = None, ignorar_mesmo_dia: bool = True) -> list[dict]:
+    """
+    Pass-through e estruturação em janelas móveis de tempo (ex.: 24h, 72h, 7D), que pegam os padrões
+    divididos pela meia-noite ou espalhados por vários dias, invisíveis às regras por dia de
+    detectar_movimentacoes_suspeitas. Somas e contagens vêm de rolling() sobre o extrato ordenado por data
+    (O(n log n) pela ordenação). Cada episódio (transações consecutivas que disparam a regra) gera um alerta,
+    no ponto de maior total; episódios já alertados numa janela menor não se repetem nas maiores.
+    :param limites: Substitui valores de LIMITES_JANELAS.
+    :param ignorar_mesmo_dia: Não alertar janelas que começam e terminam no mesmo dia, já cobertas pelas regras por dia.
+    """
+    return _alertas_janelas(*_extrato_ordenado(_contexto_analise(transactions_df)), janelas, limites, ignorar_mesmo_dia)
+
+def _extrato_ordenado(contexto: ContextoAnalise) -> tuple[np.ndarray, np.ndarray]:
+    """Datas e valores do extrato (linhas com data) em ordem de data; empates ficam na ordem das linhas."""
+    extrato_df = contexto.df.loc[contexto.extrato & contexto.com_data, ['date', 'value']].sort_values('date', kind='stable')
+    return extrato_df['date'].to_numpy(), extrato_df['value'].to_numpy(dtype=np.float64)
+
+def _alertas_janelas(tempos: np.ndarray, valores_extrato: np.ndarray, janelas: tuple[str, ...] = JANELAS_DETECCAO,
+                     limites: dict[str, float] | None = None, ignorar_mesmo_dia: bool = True) -> list[dict]:
+    """Núcleo de detectar_padroes_janelas, sobre datas e valores do extrato já ordenados por data."""
+    suspeitas = []
+    limites = {**LIMITES_JANELAS, **(limites or {})}
+    if len(tempos) == 0: return suspeitas
+
+    valores = pd.Series(valores_extrato, index=pd.DatetimeIndex(tempos))
+    pequena_saida = (valores < 0) & (valores.abs() < limites['valor_pequeno'])
+    colunas = pd.DataFrame({
+        'entrada': valores.clip(lower=0),
+        'saida': (-valores).clip(lower=0),
+        'pequenas': pequena_saida.astype(np.int64),
+        'total_pequenas': (-valores).where(pequena_saida, 0.0),
+    })
+    circular_alertado = np.zeros(len(tempos), dtype=bool)
+    estruturacao_alertada = np.zeros(len(tempos), dtype=bool)
+
+    for janela in janelas:
+        somas = colunas.rolling(janela).sum()
+        # Início de cada janela (primeira transação dentro dela), para a descrição do período
+        inicio = tempos[np.searchsorted(tempos, tempos - pd.Timedelta(janela), side='right')]
+        fim = tempos
+        mesmo_dia = (inicio.astype('datetime64[D]') == fim.astype('datetime64[D]')) if ignorar_mesmo_dia else np.zeros(len(tempos), dtype=bool)
+        entrada, saida = somas['entrada'].to_numpy(), somas['saida'].to_numpy()
+        pequenas, total_pequenas = somas['pequenas'].to_numpy(), somas['total_pequenas'].to_numpy()
+
+        circular = (entrada > limites['entrada_minima']) & (saida >= entrada * limites['fracao_repassada']) & (saida > 0) & ~mesmo_dia
+        alvos = _episodios(circular, entrada)
+        alvos = alvos[~circular_alertado[alvos]]
+        for i, entrada_formatada, saida_formatada in zip(alvos, formatar_reais(entrada[alvos]), formatar_reais(saida[alvos])):
+            periodo = f"{pd.Timestamp(inicio[i]):%d/%m/%Y %H:%M} a {pd.Timestamp(fim[i]):%d/%m/%Y %H:%M}"
+            suspeitas.append({
+                'DATA': periodo,
+                'TIPO': f'Movimentação Circular (Pass-through, janela {janela})',
+                'DESCRICAO': f'Recebeu {entrada_formatada} e repassou {saida_formatada} em {janela}.',
+                'VALOR': entrada_formatada,
+                'ALERTA': 'Recursos recebidos e repassados em poucas horas/dias. Verificar origem/destino.'
+            })
+
+        estruturacao = (pequenas >= limites['quantidade_minima']) & (total_pequenas > limites['total_minimo']) & ~mesmo_dia
+        alvos = _episodios(estruturacao, total_pequenas)
+        alvos = alvos[~estruturacao_alertada[alvos]]
+        for i, total_formatado in zip(alvos, formatar_reais(total_pequenas[alvos])):
+            periodo = f"{pd.Timestamp(inicio[i]):%d/%m/%Y %H:%M} a {pd.Timestamp(fim[i]):%d/%m/%Y %H:%M}"
+            suspeitas.append({
+                'DATA': periodo,
+                'TIPO': f'Possível Estruturação (Pequenas Saídas, janela {janela})',
+                'DESCRICAO': f'{int(pequenas[i])} transações de baixo valor totalizando {total_formatado} em {janela}.',
+                'VALOR': total_formatado,
+                'ALERTA': 'Múltiplas pequenas saídas em sequência curta. Pode ser tentativa de disfarçar transações maiores.'
+            })
+        circular_alertado |= circular
+        estruturacao_alertada |= estruturacao
 
     return suspeitas
 
-def analyze_risk(transactions_df: pd.DataFrame, text_content: str = "") -> dict[str, str]:
+# Categorias de compras por impulso no cartão (as mesmas definidas em categorization_logic)
+CATEGORIAS_IMPULSO = ['Lazer e Entretenimento', 'Alimentação', 'Saúde', 'Vestuário e Acessórios', 'Tecnologia e Eletrônicos', 'Casa e Moradia']
+
+def analyze_risk(transactions_df: pd.DataFrame | ContextoAnalise, fatura_metadata: dict | str = "") -> dict[str, str]:
     """
     Analisa comportamentos de risco ou inadimplência,
     incluindo saldo negativo persistente, alto volume de pequenas saídas
     e uso do limite de crédito.
+    :param fatura_metadata: Metadados da fatura (extrair_metadados_fatura/consolidar_metadados_fatura) com o limite
+        total e a menção a pagamento mínimo; um texto é lido na hora com extrair_metadados_fatura.
     """
-    risk_indicators = {}
-    if transactions_df.empty: return risk_indicators
-
-    transactions_df['date'] = pd.to_datetime(transactions_df['date'], errors='coerce')
-    transactions_df.dropna(subset=['date', 'value'], inplace=True)
+    contexto = _contexto_analise(transactions_df)
+    if not contexto.com_data.any(): return {}
+
+    tempos, valores = _extrato_ordenado(contexto)
+    linhas_fatura = contexto.fatura & contexto.com_data
+    metricas_fatura = _metricas_fatura(contexto.df.loc[linhas_fatura, ['value', 'specific_category']]) if linhas_fatura.any() else None
+    return _indicadores_risco(tempos, np.cumsum(valores), valores, metricas_fatura, fatura_metadata)
+
+def _metricas_fatura(fatura_df: pd.DataFrame) -> dict[str, float]:
+    """Totais da fatura usados por analyze_risk: gastos e compras por impulso. São somas, então se acumulam entre documentos."""
+    impulse_transactions_card = fatura_df[
+        (fatura_df['value'] < 0) & # Saídas
+        (fatura_df['specific_category'].isin(CATEGORIAS_IMPULSO)) &
+        (abs(fatura_df['value']) < 150) # Compras "pequenas" até R$150
+    ]
+    return {
+        'gastos': fatura_df['value'][fatura_df['value'] < 0].sum(),
+        'compras_impulso': len(impulse_transactions_card),
+        'total_impulso': impulse_transactions_card['value'].sum(),
+    }
 
-    if transactions_df.empty: return risk_indicators
+def _indicadores_risco(tempos: np.ndarray, saldo: np.ndarray, valores: np.ndarray, metricas_fatura: dict[str, float] | None,
+                       fatura_metadata: dict | str) -> dict[str, str]:
+    """
+    Regras de analyze_risk a partir do extrato em ordem de data (datas, saldo acumulado e valores) e das
+    métricas da fatura (_metricas_fatura; None sem fatura), com limite e menção a pagamento mínimo vindos de fatura_metadata.
+    """
+    risk_indicators = {}
 
     # --- Análise do Extrato Bancário ---
-    extrato_df = transactions_df[transactions_df['doc_type'] == 'extrato_bancario'].copy()
-    if not extrato_df.empty:
-        extrato_df = extrato_df.sort_values(by='date').reset_index(drop=True)
-        extrato_df['running_balance'] = extrato_df['value'].cumsum()
-
+    if len(tempos):
         # Saldo negativo persistente
-        negative_balances = extrato_df[extrato_df['running_balance'] < 0]
-        if not negative_balances.empty:
-            num_negative_days = negative_balances['date'].dt.date.nunique()
-            min_negative_balance = negative_balances['running_balance'].min()
+        negativo = saldo < 0
+        if negativo.any():
+            num_negative_days = np.unique(tempos[negativo].astype('datetime64[D]')).size
+            min_negative_balance = saldo[negativo].min()
             risk_indicators['Saldo Negativo (Cheque Especial/Descoberto)'] = f"{num_negative_days} dias com saldo negativo (Mínimo: R$ {min_negative_balance:.2f})"
             if num_negative_days > 7 or abs(min_negative_balance) > 1000:
                 risk_indicators['Alerta de Endividamento (Uso Recorrente de Descoberto)'] = "Alto: Uso frequente ou elevado do limite, indicando dependência de crédito."
@@ -214,8 +426,9 @@ def analyze_risk(transactions_df: pd.DataFrame, text_content: str = "") -> dict[
             risk_indicators['Saldo Negativo (Cheque Especial/Descoberto)'] = "Nenhum período de saldo negativo identificado."
 
         # Inconsistência na renda vs. despesas (extrato)
-        total_inputs_extrato = extrato_df[extrato_df['category'] == 'Entrada']['value'].sum()
-        total_outputs_extrato = abs(extrato_df[extrato_df['category'] == 'Saída']['value'].sum())
+        entradas_extrato = valores >= 0 # category == 'Entrada'
+        total_inputs_extrato = valores[entradas_extrato].sum()
+        total_outputs_extrato = abs(valores[~entradas_extrato].sum())
 
         if total_inputs_extrato > 0:
             expenditure_ratio = total_outputs_extrato / total_inputs_extrato
@@ -227,15 +440,13 @@ def analyze_risk(transactions_df: pd.DataFrame, text_content: str = "") -> dict[
             risk_indicators['Inconsistência Renda/Despesas (Extrato)'] = "Sem entradas registradas para comparação ou entradas muito baixas."
 
     # --- Análise da Fatura de Cartão de Crédito ---
-    fatura_df = transactions_df[transactions_df['doc_type'] == 'fatura_cartao'].copy()
-    if not fatura_df.empty:
-        total_card_expenses = abs(fatura_df[fatura_df['value'] < 0]['value'].sum())
+    if metricas_fatura is not None:
+        total_card_expenses = abs(metricas_fatura['gastos'])
         
-        limite_total = None
-        # Extrair limite total da fatura a partir do texto (passado do main_orchestrator)
-        limite_total_match = re.search(r'Limite total:\s*R\$?\s*([\d\.,]+)', text_content, re.IGNORECASE)
-        if limite_total_match:
-            limite_total = parse_financial_value(limite_total_match.group(1))
+        if not isinstance(fatura_metadata, dict):
+            fatura_metadata = extrair_metadados_fatura(fatura_metadata)
+        # Limite total lido das faturas na ingestão (ver FinancialAnalysisSystem._extract_document)
+        limite_total = fatura_metadata['limite_total']
 
         if limite_total is not None and limite_total > 0:
             utilization_rate = total_card_expenses / limite_total
@@ -246,19 +457,10 @@ def analyze_risk(transactions_df: pd.DataFrame, text_content: str = "") -> dict[
         else:
             risk_indicators['Uso do Limite de Cartão'] = "Não foi possível determinar o limite total do cartão."
 
-        # Padrão de Compra por Impulso (Cartão) - usando specific_category
-        # As categorias de impulso devem ser as mesmas definidas em categorization_logic
-        impulse_categories = ['Lazer e Entretenimento', 'Alimentação', 'Saúde', 'Vestuário e Acessórios', 'Tecnologia e Eletrônicos', 'Casa e Moradia']
-        
-        impulse_transactions_card = fatura_df[
-            (fatura_df['value'] < 0) & # Saídas
-            (fatura_df['specific_category'].isin(impulse_categories)) &
-            (abs(fatura_df['value']) < 150) # Compras "pequenas" até R$150
-        ].copy()
-
-        if not impulse_transactions_card.empty:
-            num_impulse_tx = len(impulse_transactions_card)
-            total_impulse_value = abs(impulse_transactions_card['value'].sum())
+        # Padrão de Compra por Impulso (Cartão) - usando specific_category (ver CATEGORIAS_IMPULSO)
+        if metricas_fatura['compras_impulso']:
+            num_impulse_tx = metricas_fatura['compras_impulso']
+            total_impulse_value = abs(metricas_fatura['total_impulso'])
 
             if num_impulse_tx > 15 and total_impulse_value > 300: # Mais de 15 pequenas compras totalizando mais de R$300
                 risk_indicators['Risco: Padrão de Compra por Impulso (Cartão)'] = f"{num_impulse_tx} pequenas compras totalizando R$ {total_impulse_value:.2f}. Sugere análise de gastos discricionários."
@@ -268,8 +470,123 @@ def analyze_risk(transactions_df: pd.DataFrame, text_content: str = "") -> dict[
             risk_indicators['Padrão de Compra por Impulso (Cartão)'] = "Nenhum padrão significativo de compras por impulso no cartão identificado neste período."
 
         # Alerta de Pagamento Mínimo/Atraso (se presente na fatura)
-        if re.search(r'Pagamento mínimo ou parcial', text_content, re.IGNORECASE) or \
-           re.search(r'Atrasar ou pagar menos que o mínimo da fatura', text_content, re.IGNORECASE):
+        if fatura_metadata['menciona_pagamento_minimo']:
             risk_indicators['Alerta: Menção a Pagamento Mínimo/Atraso na Fatura'] = "A fatura contém menções a pagamento mínimo ou atraso, o que pode indicar dificuldades financeiras se for uma prática regular."
 
-    return risk_indicators
\ No newline at end of file
+    return risk_indicators
+
+class AgregadosAnalise:
+    """
+    Agregados da análise mantidos de forma incremental: cada lote novo de transações (um ContextoAnalise com
+    o índice global das linhas) é incorporado sem reprocessar os anteriores.
+    - totais_categoria: somas por categoria específica do extrato (generate_extrato_summary);
+    - totais_mes: somas por (mês, Entrada/Saída) (group_by_month);
+    - por_dia: somas por dia do extrato (regras por dia de detectar_movimentacoes_suspeitas);
+    - tempos, valores, saldo: extrato em ordem de data e saldo acumulado (analyze_risk, detectar_padroes_janelas);
+    - apostas e alertas de madrugada, que dependem só de cada transação e apenas se acumulam.
+    O resultado é o mesmo das funções aplicadas a todas as transações, a menos do arredondamento das somas.
+    """
+
+    def __init__(self):
+        self.transacoes = 0
+        self.transacoes_com_data = 0
+        self._quadros = ([], [], [], []) # Lotes de transacoes_categorizadas, concatenados só quando lidos
+        self._categorizadas = None
+        self.totais_categoria = pd.DataFrame()
+        self.totais_mes = pd.Series(dtype=np.float64)
+        self.por_dia = pd.DataFrame()
+        self.tempos = np.array([], dtype='datetime64[ns]')
+        self.valores = np.zeros(0)
+        self.saldo = np.zeros(0)
+        self.metricas_fatura = None
+        self.entrada_extrato = 0.0
+        self.saida_extrato = 0.0
+        self.apostas = []
+        self.alertas_madrugada = []
+
+    def incorporar(self, contexto: ContextoAnalise):
+        """Acrescenta um lote de transações aos agregados."""
+        if contexto.df.empty:
+            return
+        self.transacoes += len(contexto.df)
+        self.transacoes_com_data += int(contexto.com_data.sum())
+
+        categorizadas = contexto.transacoes_categorizadas()
+        for quadros, quadro in zip(self._quadros, categorizadas):
+            quadros.append(quadro)
+        self._categorizadas = None
+        totais = totais_extrato_por_categoria(categorizadas[0], categorizadas[1])
+        self.totais_categoria = self._somar(self.totais_categoria, totais)
+        self.totais_mes = self.totais_mes.add(_totais_mes(contexto.df), fill_value=0) if not self.totais_mes.empty else _totais_mes(contexto.df)
+
+        valores_extrato = contexto.df['value'][contexto.extrato]
+        self.entrada_extrato += valores_extrato[valores_extrato >= 0].sum()
+        self.saida_extrato += valores_extrato[valores_extrato < 0].sum()
+        # Apostas entram também sem data (DATA 'N/I'); só os agregados por data dependem de com_data
+        self.apostas += detectar_apostas_aprimorado(contexto)
+        if not contexto.com_data.any():
+            return
+
+        self.por_dia = self._somar(self.por_dia, contexto.por_dia_extrato())
+        if not self.por_dia.empty:
+            self.por_dia['pequenas'] = self.por_dia['pequenas'].astype(np.int64)
+        self._inserir_extrato(*_extrato_ordenado(contexto))
+
+        linhas_fatura = contexto.fatura & contexto.com_data
+        if linhas_fatura.any():
+            metricas = _metricas_fatura(contexto.df.loc[linhas_fatura, ['value', 'specific_category']])
+            if self.metricas_fatura is not None:
+                metricas = {chave: self.metricas_fatura[chave] + valor for chave, valor in metricas.items()}
+            self.metricas_fatura = metricas
+
+        self.alertas_madrugada += _alertas_madrugada(contexto)
+
+    @staticmethod
+    def _somar(acumulado: pd.DataFrame, lote: pd.DataFrame) -> pd.DataFrame:
+        """Soma dois quadros de totais alinhando índice e colunas (ausentes contam como zero)."""
+        if acumulado.empty:
+            return lote
+        if lote.empty:
+            return acumulado
+        return acumulado.add(lote, fill_value=0).fillna(0).sort_index()
+
+    def _inserir_extrato(self, tempos: np.ndarray, valores: np.ndarray):
+        """
+        Intercala o extrato do lote (já em ordem de data) no extrato acumulado. Em datas iguais o lote vai depois,
+        como na ordenação estável de todas as linhas; o saldo é refeito só a partir da primeira inserção.
+        """
+        if not len(tempos):
+            return
+        tempos = tempos.astype('datetime64[ns]')
+        posicoes = np.searchsorted(self.tempos, tempos, side='right')
+        self.tempos = np.insert(self.tempos, posicoes, tempos)
+        self.valores = np.insert(self.valores, posicoes, valores)
+        inicio = int(posicoes[0])
+        anterior = self.saldo[inicio - 1] if inicio else 0.0
+        self.saldo = np.concatenate([self.saldo[:inicio], np.cumsum(np.concatenate([[anterior], self.valores[inicio:]]))[1:]])
+
+    def transacoes_categorizadas(self) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """Mesmo retorno de ContextoAnalise.transacoes_categorizadas para todos os lotes."""
+        if self._categorizadas is None:
+            self._categorizadas = tuple(pd.concat(quadros) if quadros else pd.DataFrame() for quadros in self._quadros)
+        return self._categorizadas
+
+    def resumo_mensal(self) -> dict[str, dict[str, float]]:
+        """Mesmo retorno de group_by_month."""
+        return _resumo_mensal(self.totais_mes)
+
+    def movimentacoes_suspeitas(self, janelas: tuple[str, ...] = JANELAS_DETECCAO) -> list[dict]:
+        """detectar_movimentacoes_suspeitas seguido de detectar_padroes_janelas."""
+        if not self.transacoes_com_data:
+            return []
+        return _alertas_diarios(self.por_dia) + self.alertas_madrugada + _alertas_janelas(self.tempos, self.valores, janelas)
+
+    def indicadores_risco(self, fatura_metadata: dict | str = "") -> dict[str, str]:
+        """Mesmo retorno de analyze_risk."""
+        if not self.transacoes_com_data:
+            return {}
+        return _indicadores_risco(self.tempos, self.saldo, self.valores, self.metricas_fatura, fatura_metadata)
+
+    def score(self) -> int:
+        """Mesmo retorno de calculate_score sobre as transações do extrato."""
+        return _score_financeiro(self.entrada_extrato, abs(self.saida_extrato))
@@ -3,7 +3,18 @@
 import pandas as pd
 import io
 import os
+import contextlib
+import multiprocessing
+import multiprocessing.connection
+from concurrent.futures import ProcessPoolExecutor
 import re
+import sys
+import signal
+import json
+import hashlib
+import time
+import argparse
+from collections.abc import Iterable
 from datetime import datetime
 import numpy as np
 
@@ -61,20 +72,79 @@ except ImportError:
 # na mesma sessão do Code Interpreter, tornando suas funções acessíveis.
 
 from config import SITES_APOSTAS, PROCESSADORAS_PAGAMENTO_NAO_APOSTA, MAPPING_COLUNAS_PADRAO_GENERICO
-from file_io_utils import detect_file_type_by_filename, detect_bank_from_filename, handle_uploaded_file, perform_ocr
-from data_parsing import parse_date_string, parse_financial_value, extrair_dados_cadastrais, processar_contracheque, detect_document_type, extract_transactions, _identificar_tipo_transacao_simples
-from bank_specific_parsers import parse_nubank_extrato_pdf, parse_c6_fatura_pdf
-from dataframe_parsers import process_dataframe_generic, process_nubank_extrato_csv, process_nubank_fatura_csv, process_inter_extrato_csv, process_inter_fatura_csv, process_caixa_extrato_csv, process_picpay_fatura_csv, _mapear_colunas_automaticamente
+from file_io_utils import detect_file_type_by_filename, detect_bank_from_filename, handle_uploaded_file, perform_ocr, extract_tables_tabula, iter_pdf_pages, cache_extracao_ativo, definir_processos_ocr_concorrentes, _extract_uploaded_file, BACKENDS_PDF
+from data_parsing import parse_date_string, parse_financial_value, formatar_reais, registrar_padrao, linha_com_data_e_valor, PADROES_DATA_TEXTO, PADROES_VALOR_TEXTO, REGISTRO_PADROES, ParserDatasDocumento, extrair_dados_cadastrais, processar_contracheque, extrair_metadados_fatura, consolidar_metadados_fatura, detect_document_type, detect_bank, classificar_documento, CARACTERES_CLASSIFICACAO, extract_transactions, _identificar_tipo_transacao_simples
+from bank_specific_parsers import parse_nubank_extrato_pdf, parse_c6_fatura_pdf, selecionar_parser, CARACTERES_IMPRESSAO_DIGITAL
+from dataframe_parsers import COLUNAS_TRANSACAO, transacoes_vazias, process_dataframe_generic, process_nubank_extrato_csv, process_nubank_fatura_csv, process_inter_extrato_csv, process_inter_fatura_csv, process_caixa_extrato_csv, process_picpay_fatura_csv, _mapear_colunas_automaticamente
 from categorization_logic import categorizar_transacao_granular, categorize_transactions_detailed
-from financial_analysis import calculate_totals, calculate_score, group_by_month, extrair_maiores_transacoes, detectar_apostas_aprimorado, detectar_movimentacoes_suspeitas, analyze_risk
-from report_generation import generate_extrato_summary, generate_fatura_summary, generate_general_financial_summary
+from financial_analysis import calculate_totals, calculate_score, group_by_month, extrair_maiores_transacoes, detectar_apostas_aprimorado, detectar_movimentacoes_suspeitas, detectar_padroes_janelas, analyze_risk, ContextoAnalise, AgregadosAnalise
+from report_generation import generate_extrato_summary, formatar_resumo_extrato, generate_fatura_summary, generate_general_financial_summary
 
 
+# Palavras-chave que definem o sinal das transações do fallback por regex
+_RE_FALLBACK_ENTRADA = registrar_padrao('fallback_entrada', r'(recebido|deposito|crédito|estorno|salario|rendimento|inclusao de pagamento)')
+_RE_FALLBACK_SAIDA = registrar_padrao('fallback_saida', r'(enviado|pagamento|compra|débito|tarifa|encargo|saque|pgto fat)')
+
+class _PdfPageStream:
+    """
+    Páginas de iter_pdf_pages lidas uma única vez. O início do documento (head_text e head_tables, com ao
+    menos `head_chars` caracteres) é lido na criação, para detectar tipo, banco e parser; lines() continua a
+    leitura de onde ela parou. O texto de cada página é guardado, então lines() pode ser percorrido de novo
+    (ex.: no fallback por regex) sem reler o PDF; as tabelas só são mantidas para as páginas do início.
+    A memória, portanto, cresce com o texto do documento inteiro, que de qualquer forma é guardado depois
+    (all_extracted_text, dados cadastrais e metadados de fatura). Não crescem com o documento as tabelas e as
+    imagens das páginas escaneadas, e o parsing começa antes do fim da leitura.
+    """
+
+    def __init__(self, file_path: str, head_chars: int):
+        self._pages = iter_pdf_pages(file_path)
+        self._page_texts = []
+        self.head_tables = []
+        read_chars = 0
+        for _, page_text, page_tables in self._pages:
+            self._page_texts.append(page_text)
+            self.head_tables.extend(page_tables)
+            read_chars += len(page_text)
+            if read_chars >= head_chars:
+                break
+        self.head_text = "".join(self._page_texts)
+
+    def _next_page_text(self) -> str | None:
+        page = next(self._pages, None)
+        if page is None:
+            return None
+        self._page_texts.append(page[1])
+        return page[1]
+
+    def lines(self) -> Iterable[str]:
+        """Linhas do documento inteiro, desde a primeira página; páginas ainda não lidas são lidas sob demanda."""
+        i = 0
+        while True:
+            page_text = self._page_texts[i] if i < len(self._page_texts) else self._next_page_text()
+            if page_text is None:
+                return
+            i += 1
+            yield from page_text.split('\n')
+
+    @property
+    def text(self) -> str:
+        """Texto do documento inteiro (lê as páginas que faltarem)."""
+        while self._next_page_text() is not None:
+            pass
+        return "".join(self._page_texts)
+
 # --- Classe Principal do Sistema ---
 class FinancialAnalysisSystem:
     def __init__(self):
-        # DataFrames de transações consolidadas de todos os arquivos processados
-        self.all_transactions_raw_df = pd.DataFrame()
+        # Transações consolidadas de todos os arquivos processados: buffer append-only com um DataFrame por
+        # documento e o conjunto de hashes (date, description, value) já vistos, para deduplicar na inserção.
+        # O DataFrame único (all_transactions_raw_df) só é materializado quando é lido.
+        self._transaction_frames = []
+        self._transaction_keys = set()
+        self._all_transactions_df = pd.DataFrame()
+        self._transactions_pending = False
+        # Agregados incrementais da análise e quantos documentos/linhas do buffer já foram incorporados a eles
+        self._reset_aggregates()
         self.inputs_extrato_consolidated_df = pd.DataFrame()
         self.outputs_extrato_consolidated_df = pd.DataFrame()
         self.card_transactions_consolidated_df = pd.DataFrame()
@@ -84,13 +154,91 @@ class FinancialAnalysisSystem:
         self.extrato_summary_consolidated = pd.DataFrame()
         self.fatura_summary_consolidated = pd.DataFrame()
         self.general_financial_summary_consolidated = pd.DataFrame()
+        self.monthly_summary_consolidated = {}
         self.risk_indicators_consolidated = {}
         self.cadastral_data_consolidated = {}
         self.contracheque_data_consolidated = {}
         self.gambling_transactions_consolidated = []
         self.suspicious_transactions_consolidated = []
         self.financial_score = 0
-        self.all_extracted_text = "" # Armazena texto de todos os documentos
+        self._extracted_texts = [] # Texto de todos os documentos (ver all_extracted_text)
+        self._fatura_metadata = [] # Um registro de extrair_metadados_fatura por documento de fatura, na ordem de processamento
+        self.fatura_metadata_consolidated = {}
+        self._all_extracted_text = None
+
+    @property
+    def all_transactions_raw_df(self) -> pd.DataFrame:
+        """Todas as transações (sem duplicatas), materializadas a partir do buffer só quando necessário."""
+        if self._transactions_pending:
+            self._all_transactions_df = pd.concat(self._transaction_frames, ignore_index=True) if self._transaction_frames else pd.DataFrame()
+            self._transactions_pending = False
+        return self._all_transactions_df
+
+    @all_transactions_raw_df.setter
+    def all_transactions_raw_df(self, transactions_df: pd.DataFrame):
+        self._transaction_frames = []
+        self._transaction_keys = set()
+        self._all_transactions_df = pd.DataFrame()
+        self._transactions_pending = False
+        self._reset_aggregates()
+        if not transactions_df.empty:
+            self._add_transactions(transactions_df)
+
+    def _reset_aggregates(self):
+        self._aggregates = AgregadosAnalise()
+        self._aggregated_frames = 0
+        self._aggregated_rows = 0
+
+    def _update_aggregates(self) -> AgregadosAnalise:
+        """
+        Incorpora aos agregados só os documentos do buffer que ainda não foram analisados. O índice do lote
+        continua a numeração global de all_transactions_raw_df, para que os DataFrames categorizados coincidam.
+        """
+        new_frames = self._transaction_frames[self._aggregated_frames:]
+        if new_frames:
+            delta_df = pd.concat(new_frames, ignore_index=True)
+            delta_df.index += self._aggregated_rows
+            self._aggregates.incorporar(ContextoAnalise(delta_df))
+            self._aggregated_frames = len(self._transaction_frames)
+            self._aggregated_rows += len(delta_df)
+        return self._aggregates
+
+    @property
+    def all_extracted_text(self) -> str:
+        """Texto de todos os documentos processados, concatenado só quando necessário."""
+        if self._all_extracted_text is None:
+            self._all_extracted_text = "".join(text + "\n" for text in self._extracted_texts)
+        return self._all_extracted_text
+
+    def _add_extracted_text(self, text: str):
+        self._extracted_texts.append(text)
+        self._all_extracted_text = None
+
+    @staticmethod
+    def _transaction_hashes(transactions: pd.DataFrame) -> np.ndarray:
+        """Hash de 64 bits por linha sobre (date, description, value), com os tipos normalizados entre documentos."""
+        keys = pd.DataFrame({
+            'date': pd.to_datetime(transactions['date'], errors='coerce'),
+            'description': transactions['description'].astype(object),
+            'value': pd.to_numeric(transactions['value'], errors='coerce') + 0.0, # -0.0 e 0.0 viram a mesma chave
+        })
+        return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+    def _add_transactions(self, transactions: pd.DataFrame) -> int:
+        """
+        Acrescenta as transações de um documento ao buffer, descartando as que já foram vistas
+        (em documentos anteriores ou no próprio documento). Retorna quantas foram adicionadas.
+        """
+        is_new = np.zeros(len(transactions), dtype=bool)
+        for i, key in enumerate(self._transaction_hashes(transactions).tolist()):
+            if key not in self._transaction_keys:
+                self._transaction_keys.add(key)
+                is_new[i] = True
+        if not is_new.any():
+            return 0
+        self._transaction_frames.append(transactions[is_new])
+        self._transactions_pending = True
+        return int(is_new.sum())
 
     def process_document(self, file_path: str, file_type: str, file_name: str) -> bool:
         """
@@ -99,23 +247,87 @@ class FinancialAnalysisSystem:
         :param file_type: Tipo do arquivo (inferido ou passado explicitamente).
         :param file_name: Nome original do arquivo, útil para detecção de banco/tipo.
         """
+        return self._merge_document_result(self._extract_document(file_path, file_type, file_name))
+
+    def process_documents(self, files: list[dict], workers: int | None = None) -> list[bool]:
+        """
+        Processa vários documentos, executando extração e parsing de cada arquivo em um worker de
+        ProcessPoolExecutor. Os resultados são consolidados no processo principal na ordem de `files`,
+        então o estado final é o mesmo do processamento sequencial com process_document.
+        :param files: Lista de dicts com 'path', 'type' e 'name' (formato de uploaded_files_info).
+        :param workers: Número de processos (padrão: os.cpu_count()). Com 1 worker, processa sem pool.
+        :return: Lista com o sucesso de cada arquivo, na mesma ordem de `files`. Com ou sem pool, um erro na
+            extração de um arquivo é impresso e o arquivo conta como False, sem interromper os demais.
+        """
+        workers = min(workers or os.cpu_count() or 1, len(files))
+        if workers <= 1:
+            results = []
+            for file_info in files:
+                try:
+                    document_result = self._extract_document(file_info['path'], file_info['type'], file_info['name'])
+                except Exception as e:
+                    print(f"Erro ao processar {file_info['name']}: {e}")
+                    results.append(False)
+                    continue
+                results.append(self._merge_document_result(document_result))
+            return results
+
+        # 'fork' porque as funções vivem no script/sessão principal: com 'spawn'/'forkserver' os workers
+        # reimportariam o script (e reexecutariam o processamento) para encontrá-las.
+        try:
+            mp_context = multiprocessing.get_context('fork')
+        except ValueError:
+            mp_context = None
+
+        results = []
+        # Cada worker pode abrir o próprio pool de OCR: eles dividem CPUs e memória entre si
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context,
+                                 initializer=definir_processos_ocr_concorrentes, initargs=(workers,)) as executor:
+            futures = [executor.submit(_extract_document_worker, f['path'], f['type'], f['name']) for f in files]
+            for file_info, future in zip(files, futures):
+                try:
+                    document_result = future.result()
+                except Exception as e:
+                    print(f"Erro ao processar {file_info['name']}: {e}")
+                    results.append(False)
+                    continue
+                results.append(self._merge_document_result(document_result))
+        return results
+
+    def _extract_document(self, file_path: str, file_type: str, file_name: str) -> dict:
+        """
+        Etapa de process_document que só depende do arquivo: extração de conteúdo, dados cadastrais,
+        contracheque e transações. Não altera o estado consolidado, então pode rodar em outro processo.
+        """
+        document_result = {
+            'file_name': file_name,
+            'text': '',
+            'cadastral_data': {},
+            'contracheque_data': None,
+            'fatura_metadata': None,
+            'transactions': None,
+            'success': False,
+        }
         print(f"Iniciando processamento para: {file_name} (Tipo: {file_type.upper()})")
 
-        extracted_data = handle_uploaded_file(file_path, file_type)
+        if file_type == 'pdf' and not cache_extracao_ativo():
+            # PDFs vão página a página para o parser (ver _extract_pdf_document_streaming). Com o cache de
+            # extração ativado, o que fica guardado é a extração do documento inteiro: segue o caminho abaixo
+            if self._extract_pdf_document_streaming(file_path, file_name, document_result):
+                return document_result
+            extracted_data = {'text': '', 'tables': []} # Sem texto nem tabelas: tenta OCR/Tabula abaixo
+        else:
+            extracted_data = handle_uploaded_file(file_path, file_type)
         current_extracted_text = extracted_data['text']
         current_extracted_tables = extracted_data['tables']
-        self.all_extracted_text += current_extracted_text + "\n" # Acumula todo o texto
+        document_result['text'] = current_extracted_text # Texto acumulado em all_extracted_text
 
         # Se for PDF ou imagem e a extração inicial não encontrou texto ou tabelas, tentar OCR/Tabula
         if (not current_extracted_text.strip() and not current_extracted_tables) and (file_type in ['pdf', 'jpg', 'png', 'jpeg']):
             print("Conteúdo vazio. Tentando OCR/Tabula para extrair conteúdo do documento.")
             if file_type == 'pdf':
                 try:
-                    import tabula
-                    temp_dfs = tabula.read_pdf(file_path, pages='all', multiple_tables=True, pandas_options={'header': None})
-                    for df in temp_dfs:
-                        if not df.empty:
-                            current_extracted_tables.append(df)
+                    current_extracted_tables.extend(extract_tables_tabula(file_path))
                     current_extracted_text += perform_ocr(file_path)
                 except ImportError:
                     print("tabula-py não está instalado. Pulando extração de tabela via tabula.")
@@ -128,33 +340,92 @@ class FinancialAnalysisSystem:
 
         if not current_extracted_text.strip() and not current_extracted_tables:
             print(f"Não foi possível extrair conteúdo de {file_name}. Pulando este arquivo.")
-            return False
+            return document_result
         
         # Extrair dados cadastrais e de contracheque do texto atual
-        current_cadastral_data = extrair_dados_cadastrais(current_extracted_text)
-        self.cadastral_data_consolidated.update(current_cadastral_data) # Acumula/atualiza (pode sobrescrever se houver mais info)
+        document_result['cadastral_data'] = extrair_dados_cadastrais(current_extracted_text)
 
         doc_type = detect_document_type(current_extracted_text, current_extracted_tables, file_type, file_name)
 
         if doc_type == 'contracheque':
-            current_contracheque_data = processar_contracheque(current_extracted_text)
-            self.contracheque_data_consolidated.update(current_contracheque_data)
-            print(f"Documento identificado como Contracracheque. Dados extraídos: {self.contracheque_data_consolidated}")
-            return True # Contracracheque não tem transações para análise de fluxo de caixa
+            document_result['contracheque_data'] = processar_contracheque(current_extracted_text)
+            document_result['success'] = True # Contracracheque não tem transações para análise de fluxo de caixa
+            return document_result
+
+        # Metadados da fatura (valor, vencimento, limites...) lidos uma vez, só do texto deste documento
+        if doc_type == 'fatura_cartao':
+            document_result['fatura_metadata'] = extrair_metadados_fatura(current_extracted_text, file_name)
 
         # Extrair transações (aplica parsers específicos ou genéricos)
         transactions = self._extract_transactions_orchestrator(current_extracted_text, current_extracted_tables, doc_type, file_type, file_name)
         
         if transactions.empty:
             print(f"Nenhuma transação financeira significativa encontrada em {file_name}.")
+            return document_result
+
+        document_result['transactions'] = transactions
+        document_result['success'] = True
+        return document_result
+
+    def _extract_pdf_document_streaming(self, file_path: str, file_name: str, document_result: dict) -> bool:
+        """
+        Caminho de PDFs de _extract_document: as linhas de cada página chegam ao parser assim que a página é
+        lida (e o OCR dela, se escaneada, termina), sem montar antes o texto e as tabelas do documento inteiro.
+        Tipo, banco e parser saem do início do documento, o mesmo trecho usado pela detecção por conteúdo;
+        dados cadastrais, contracheque e metadados de fatura usam o texto completo, guardado durante a leitura.
+        Preenche document_result e retorna True; False se o PDF não tiver conteúdo (o chamador tenta OCR/Tabula).
+        """
+        pages = _PdfPageStream(file_path, max(CARACTERES_CLASSIFICACAO, CARACTERES_IMPRESSAO_DIGITAL))
+        if not pages.head_text.strip() and not pages.head_tables and not pages.text.strip():
+            return False
+
+        doc_type = detect_document_type(pages.head_text, pages.head_tables, 'pdf', file_name)
+        if doc_type == 'contracheque':
+            document_result['text'] = pages.text
+            document_result['cadastral_data'] = extrair_dados_cadastrais(document_result['text'])
+            document_result['contracheque_data'] = processar_contracheque(document_result['text'])
+            document_result['success'] = True
+            return True
+
+        transactions = self._pdf_transactions_from_stream(pages, doc_type, file_name)
+        document_result['text'] = pages.text
+        document_result['cadastral_data'] = extrair_dados_cadastrais(document_result['text'])
+        if doc_type == 'fatura_cartao':
+            document_result['fatura_metadata'] = extrair_metadados_fatura(document_result['text'], file_name)
+
+        if transactions.empty:
+            print(f"Nenhuma transação financeira significativa encontrada em {file_name}.")
+            return True
+
+        document_result['transactions'] = transactions
+        document_result['success'] = True
+        return True
+
+    def _merge_document_result(self, document_result: dict) -> bool:
+        """
+        Incorpora o resultado de _extract_document aos dados consolidados. Chamado sempre no processo
+        principal e na ordem dos arquivos, para que a consolidação seja determinística.
+        """
+        if document_result.get('log'):
+            print(document_result['log'], end='') # Saída capturada no worker
+        self._add_extracted_text(document_result['text']) # Acumula todo o texto
+        self.cadastral_data_consolidated.update(document_result['cadastral_data']) # Acumula/atualiza (pode sobrescrever se houver mais info)
+
+        if document_result['contracheque_data'] is not None:
+            self.contracheque_data_consolidated.update(document_result['contracheque_data'])
+            print(f"Documento identificado como Contracracheque. Dados extraídos: {self.contracheque_data_consolidated}")
+            return True
+
+        if document_result.get('fatura_metadata') is not None:
+            self._fatura_metadata.append(document_result['fatura_metadata'])
+
+        if document_result['transactions'] is None:
             return False
 
         # Acumular transações (evitando duplicatas se a mesma transação aparecer em múltiplos documentos ou extrações)
-        initial_transactions_count = len(self.all_transactions_raw_df)
-        self.all_transactions_raw_df = pd.concat([self.all_transactions_raw_df, transactions], ignore_index=True)
-        self.all_transactions_raw_df.drop_duplicates(subset=['date', 'description', 'value'], inplace=True)
+        new_transactions_count = self._add_transactions(document_result['transactions'])
         
-        print(f"Transações extraídas de {file_name}: {len(self.all_transactions_raw_df) - initial_transactions_count} novas transações adicionadas.")
+        print(f"Transações extraídas de {document_result['file_name']}: {new_transactions_count} novas transações adicionadas.")
         return True
 
     def _extract_transactions_orchestrator(self, text_content: str, extracted_tables: list[pd.DataFrame], doc_type: str, file_type: str, file_name: str) -> pd.DataFrame:
@@ -163,43 +434,29 @@ class FinancialAnalysisSystem:
         Esta função substitui a `extract_transactions` do `data_parsing.py`
         e a integra chamando os parsers específicos de `bank_specific_parsers.py` e `dataframe_parsers.py`.
         """
-        transactions = []
+        transactions = [] # DataFrames no esquema canônico (parsers de PDF são convertidos ao serem chamados)
         
-        # 1. Tentar parsers específicos de Banco/Formato (Prioridade Máxima)
-        bank_name = detect_bank_from_filename(file_name)
+        # 1. Tentar parsers específicos de Banco/Formato (Prioridade Máxima), escolhidos no registro de parsers
+        # pela impressão digital do conteúdo ou, sem ela, pelo banco/tipo detectado no início do documento
+        bank_name = detect_bank(text_content, extracted_tables, file_name)
         
         if file_type == 'pdf':
-            if doc_type == 'extrato_bancario' and bank_name == 'Nubank':
-                print("Chamando parser específico: Nubank Extrato PDF")
-                transactions.extend(parse_nubank_extrato_pdf(text_content, doc_type))
-            elif doc_type == 'fatura_cartao' and bank_name == 'C6 Bank':
-                print("Chamando parser específico: C6 Fatura PDF")
-                transactions.extend(parse_c6_fatura_pdf(text_content, doc_type))
-            # Adicionar mais condições para outros bancos/tipos de PDF
+            parser = selecionar_parser(file_type, doc_type, bank_name, text_content=text_content)
+            if parser is not None:
+                print(f"Chamando parser específico: {parser['nome']}")
+                transactions.append(pd.DataFrame(parser['funcao'](text_content, parser['doc_type']), columns=COLUNAS_TRANSACAO))
             
         elif file_type in ['csv', 'xlsx']:
-            if doc_type == 'extrato_bancario' and bank_name == 'Nubank':
-                for df_table in extracted_tables:
-                    transactions.extend(process_nubank_extrato_csv(df_table, doc_type))
-            elif doc_type == 'fatura_cartao' and bank_name == 'Nubank':
-                for df_table in extracted_tables:
-                    transactions.extend(process_nubank_fatura_csv(df_table, doc_type))
-            elif doc_type == 'extrato_bancario' and bank_name == 'Banco Inter':
-                for df_table in extracted_tables:
-                    transactions.extend(process_inter_extrato_csv(df_table, doc_type))
-            elif doc_type == 'fatura_cartao' and bank_name == 'Banco Inter':
-                for df_table in extracted_tables:
-                    transactions.extend(process_inter_fatura_csv(df_table, doc_type))
-            elif doc_type == 'extrato_bancario' and bank_name == 'Caixa Econômica Federal':
-                for df_table in extracted_tables:
-                    transactions.extend(process_caixa_extrato_csv(df_table, doc_type))
-            elif doc_type == 'fatura_cartao' and bank_name == 'PicPay':
-                for df_table in extracted_tables:
-                    transactions.extend(process_picpay_fatura_csv(df_table, doc_type))
-            else: # CSV/XLSX genérico
-                print("Chamando parser genérico de DataFrame para CSV/XLSX.")
-                for df_table in extracted_tables:
-                    transactions.extend(process_dataframe_generic(df_table, doc_type))
+            for df_table in extracted_tables:
+                parser = selecionar_parser(file_type, doc_type, bank_name, table=df_table)
+                if parser is not None:
+                    print(f"Chamando parser específico: {parser['nome']}")
+                    transactions.append(parser['funcao'](df_table, parser['doc_type']))
+                else: # CSV/XLSX genérico
+                    print("Chamando parser genérico de DataFrame para CSV/XLSX.")
+                    transactions.append(process_dataframe_generic(df_table, doc_type))
+
+        transactions = [df for df in transactions if not df.empty]
 
         # 2. Fallback para extração de texto bruto via regex se nada foi encontrado ou se for complementar
         # (Este é o `extract_transactions` original do `data_parsing.py` com a lógica de regex)
@@ -207,46 +464,63 @@ class FinancialAnalysisSystem:
             print("Nenhum parser específico ou de DataFrame encontrou transações. Tentando extração via regex em texto bruto.")
             # Chamada da função original de extração por regex que estava em data_parsing.py
             # Reimplementada aqui ou chamada de data_parsing.extract_transactions diretamente se não houvesse o orquestrador
-            transactions.extend(self._extract_transactions_from_text_fallback(text_content, doc_type))
+            transactions.append(pd.DataFrame(self._extract_transactions_from_text_fallback(text_content, doc_type), columns=COLUNAS_TRANSACAO))
+
+        if not transactions:
+            return transacoes_vazias()
+        return pd.concat(transactions, ignore_index=True)
+
+    def extract_pdf_transactions_streaming(self, file_path: str, doc_type: str, file_name: str) -> pd.DataFrame:
+        """
+        Extrai as transações de um PDF consumindo as linhas página a página (ver _PdfPageStream), sem montar o
+        texto do documento inteiro antes do parsing (o texto das páginas lidas fica guardado até o fim).
+        Mesmo caminho de _extract_document para PDFs.
+        """
+        pages = _PdfPageStream(file_path, max(CARACTERES_CLASSIFICACAO, CARACTERES_IMPRESSAO_DIGITAL))
+        return self._pdf_transactions_from_stream(pages, doc_type, file_name)
 
-        return pd.DataFrame(transactions)
+    def _pdf_transactions_from_stream(self, pages: _PdfPageStream, doc_type: str, file_name: str) -> pd.DataFrame:
+        """
+        Mesma prioridade de _extract_transactions_orchestrator para PDFs: parser escolhido por selecionar_parser
+        (impressão digital do início do documento ou banco detectado) e, se ele não encontrar nada, o fallback
+        por regex sobre as mesmas linhas, já lidas, sem abrir o PDF de novo.
+        """
+        bank_name = detect_bank(pages.head_text, pages.head_tables, file_name)
+        parser = selecionar_parser('pdf', doc_type, bank_name, text_content=pages.head_text)
+        if parser is not None:
+            print(f"Chamando parser específico: {parser['nome']}")
+            transactions = pd.DataFrame(parser['funcao'](pages.lines(), parser['doc_type']), columns=COLUNAS_TRANSACAO)
+            if not transactions.empty:
+                return transactions
+        print("Nenhum parser específico ou de DataFrame encontrou transações. Tentando extração via regex em texto bruto.")
+        transactions = pd.DataFrame(self._extract_transactions_from_text_fallback(pages.lines(), doc_type), columns=COLUNAS_TRANSACAO)
+        return transactions if not transactions.empty else transacoes_vazias()
 
-    def _extract_transactions_from_text_fallback(self, text_content: str, doc_type: str) -> list[dict]:
+    def _extract_transactions_from_text_fallback(self, text_content: str | Iterable[str], doc_type: str) -> list[dict]:
         """
         Função de fallback para extrair transações de texto bruto via regex.
         Copypaste da lógica original de data_parsing.extract_transactions, focada em regex.
+        Aceita o texto inteiro ou um iterável de linhas (ex.: iter_pdf_lines).
         """
         fallback_transactions = []
-        current_year = datetime.now().year
-        lines = text_content.split('\n')
+        parse_date = ParserDatasDocumento() # Formato vencedor e não-datas memorizados por documento
+        lines = text_content.split('\n') if isinstance(text_content, str) else text_content
         
         for line in lines:
             line = line.strip()
-            if not line: continue
+            # Só linhas com algum candidato a data e a valor (uma varredura, ver linha_com_data_e_valor)
+            if not line or not linha_com_data_e_valor(line): continue
 
             found_date = None
-            date_patterns = [
-                r'\b\d{2}/\d{2}/\d{4}\b', r'\b\d{2}/\d{2}\b', r'\b\d{4}-\d{2}-\d{2}\b', # DD/MM/YYYY, DD/MM, YYYY-MM-DD
-                r'\b\d{1,2}\s+de\s+\w+\s+de\s+\d{4}\b', # DD de Mes de AAAA
-                r'\b\d{1,2}\s+[A-Za-z]{3}\b' # DD Mon
-            ]
-            for pattern in date_patterns:
-                match_date = re.search(pattern, line)
+            for pattern in PADROES_DATA_TEXTO: # DD/MM/YYYY, DD/MM, YYYY-MM-DD, DD de Mes de AAAA, DD Mon
+                match_date = pattern.search(line)
                 if match_date:
-                    found_date = parse_date_string(match_date.group(0), current_year)
+                    found_date = parse_date(match_date.group(0))
                     if found_date: break
 
             found_value = None
-            value_patterns = [
-                r'R\$?\s*-?\d{1,3}(?:\.?\d{3})*,\d{2}', # R$ 1.234,56
-                r'R\$?\s*-?\d{1,3}(?:,\d{3})*\.\d{2}', # R$ 1,234.56
-                r'-?\d{1,3}(?:\.?\d{3})*,\d{2}',       # 1.234,56
-                r'-?\d{1,3}(?:,\d{3})*\.\d{2}',       # 1,234.56
-                r'-?\d+\.\d{2}',                      # 123.45
-                r'-?\d+,\d{2}'                        # 123,45
-            ]
-            for pattern in value_patterns:
-                match_value = re.search(pattern, line)
+            for pattern in PADROES_VALOR_TEXTO: # R$ 1.234,56, R$ 1,234.56, 1.234,56, 1,234.56, 123.45, 123,45
+                match_value = pattern.search(line)
                 if match_value:
                     found_value = parse_financial_value(match_value.group(0))
                     if found_value is not None: break
@@ -257,8 +531,8 @@ class FinancialAnalysisSystem:
                 if match_value: temp_line = temp_line.replace(match_value.group(0), '', 1)
                 description = temp_line.strip()
 
-                is_input_keyword = re.search(r'(recebido|deposito|crédito|estorno|salario|rendimento|inclusao de pagamento)', description.lower())
-                is_output_keyword = re.search(r'(enviado|pagamento|compra|débito|tarifa|encargo|saque|pgto fat)', description.lower())
+                is_input_keyword = _RE_FALLBACK_ENTRADA.search(description.lower())
+                is_output_keyword = _RE_FALLBACK_SAIDA.search(description.lower())
 
                 if is_input_keyword and not is_output_keyword:
                     found_value = abs(found_value)
@@ -280,50 +554,80 @@ class FinancialAnalysisSystem:
         return fallback_transactions
 
 
-    def perform_full_analysis(self):
+    def perform_full_analysis(self, incremental: bool = True):
         """
         Executa a análise completa após todos os documentos serem processados e as transações consolidadas.
+        :param incremental: Atualizar os agregados só com os documentos novos desde a última análise. Com False,
+            tudo é recalculado a partir de todas as transações (modo de verificação) e os agregados são refeitos
+            na próxima análise incremental.
         """
         if self.all_transactions_raw_df.empty:
             print("Nenhum dado de transação disponível para análise completa.")
             return False
 
         print("\n--- Realizando Análise Financeira Completa ---")
+        self.fatura_metadata_consolidated = consolidar_metadados_fatura(self._fatura_metadata)
+        if incremental:
+            self._perform_incremental_analysis()
+        else:
+            self._reset_aggregates()
+            self._perform_rebuild_analysis()
+
+        # Valores da fatura vêm dos metadados lidos de cada documento de fatura, não do texto de todos os documentos
+        self.fatura_summary_consolidated = generate_fatura_summary(
+            self.card_transactions_consolidated_df, self.card_credits_consolidated_df, self.fatura_metadata_consolidated
+        )
+        self.general_financial_summary_consolidated = generate_general_financial_summary(
+            self.inputs_extrato_consolidated_df, self.outputs_extrato_consolidated_df,
+            self.card_transactions_consolidated_df, self.card_credits_consolidated_df
+        )
+
+        print("\n--- Análise Financeira Completa Gerada ---")
+        return True
+
+    def _perform_incremental_analysis(self):
+        """Resumos, riscos, alertas e score a partir dos agregados (ver AgregadosAnalise)."""
+        aggregates = self._update_aggregates()
+        self.inputs_extrato_consolidated_df, self.outputs_extrato_consolidated_df, \
+        self.card_transactions_consolidated_df, self.card_credits_consolidated_df = \
+            aggregates.transacoes_categorizadas()
+
+        print(f"Total de Transações Categorizadas: {aggregates.transacoes}")
 
-        # 1. Categorizar todas as transações consolidadas
+        self.extrato_summary_consolidated = formatar_resumo_extrato(aggregates.totais_categoria)
+        self.monthly_summary_consolidated = aggregates.resumo_mensal()
+        self.risk_indicators_consolidated = aggregates.indicadores_risco(self.fatura_metadata_consolidated)
+        self.gambling_transactions_consolidated = list(aggregates.apostas)
+        self.suspicious_transactions_consolidated = aggregates.movimentacoes_suspeitas()
+        self.financial_score = aggregates.score()
+
+    def _perform_rebuild_analysis(self):
+        """Recalcula tudo com as funções de análise sobre todas as transações."""
+        # 1. Categorizar todas as transações consolidadas. O contexto calcula uma vez datas, máscaras de sinal
+        # e de tipo de documento, descrições em minúsculas e somas por dia, e alimenta todas as etapas abaixo
+        contexto = ContextoAnalise(self.all_transactions_raw_df)
         self.inputs_extrato_consolidated_df, self.outputs_extrato_consolidated_df, \
         self.card_transactions_consolidated_df, self.card_credits_consolidated_df = \
-            categorize_transactions_detailed(self.all_transactions_raw_df)
+            contexto.transacoes_categorizadas()
 
-        print(f"Total de Transações Categorizadas: {len(self.all_transactions_raw_df)}")
+        print(f"Total de Transações Categorizadas: {len(contexto.df)}")
 
         # 2. Gerar resumos e métricas
         self.extrato_summary_consolidated = generate_extrato_summary(
             self.inputs_extrato_consolidated_df, self.outputs_extrato_consolidated_df
         )
-        # Para a fatura, precisamos do texto consolidado ou do texto da última fatura processada
-        self.fatura_summary_consolidated = generate_fatura_summary(
-            self.card_transactions_consolidated_df, self.card_credits_consolidated_df, self.all_extracted_text
-        )
-        self.general_financial_summary_consolidated = generate_general_financial_summary(
-            self.inputs_extrato_consolidated_df, self.outputs_extrato_consolidated_df,
-            self.card_transactions_consolidated_df, self.card_credits_consolidated_df
-        )
+        self.monthly_summary_consolidated = group_by_month(contexto.df)
         
         # 3. Análise de Risco
-        self.risk_indicators_consolidated = analyze_risk(self.all_transactions_raw_df, self.all_extracted_text)
+        self.risk_indicators_consolidated = analyze_risk(contexto, self.fatura_metadata_consolidated)
 
         # 4. Detecção de Apostas e Movimentações Suspeitas
-        self.gambling_transactions_consolidated = detectar_apostas_aprimorado(self.all_transactions_raw_df)
-        self.suspicious_transactions_consolidated = detectar_movimentacoes_suspeitas(self.all_transactions_raw_df)
+        self.gambling_transactions_consolidated = detectar_apostas_aprimorado(contexto)
+        self.suspicious_transactions_consolidated = detectar_movimentacoes_suspeitas(contexto)
+        self.suspicious_transactions_consolidated += detectar_padroes_janelas(contexto) # Padrões que atravessam dias
 
         # 5. Cálculo do Score Financeiro Geral (do extrato principalmente)
-        # Concatenar extrato de entrada e saída para cálculo de score
-        df_for_score = pd.concat([self.inputs_extrato_consolidated_df, self.outputs_extrato_consolidated_df], ignore_index=True)
-        self.financial_score = calculate_score(df_for_score)
-
-        print("\n--- Análise Financeira Completa Gerada ---")
-        return True
+        self.financial_score = calculate_score(contexto.df.loc[contexto.extrato, ['value']])
 
     def get_analysis_results(self):
         """
@@ -338,13 +642,353 @@ class FinancialAnalysisSystem:
             "card_credits": self.card_credits_consolidated_df,
             "extrato_summary": self.extrato_summary_consolidated,
             "fatura_summary": self.fatura_summary_consolidated,
+            "fatura_metadata": self.fatura_metadata_consolidated,
             "general_financial_summary": self.general_financial_summary_consolidated,
+            "monthly_summary": self.monthly_summary_consolidated,
             "risk_indicators": self.risk_indicators_consolidated,
             "gambling_transactions": self.gambling_transactions_consolidated,
             "suspicious_transactions": self.suspicious_transactions_consolidated,
             "financial_score": self.financial_score
         }
 
+
+def _extract_document_worker(file_path: str, file_type: str, file_name: str) -> dict:
+    """
+    Executado nos processos do pool de process_documents. A saída impressa durante a extração é
+    capturada e devolvida em 'log', para ser impressa na ordem dos arquivos pelo processo principal.
+    """
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        document_result = FinancialAnalysisSystem()._extract_document(file_path, file_type, file_name)
+    document_result['log'] = log.getvalue()
+    return document_result
+
+def _corpus_linhas_benchmark(n: int) -> list[str]:
+    """Linhas sintéticas no formato de extratos/faturas: transações Nubank, C6 e genéricas misturadas a cabeçalhos e texto."""
+    import random
+    aleatorio = random.Random(42)
+    modelos = [
+        lambda i: f"{i % 28 + 1:02d}/{i % 12 + 1:02d} - Pix recebido de FULANO {i} - R$ {i % 9 + 1}.{i % 1000:03d},{i % 100:02d} Saldo R$ 5.851,34",
+        lambda i: f"{i % 28 + 1:02d} mai IFD IMPERIO DO CALDO {i} {i % 999},{i % 100:02d}",
+        lambda i: f"{i % 28 + 1:02d}/03 Débito de Cartão MEEP PA CLUBE {i} BRA R$ {i % 999},{i % 100:02d}",
+        lambda i: f"{i % 28 + 1:02d}/{i % 12 + 1:02d}/2024 COMPRA MERCADO {i} -{i % 999}.{i % 100:02d}",
+        lambda i: "Vencimento 10/05/2025 Total a pagar R$ 1.234,56",
+        lambda i: f"Página {i % 40 + 1} de 40",
+        lambda i: "Data Descrição Valor Saldo",
+        lambda i: "Central de atendimento: capitais e regiões metropolitanas",
+        lambda i: f"Agência 0001 Conta {i}-7",
+        lambda i: "",
+    ]
+    return [aleatorio.choice(modelos)(i) for i in range(n)]
+
+def benchmark_linhas(n: int = 100_000, repeticoes: int = 3) -> dict[str, float]:
+    """
+    Vazão (linhas/s) do fallback por regex e dos parsers de PDF por banco, que usam os padrões
+    pré-compiladas de REGISTRO_PADROES e os pré-filtros por linha.
+    """
+    import time
+
+    lines = _corpus_linhas_benchmark(n)
+    system = FinancialAnalysisSystem()
+    parsers = [
+        ('fallback', lambda: system._extract_transactions_from_text_fallback(lines, 'extrato_bancario')),
+        ('nubank_extrato', lambda: parse_nubank_extrato_pdf(lines, 'extrato_bancario')),
+        ('c6_fatura', lambda: parse_c6_fatura_pdf(lines, 'fatura_cartao')),
+    ]
+    medicoes = {}
+    for nome, parser in parsers:
+        melhor = float('inf')
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            transacoes = parser()
+            melhor = min(melhor, time.perf_counter() - inicio)
+        medicoes[f'{nome}_linhas_s'] = n / melhor
+        medicoes[f'{nome}_transacoes'] = len(transacoes)
+    print(f"Linhas ({n}, {len(REGISTRO_PADROES)} padrões registrados): " + " | ".join(
+        f"{nome} {medicoes[f'{nome}_linhas_s']:,.0f} linhas/s ({medicoes[f'{nome}_transacoes']} transações)" for nome, _ in parsers
+    ))
+    return medicoes
+
+def benchmark_pdf_backends(pdf_paths: list[str] | None = None, backends: list[str] | None = None) -> pd.DataFrame:
+    """
+    Compara os backends de extração de PDF (BACKENDS_PDF) em tempo e em paridade: para cada PDF, se o texto
+    e as transações obtidas pelo orquestrador são iguais às do primeiro backend (a referência).
+    O cache de extração não é usado. Por padrão usa os PDFs de _base_path.
+    """
+    import time
+
+    if pdf_paths is None:
+        pdf_paths = sorted(os.path.join(_base_path, f) for f in os.listdir(_base_path) if f.lower().endswith('.pdf'))
+    backends = backends or list(BACKENDS_PDF)
+    system = FinancialAnalysisSystem()
+    rows = []
+    for path in pdf_paths:
+        file_name = os.path.basename(path)
+        doc_type = detect_file_type_by_filename(file_name)
+        row = {'arquivo': file_name}
+        reference = None
+        for backend in backends:
+            with contextlib.redirect_stdout(io.StringIO()): # Silencia os avisos dos parsers
+                start = time.perf_counter()
+                extracted = _extract_uploaded_file(path, 'pdf', backend)
+                row[f'{backend}_s'] = time.perf_counter() - start
+                transactions = system._extract_transactions_orchestrator(extracted['text'], extracted['tables'], doc_type, 'pdf', file_name)
+            row[f'{backend}_transacoes'] = len(transactions)
+            if reference is None:
+                reference = (extracted['text'], transactions)
+            else:
+                row[f'{backend}_texto_igual'] = extracted['text'] == reference[0]
+                row[f'{backend}_transacoes_iguais'] = transactions.equals(reference[1])
+        rows.append(row)
+
+    results = pd.DataFrame(rows)
+    summary = " | ".join(f"{backend} {results[f'{backend}_s'].sum():.2f}s" for backend in backends)
+    parity = " | ".join(
+        f"{backend}: texto igual em {int(results[f'{backend}_texto_igual'].sum())}/{len(results)}, "
+        f"transações iguais em {int(results[f'{backend}_transacoes_iguais'].sum())}/{len(results)}"
+        for backend in backends[1:]
+    )
+    print(f"Backends de PDF ({len(results)} arquivos): {summary}")
+    if parity:
+        print(f"Paridade com {backends[0]}: {parity}")
+    return results
+
+# --- Análise em Lote: um processo por cliente ---
+
+def _batch_file_info(entry: str | dict) -> dict:
+    """Normaliza um arquivo do manifesto (caminho ou dict) para o formato de uploaded_files_info."""
+    if isinstance(entry, str):
+        entry = {'path': entry}
+    name = entry.get('name') or os.path.basename(entry['path'])
+    file_type = entry.get('type') or os.path.splitext(name)[1].lower().replace('.', '')
+    return {'path': entry['path'], 'type': file_type, 'name': name}
+
+def _batch_jobs(manifest: str | dict | Iterable[dict]) -> Iterable[tuple[str, list[dict]]]:
+    """
+    Gera (customer_id, arquivos) a partir do manifesto, sob demanda. Aceita um dict {cliente: [arquivos]},
+    um iterável de dicts {'customer_id': ..., 'files': [...]} ou o caminho de um arquivo .json (com um
+    desses formatos) ou .jsonl (um cliente por linha, lido linha a linha).
+    """
+    if isinstance(manifest, str):
+        with open(manifest, encoding='utf-8') as f:
+            if manifest.lower().endswith('.jsonl'):
+                for line in f:
+                    if line.strip():
+                        job = json.loads(line)
+                        yield str(job['customer_id']), [_batch_file_info(e) for e in job['files']]
+                return
+            manifest = json.load(f)
+    if isinstance(manifest, dict):
+        manifest = ({'customer_id': customer_id, 'files': files} for customer_id, files in manifest.items())
+    for job in manifest:
+        yield str(job['customer_id']), [_batch_file_info(e) for e in job['files']]
+
+def _batch_json_default(value):
+    """Conversão para JSON dos valores de get_analysis_results que o módulo json não serializa."""
+    if isinstance(value, pd.DataFrame):
+        if any(name is not None for name in value.index.names):
+            value = value.reset_index()
+        return value.astype(object).where(value.notna(), None).to_dict('records')
+    if isinstance(value, pd.Series):
+        return value.astype(object).where(value.notna(), None).to_dict()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+def _analyze_customer_worker(customer_id: str, files: list[dict], output_path: str, conn, concurrent: int = 1):
+    """
+    Executado em um processo próprio por run_batch: processa os arquivos do cliente, faz a análise completa,
+    grava get_analysis_results() em `output_path` e envia pelo `conn` o status e o tempo de cada etapa.
+    A saída impressa vai para o campo 'log' do arquivo do cliente, não para o terminal do lote.
+    `concurrent` é o número de clientes em paralelo, entre os quais o OCR divide CPUs e memória.
+    """
+    definir_processos_ocr_concorrentes(concurrent)
+    # Grupo de processos próprio: no timeout, _stop_customer_process encerra também os processos que o
+    # worker criou (como o pool de OCR de iter_ocr_pages)
+    if hasattr(os, 'setsid'):
+        os.setsid()
+    stages = {}
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            system = FinancialAnalysisSystem()
+            start = time.perf_counter()
+            processed = [system.process_document(f['path'], f['type'], f['name']) for f in files]
+            stages['processamento_s'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            analysis_performed = system.perform_full_analysis()
+            stages['analise_s'] = time.perf_counter() - start
+
+        status = 'ok' if analysis_performed else 'sem_transacoes'
+        error = None
+        if files and not any(processed): # Nenhum arquivo abriu: não é um cliente sem transações
+            status, error = 'erro', "nenhum arquivo do cliente foi processado"
+        start = time.perf_counter()
+        # Grava em um temporário e renomeia: um worker interrompido pelo timeout não deixa arquivo pela metade
+        with open(output_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({
+                'customer_id': customer_id,
+                'status': status,
+                'erro': error,
+                'files': [{'name': f['name'], 'processed': success} for f, success in zip(files, processed)],
+                'results': system.get_analysis_results(),
+                'log': log.getvalue(),
+            }, f, ensure_ascii=False, default=_batch_json_default)
+        os.replace(output_path + '.tmp', output_path)
+        stages['escrita_s'] = time.perf_counter() - start
+        conn.send({'status': status, 'transacoes': len(system.all_transactions_raw_df), **stages, **({'erro': error} if error else {})})
+    except Exception as e:
+        conn.send({'status': 'erro', 'erro': f"{type(e).__name__}: {e}", **stages})
+    finally:
+        conn.close()
+
+def _batch_output_name(customer_id: str) -> str:
+    """
+    Nome do arquivo de resultado de um cliente. Um ID com caracteres fora de [\w.-] é saneado e ganha um hash
+    curto do ID original, para que IDs distintos como 'a/b' e 'a_b' não gravem no mesmo arquivo.
+    """
+    name = re.sub(r'[^\w.-]', '_', customer_id)
+    if name != customer_id or not name:
+        name += '-' + hashlib.sha1(customer_id.encode('utf-8')).hexdigest()[:8]
+    return name + '.json'
+
+def _stop_customer_process(process, grace: float = 5.0):
+    """Encerra o worker de um cliente e o grupo de processos dele; SIGKILL se não sair em `grace` segundos."""
+    def send(sig):
+        try:
+            os.killpg(process.pid, sig)
+        except (AttributeError, ProcessLookupError, PermissionError):
+            # Sem killpg ou o worker ainda não criou o próprio grupo: sinaliza só o processo
+            if sig == signal.SIGTERM:
+                process.terminate()
+            else:
+                process.kill()
+
+    if process.is_alive():
+        send(signal.SIGTERM)
+        process.join(grace)
+    if process.is_alive():
+        send(getattr(signal, 'SIGKILL', signal.SIGTERM))
+    process.join()
+
+def run_batch(manifest: str | dict | Iterable[dict], output_dir: str, workers: int | None = None, timeout: float = 600.0) -> pd.DataFrame:
+    """
+    Analisa vários clientes, cada um em um processo isolado (um FinancialAnalysisSystem por cliente), e grava
+    os resultados de cada um em `output_dir`/<cliente>.json (ver _batch_output_name). No máximo `workers` clientes ficam em andamento:
+    o manifesto só é lido quando um processo termina, então a fila não cresce com o tamanho do lote.
+    :param manifest: Clientes e seus arquivos (ver _batch_jobs). Arquivos são caminhos ou dicts com 'path'
+        e, opcionalmente, 'type' e 'name'.
+    :param output_dir: Diretório dos resultados; recebe também resumo_lote.csv com uma linha por cliente.
+    :param workers: Processos simultâneos (padrão: os.cpu_count()).
+    :param timeout: Segundos por cliente; o processo que passar disso é encerrado com status 'timeout'.
+    :return: DataFrame com status, número de transações e tempo de cada etapa por cliente.
+    """
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    # 'fork' pelo mesmo motivo de process_documents: as funções vivem no script/sessão principal
+    try:
+        mp_context = multiprocessing.get_context('fork')
+    except ValueError:
+        mp_context = multiprocessing.get_context()
+
+    jobs = _batch_jobs(manifest)
+    running = {} # conexão de leitura -> (processo, cliente, nº de arquivos, início, prazo)
+    output_names = set() # Arquivos de resultado já usados neste lote
+    rows = []
+    batch_start = time.perf_counter()
+
+    def finish(conn, result):
+        process, customer_id, n_files, start, _ = running.pop(conn)
+        process.join(5)
+        _stop_customer_process(process)
+        conn.close()
+        rows.append({'customer_id': customer_id, 'arquivos': n_files, **result, 'total_s': time.perf_counter() - start})
+
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(running) < workers:
+                try:
+                    customer_id, files = next(jobs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                output_name = _batch_output_name(customer_id)
+                if output_name in output_names: # Mesmo cliente repetido no manifesto: não sobrescreve o primeiro
+                    rows.append({'customer_id': customer_id, 'status': 'erro', 'arquivos': len(files),
+                                 'erro': f"cliente repetido no manifesto ({output_name})", 'total_s': 0.0})
+                    continue
+                output_names.add(output_name)
+                output_path = os.path.join(output_dir, output_name)
+                recv_conn, send_conn = mp_context.Pipe(duplex=False)
+                process = mp_context.Process(target=_analyze_customer_worker, args=(customer_id, files, output_path, send_conn, workers), daemon=False)
+                start = time.perf_counter()
+                process.start()
+                send_conn.close() # Só o worker escreve: se ele morrer sem responder, a leitura recebe EOF
+                running[recv_conn] = (process, customer_id, len(files), start, start + timeout)
+            if not running:
+                break
+
+            next_deadline = min(deadline for *_, deadline in running.values())
+            for conn in multiprocessing.connection.wait(list(running), max(0.0, next_deadline - time.perf_counter())):
+                try:
+                    result = conn.recv()
+                except EOFError:
+                    result = {'status': 'erro', 'erro': f"worker encerrado (código {running[conn][0].exitcode})"}
+                finish(conn, result)
+            now = time.perf_counter()
+            for conn in [c for c, (*_, deadline) in running.items() if deadline <= now]:
+                _stop_customer_process(running[conn][0], grace=1.0)
+                finish(conn, {'status': 'timeout', 'erro': f"excedeu {timeout:.0f}s"})
+    finally:
+        # Workers não são daemon (daemons não podem ter filhos, e o OCR usa um pool): se o lote for
+        # interrompido, os que ainda estão rodando são encerrados aqui
+        for process, *_ in running.values():
+            _stop_customer_process(process, grace=1.0)
+
+    elapsed = time.perf_counter() - batch_start
+    results = pd.DataFrame(rows, columns=['customer_id', 'status', 'arquivos', 'transacoes', 'processamento_s', 'analise_s', 'escrita_s', 'total_s', 'erro'])
+    results.to_csv(os.path.join(output_dir, 'resumo_lote.csv'), index=False)
+
+    counts = results['status'].value_counts()
+    latencies = " | ".join(
+        f"{stage[:-2]} p50 {results[stage].quantile(0.5):.2f}s p95 {results[stage].quantile(0.95):.2f}s"
+        for stage in ['processamento_s', 'analise_s', 'escrita_s', 'total_s'] if results[stage].notna().any()
+    )
+    print(f"Lote: {len(results)} clientes em {elapsed:.1f}s ({len(results) / elapsed * 60 if elapsed else 0:.1f} clientes/min, {workers} workers) - "
+          + ", ".join(f"{status} {count}" for status, count in counts.items()))
+    if latencies:
+        print(f"Latência por etapa: {latencies}")
+    return results
+
+def batch_main(argv: list[str] | None = None) -> int:
+    """
+    Linha de comando de run_batch. Como o script contém comandos '!pip' do Code Interpreter, rode com IPython:
+    ipython main.py -- --manifest clientes.jsonl --output resultados/ [--workers N] [--timeout S]
+    :return: 0 se todos os clientes terminaram com 'ok' ou 'sem_transacoes', 1 caso contrário.
+    """
+    parser = argparse.ArgumentParser(description="Análise financeira em lote, um processo por cliente.")
+    parser.add_argument('--manifest', required=True, help="Arquivo .json ou .jsonl com clientes e seus arquivos.")
+    parser.add_argument('--output', required=True, help="Diretório onde gravar <cliente>.json e resumo_lote.csv.")
+    parser.add_argument('--workers', type=int, default=None, help="Processos simultâneos (padrão: nº de CPUs).")
+    parser.add_argument('--timeout', type=float, default=600.0, help="Segundos por cliente (padrão: 600).")
+    args = parser.parse_args(argv)
+    results = run_batch(args.manifest, args.output, workers=args.workers, timeout=args.timeout)
+    return int(not results['status'].isin(['ok', 'sem_transacoes']).all())
+
+def _transaction_lines(transactions_df: pd.DataFrame) -> str:
+    """Uma linha '- data: descrição - R$ valor' por transação, montadas coluna a coluna."""
+    lines = "- " + transactions_df['date'].dt.strftime('%d/%m/%Y') + ": " + transactions_df['description'].astype(str) + " - " + formatar_reais(transactions_df['value'])
+    return "\n".join(lines)
+
+
+# Execução em lote pela linha de comando (ver batch_main); na sessão do Code Interpreter segue o exemplo abaixo
+if __name__ == '__main__' and '--manifest' in sys.argv[1:]:
+    sys.exit(batch_main())
+
 # --- Bloco de Exemplo de Uso para o Code Interpreter ---
 # Este bloco é o ponto de entrada quando você cola e executa o código.
 # Ele simula a detecção de arquivos que o usuário fez upload.
@@ -374,9 +1018,9 @@ else:
     print(f"Arquivos detectados para processamento: {[f['name'] for f in uploaded_files_info]}")
     
     all_processed_successfully = True
-    for file_info in uploaded_files_info:
-        # Passa o nome original do arquivo para a função process_document
-        success = financial_system.process_document(file_info['path'], file_info['type'], file_info['name'])
+    # Extração/parsing em paralelo (um processo por arquivo); a consolidação segue a ordem da lista
+    processing_results = financial_system.process_documents(uploaded_files_info)
+    for file_info, success in zip(uploaded_files_info, processing_results):
         if not success:
             all_processed_successfully = False
             print(f"Aviso: Falha ao processar {file_info['name']}.")
@@ -408,31 +1052,27 @@ else:
 
             if not results['inputs_extrato'].empty:
                 print("\n### Extrato Bancário - Entradas:")
-                for cat, group in results['inputs_extrato'].sort_values(by='date').groupby('specific_category', sort=False):
+                for cat, group in results['inputs_extrato'].sort_values(by='date').groupby('specific_category', sort=False, observed=True):
                     print(f"\n**{cat}:**")
-                    for _, row in group.iterrows():
-                        print(f"- {row['date'].strftime('%d/%m/%Y')}: {row['description']} - R$ {row['value']:.2f}")
+                    print(_transaction_lines(group))
 
             if not results['outputs_extrato'].empty:
                 print("\n### Extrato Bancário - Saídas:")
-                for cat, group in results['outputs_extrato'].sort_values(by='date').groupby('specific_category', sort=False):
+                for cat, group in results['outputs_extrato'].sort_values(by='date').groupby('specific_category', sort=False, observed=True):
                     print(f"\n**{cat}:**")
-                    for _, row in group.iterrows():
-                        print(f"- {row['date'].strftime('%d/%m/%Y')}: {row['description']} - R$ {row['value']:.2f}")
+                    print(_transaction_lines(group))
             
             if not results['card_credits'].empty:
                 print("\n### Fatura de Cartão - Créditos/Pagamentos:")
-                for cat, group in results['card_credits'].sort_values(by='date').groupby('specific_category', sort=False):
+                for cat, group in results['card_credits'].sort_values(by='date').groupby('specific_category', sort=False, observed=True):
                     print(f"\n**{cat}:**")
-                    for _, row in group.iterrows():
-                        print(f"- {row['date'].strftime('%d/%m/%Y')}: {row['description']} - R$ {row['value']:.2f}")
+                    print(_transaction_lines(group))
 
             if not results['card_transactions'].empty:
                 print("\n### Fatura de Cartão - Compras/Débitos:")
-                for cat, group in results['card_transactions'].sort_values(by='date').groupby('specific_category', sort=False):
+                for cat, group in results['card_transactions'].sort_values(by='date').groupby('specific_category', sort=False, observed=True):
                     print(f"\n**{cat}:**")
-                    for _, row in group.iterrows():
-                        print(f"- {row['date'].strftime('%d/%m/%Y')}: {row['description']} - R$ {row['value']:.2f}")
+                    print(_transaction_lines(group))
 
             print("\n**4. Resumos Consolidados:**")
             
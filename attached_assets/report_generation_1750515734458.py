@@ -4,8 +4,8 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 
-# Importa as funções auxiliares de parsing para formatação (ex: parse_financial_value)
-# from data_parsing import parse_financial_value
+# Importa as funções auxiliares de parsing e de formatação (os valores ficam numéricos até a formatação final)
+# from data_parsing import parse_financial_value, formatar_reais, formatar_percentuais, extrair_metadados_fatura
 
 
 def generate_extrato_summary(inputs_df: pd.DataFrame, outputs_df: pd.DataFrame) -> pd.DataFrame:
@@ -13,107 +13,165 @@ def generate_extrato_summary(inputs_df: pd.DataFrame, outputs_df: pd.DataFrame)
     Gera um resumo consolidado das entradas e saídas do extrato por categoria específica,
     incluindo totais e percentuais.
     """
-    summary_data = []
+    return formatar_resumo_extrato(totais_extrato_por_categoria(inputs_df, outputs_df))
 
-    if not inputs_df.empty:
-        inputs_by_specific_category = inputs_df.groupby('specific_category')['value'].sum().reset_index()
-        inputs_by_specific_category.rename(columns={'value': 'Total'}, inplace=True)
-        inputs_by_specific_category['Tipo'] = 'Entrada'
-        summary_data.append(inputs_by_specific_category)
-
-    if not outputs_df.empty:
-        outputs_by_specific_category = outputs_df.groupby('specific_category')['value'].sum().reset_index()
-        outputs_by_specific_category.rename(columns={'value': 'Total'}, inplace=True)
-        outputs_by_specific_category['Tipo'] = 'Saída'
-        summary_data.append(outputs_by_specific_category)
-
-    if not summary_data:
-        return pd.DataFrame({"Categoria": [], "Entrada": [], "Saída": [], "Total": [], "% do Total de Entrada": [], "% do Total de Saída": []})
-    
-    full_summary = pd.concat(summary_data, ignore_index=True)
-    pivot_summary = full_summary.pivot_table(index='specific_category', columns='Tipo', values='Total', aggfunc='sum', fill_value=0)
-    pivot_summary.columns.name = None
-    pivot_summary.index.name = 'Categoria'
-
-    total_inputs_overall = pivot_summary['Entrada'].sum()
-    total_outputs_overall = pivot_summary['Saída'].sum()
+def totais_extrato_por_categoria(inputs_df: pd.DataFrame, outputs_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Somas numéricas por categoria específica ('Categoria'), sempre com as colunas 'Entrada' e 'Saída'
+    (zero para o tipo sem transações). Uma única passada de agrupamento: cada linha recebe o código
+    (categoria, tipo) e np.bincount soma todos os grupos de uma vez; o reshape faz o papel do unstack.
+    Só entram as categorias presentes, em ordem alfabética como no pivot_table sobre strings, também quando
+    specific_category é Categorical (categorize_batch), cuja ordem de declaração não é alfabética.
+    São somas: as de lotes diferentes se combinam com DataFrame.add (ver AgregadosAnalise).
+    """
+    frames = [df for df in (inputs_df, outputs_df) if not df.empty]
+    if not frames:
+        return pd.DataFrame()
+
+    categories = pd.concat([df['specific_category'] for df in frames], ignore_index=True)
+    values = np.concatenate([df['value'].to_numpy(dtype=np.float64) for df in frames])
+    is_output = np.repeat([0, 1], [len(inputs_df), len(outputs_df)]) # Tipo vem do DataFrame de origem
+    if isinstance(categories.dtype, pd.CategoricalDtype): # Saída de categorize_batch: os códigos já existem
+        codes, labels = categories.cat.codes.to_numpy().astype(np.intp), categories.cat.categories
+    else:
+        codes, labels = pd.factorize(categories, sort=True)
+    grouped = codes >= 0 # Sem categoria fica de fora, como em groupby
+    if not grouped.all():
+        codes, values, is_output = codes[grouped], values[grouped], is_output[grouped]
+    values = np.nan_to_num(values) if np.isnan(values).any() else values # NaN não soma
+
+    sums = np.bincount(codes * 2 + is_output, weights=values, minlength=2 * len(labels)).reshape(-1, 2)
+    observed = np.bincount(codes, minlength=len(labels)) > 0
+    totais = pd.DataFrame(sums[observed], index=pd.Index(labels[observed], dtype=object, name='Categoria'), columns=['Entrada', 'Saída'])
+    return _em_ordem_alfabetica(totais) if isinstance(categories.dtype, pd.CategoricalDtype) else totais
+
+def _em_ordem_alfabetica(totais: pd.DataFrame) -> pd.DataFrame:
+    """Linhas na ordem alfabética do índice (categorias Categorical ficariam na ordem de declaração)."""
+    return totais.iloc[np.argsort(totais.index.astype(str).to_numpy(dtype=object), kind='stable')]
+
+def resumo_extrato_numerico(totais: pd.DataFrame) -> pd.DataFrame:
+    """
+    Totais por categoria (totais_extrato_por_categoria) com os percentuais de cada tipo e a linha 'Total Geral',
+    ainda como números; formatar_resumo_extrato faz a formatação para exibição.
+    """
+    summary = totais.astype(np.float64)
+    total_inputs_overall = summary['Entrada'].sum()
+    total_outputs_overall = summary['Saída'].sum()
 
-    pivot_summary['% do Total de Entrada'] = (pivot_summary['Entrada'] / total_inputs_overall * 100).replace([np.inf, -np.inf], 0).fillna(0).apply(lambda x: f"{x:.2f}%") if total_inputs_overall != 0 else '0.00%'
-    pivot_summary['% do Total de Saída'] = (abs(pivot_summary['Saída']) / abs(total_outputs_overall) * 100).replace([np.inf, -np.inf], 0).fillna(0).apply(lambda x: f"{x:.2f}%") if total_outputs_overall != 0 else '0.00%'
+    summary['% do Total de Entrada'] = (summary['Entrada'] / total_inputs_overall * 100).replace([np.inf, -np.inf], 0).fillna(0) if total_inputs_overall != 0 else 0.0
+    summary['% do Total de Saída'] = (abs(summary['Saída']) / abs(total_outputs_overall) * 100).replace([np.inf, -np.inf], 0).fillna(0) if total_outputs_overall != 0 else 0.0
 
-    pivot_summary.loc['Total Geral'] = [
+    summary.loc['Total Geral'] = [
         total_inputs_overall,
         total_outputs_overall,
-        '100.00%',
-        '100.00%'
+        100.0,
+        100.0
     ]
-    # Formatar os totais gerais da linha 'Total Geral'
-    pivot_summary.loc['Total Geral', 'Entrada'] = f"R$ {total_inputs_overall:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')
-    pivot_summary.loc['Total Geral', 'Saída'] = f"R$ {total_outputs_overall:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')
+    return summary
 
-    # Formatar os valores monetários nas colunas 'Entrada' e 'Saída'
+def formatar_resumo_extrato(totais: pd.DataFrame) -> pd.DataFrame:
+    """
+    Resumo do extrato para exibição: resumo_extrato_numerico com valores em R$ e percentuais formatados,
+    uma vez por coluna.
+    """
+    if totais.empty:
+        return pd.DataFrame({"Categoria": [], "Entrada": [], "Saída": [], "Total": [], "% do Total de Entrada": [], "% do Total de Saída": []})
+    summary = resumo_extrato_numerico(totais)
     for col in ['Entrada', 'Saída']:
-        if col in pivot_summary.columns:
-            # Não formatar a linha 'Total Geral' novamente se já formatada
-            pivot_summary[col] = pivot_summary[col].apply(lambda x: f"R$ {x:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',') if isinstance(x, (float, int)) else x)
-    
-    return pivot_summary
+        summary[col] = formatar_reais(summary[col])
+    for col in ['% do Total de Entrada', '% do Total de Saída']:
+        summary[col] = formatar_percentuais(summary[col])
+    return summary
 
-def generate_fatura_summary(card_transactions_df: pd.DataFrame, card_credits_df: pd.DataFrame, text_content: str) -> pd.DataFrame:
+def benchmark_resumo_extrato(n: int = 1_000_000, categorias: int = 20, repeticoes: int = 3) -> dict[str, float]:
+    """
+    Compara totais_extrato_por_categoria com a versão anterior (um groupby por tipo, concat e pivot_table)
+    em n transações sintéticas e mede generate_extrato_summary completo.
+    """
+    import time
+
+    aleatorio = np.random.default_rng(42)
+    nomes = [f'Categoria {i}' for i in range(categorias)]
+    valores = np.round(aleatorio.choice([-1, 1], n) * aleatorio.gamma(0.8, 400, n), 2)
+    transactions = pd.DataFrame({
+        'specific_category': pd.Categorical.from_codes(aleatorio.integers(categorias, size=n), categories=nomes),
+        'value': valores,
+    })
+    inputs_df, outputs_df = transactions[valores >= 0], transactions[valores < 0]
+
+    def anterior(inputs_df, outputs_df):
+        partes = []
+        for df, tipo in [(inputs_df, 'Entrada'), (outputs_df, 'Saída')]:
+            por_categoria = df.groupby('specific_category', observed=True)['value'].sum().reset_index()
+            por_categoria.rename(columns={'value': 'Total'}, inplace=True)
+            por_categoria['Tipo'] = tipo
+            partes.append(por_categoria)
+        return pd.concat(partes, ignore_index=True).pivot_table(
+            index='specific_category', columns='Tipo', values='Total', aggfunc='sum', fill_value=0, observed=True
+        )
+
+    medicoes = {}
+    for nome, funcao in [('anterior', anterior), ('groupby_unico', totais_extrato_por_categoria), ('resumo_completo', generate_extrato_summary)]:
+        melhor = float('inf')
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao(inputs_df, outputs_df)
+            melhor = min(melhor, time.perf_counter() - inicio)
+        medicoes[f'{nome}_s'] = melhor
+    # A versão anterior segue a ordem de declaração das categorias: compara alinhando pelo nome
+    esperado, obtido = anterior(inputs_df, outputs_df), totais_extrato_por_categoria(inputs_df, outputs_df)
+    esperado.index = esperado.index.astype(object)
+    medicoes['divergencias'] = int((~np.isclose(esperado.loc[obtido.index].to_numpy(), obtido.to_numpy())).sum())
+    print(f"Resumo do extrato ({n}): anterior {medicoes['anterior_s']:.3f}s | groupby único {medicoes['groupby_unico_s']:.3f}s | "
+          f"com formatação {medicoes['resumo_completo_s']:.3f}s | divergências: {medicoes['divergencias']}")
+    return medicoes
+
+def generate_fatura_summary(card_transactions_df: pd.DataFrame, card_credits_df: pd.DataFrame, fatura_metadata: dict | str) -> pd.DataFrame:
     """
     Gera um resumo da fatura de cartão de crédito, incluindo valores principais,
     limites e agrupamento de compras por categoria de gasto.
+    :param fatura_metadata: Registro de extrair_metadados_fatura/consolidar_metadados_fatura, lido na ingestão
+        de cada fatura; um texto é lido na hora com extrair_metadados_fatura.
     """
     summary_list = []
+    if not isinstance(fatura_metadata, dict):
+        fatura_metadata = extrair_metadados_fatura(fatura_metadata)
 
-    # Importa a função de parsing de valor
-    # from data_parsing import parse_financial_value, parse_date_string # Certifique-se de que estão acessíveis
-    
-    # Extrair valores principais da fatura do texto completo
-    total_fatura_match = re.search(r'Valor da fatura:\s*R\$?\s*([\d\.,]+)', text_content, re.IGNORECASE)
-    vencimento_fatura_match = re.search(r'Vencimento:\s*(\d{2}/\d{2}/\d{4}|\d{1,2}\s+de\s+\w+)', text_content, re.IGNORECASE)
-    limite_total_match = re.search(r'Limite total:\s*R\$?\s*([\d\.,]+)', text_content, re.IGNORECASE)
-    limite_disponivel_match = re.search(r'Disponível\s*R\$?\s*([\d\.,]+)', text_content, re.IGNORECASE)
-    parcelamento_info_match = re.search(r'(?:Parcelamento em \dx|Entrada \+ \dx de R\$?\s*[\d\.,]+).*?(?:R\$?\s*([\d\.,]+))', text_content, re.IGNORECASE | re.DOTALL) # Tenta pegar o valor do parcelamento
-
-
-    total_fatura_value = parse_financial_value(total_fatura_match.group(1)) if total_fatura_match else None
-    vencimento_fatura_date = parse_date_string(vencimento_fatura_match.group(1)) if vencimento_fatura_match else "Não Identificado"
+    total_fatura_value = fatura_metadata['valor_fatura']
+    vencimento_fatura_date = fatura_metadata['vencimento']
     
     # Se a data de vencimento for datetime, formatar
     vencimento_fatura_display = vencimento_fatura_date.strftime('%d/%m/%Y') if isinstance(vencimento_fatura_date, datetime) else "Não Identificado"
 
-    limite_total_value = parse_financial_value(limite_total_match.group(1)) if limite_total_match else None
-    limite_disponivel_value = parse_financial_value(limite_disponivel_match.group(1)) if limite_disponivel_match else None
+    limite_total_value = fatura_metadata['limite_total']
+    limite_disponivel_value = fatura_metadata['limite_disponivel']
     
-    parcelamento_val = parse_financial_value(parcelamento_info_match.group(1)) if parcelamento_info_match else None
-    parcelamento_info_display = f"Entrada + parcelas (aprox. R$ {parcelamento_val:,.2f})".replace('.', '#').replace(',', '.').replace('#', ',') if parcelamento_val is not None else "Não detectado"
+    parcelamento_val = fatura_metadata['parcelamento']
+    parcelamento_info_display = f"Entrada + parcelas (aprox. {formatar_reais(parcelamento_val)})" if parcelamento_val is not None else "Não detectado"
 
 
-    summary_list.append({"Métrica": "Valor Total da Fatura (Vencimento)", "Valor": f"R$ {total_fatura_value:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',') if total_fatura_value is not None else "Não Identificado"})
+    summary_list.append({"Métrica": "Valor Total da Fatura (Vencimento)", "Valor": formatar_reais(total_fatura_value) if total_fatura_value is not None else "Não Identificado"})
     summary_list.append({"Métrica": "Data de Vencimento", "Valor": vencimento_fatura_display})
-    summary_list.append({"Métrica": "Limite Total do Cartão", "Valor": f"R$ {limite_total_value:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',') if limite_total_value is not None else "Não Identificado"})
-    summary_list.append({"Métrica": "Limite Disponível do Cartão", "Valor": f"R$ {limite_disponivel_value:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',') if limite_disponivel_value is not None else "Não Identificado"})
+    summary_list.append({"Métrica": "Limite Total do Cartão", "Valor": formatar_reais(limite_total_value) if limite_total_value is not None else "Não Identificado"})
+    summary_list.append({"Métrica": "Limite Disponível do Cartão", "Valor": formatar_reais(limite_disponivel_value) if limite_disponivel_value is not None else "Não Identificado"})
     summary_list.append({"Métrica": "Informações de Parcelamento/Rotativo", "Valor": parcelamento_info_display})
 
 
     total_card_purchases = card_transactions_df['value'].sum() if not card_transactions_df.empty else 0
     total_card_credits_sum = card_credits_df['value'].sum() if not card_credits_df.empty else 0
     
-    summary_list.append({"Métrica": "Total de Compras/Débitos (Fatura)", "Valor": f"R$ {total_card_purchases:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')})
-    summary_list.append({"Métrica": "Total de Créditos/Pagamentos (Fatura)", "Valor": f"R$ {total_card_credits_sum:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')})
+    summary_list.append({"Métrica": "Total de Compras/Débitos (Fatura)", "Valor": formatar_reais(total_card_purchases)})
+    summary_list.append({"Métrica": "Total de Créditos/Pagamentos (Fatura)", "Valor": formatar_reais(total_card_credits_sum)})
 
     if not card_transactions_df.empty:
-        purchases_by_category = card_transactions_df.groupby('specific_category')['value'].sum().reset_index()
+        purchases_by_category = _em_ordem_alfabetica(card_transactions_df.groupby('specific_category', observed=True)[['value']].sum()).reset_index()
         total_purchases_abs = abs(purchases_by_category['value'].sum())
 
         summary_list.append({"Métrica": "#### Gastos por Categoria (Cartão)", "Valor": ""})
-        for _, row in purchases_by_category.iterrows():
-            percent = (abs(row['value']) / total_purchases_abs * 100) if total_purchases_abs != 0 else 0
-            summary_list.append({
-                "Métrica": f"- {row['specific_category']}",
-                "Valor": f"R$ {row['value']:,.2f} ({percent:.2f}%)".replace('.', '#').replace(',', '.').replace('#', ',')
-            })
+        percent = (purchases_by_category['value'].abs() / total_purchases_abs * 100) if total_purchases_abs != 0 else pd.Series(0.0, index=purchases_by_category.index)
+        metricas = "- " + purchases_by_category['specific_category'].astype(str)
+        valores = formatar_reais(purchases_by_category['value']) + " (" + formatar_percentuais(percent, separador_decimal=',') + ")"
+        summary_list.extend({"Métrica": metrica, "Valor": valor} for metrica, valor in zip(metricas, valores))
             
     return pd.DataFrame(summary_list)
 
@@ -133,13 +191,13 @@ def generate_general_financial_summary(inputs_extrato_df: pd.DataFrame, outputs_
     total_overall_outputs = total_extrato_outputs + total_card_expenditures
 
     summary_list = [
-        {"Métrica": "Total de Entradas (Extrato)", "Valor": f"R$ {total_extrato_inputs:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')},
-        {"Métrica": "Total de Saídas (Extrato)", "Valor": f"R$ {total_extrato_outputs:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')},
-        {"Métrica": "Saldo Líquido da Conta (Extrato)", "Valor": f"R$ {net_extrato_balance:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')},
-        {"Métrica": "Total de Compras/Débitos (Fatura Cartão)", "Valor": f"R$ {total_card_expenditures:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')},
-        {"Métrica": "Total de Créditos/Pagamentos (Fatura Cartão)", "Valor": f"R$ {total_card_credits_sum:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')},
-        {"Métrica": "Total Consolidado de Saídas (Extrato + Cartão)", "Valor": f"R$ {total_overall_outputs:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')},
-        {"Métrica": "Saldo Geral Consolidado (Entradas Extrato - Saídas Consolidadas)", "Valor": f"R$ {(total_extrato_inputs + total_overall_outputs):,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')}
+        {"Métrica": "Total de Entradas (Extrato)", "Valor": formatar_reais(total_extrato_inputs)},
+        {"Métrica": "Total de Saídas (Extrato)", "Valor": formatar_reais(total_extrato_outputs)},
+        {"Métrica": "Saldo Líquido da Conta (Extrato)", "Valor": formatar_reais(net_extrato_balance)},
+        {"Métrica": "Total de Compras/Débitos (Fatura Cartão)", "Valor": formatar_reais(total_card_expenditures)},
+        {"Métrica": "Total de Créditos/Pagamentos (Fatura Cartão)", "Valor": formatar_reais(total_card_credits_sum)},
+        {"Métrica": "Total Consolidado de Saídas (Extrato + Cartão)", "Valor": formatar_reais(total_overall_outputs)},
+        {"Métrica": "Saldo Geral Consolidado (Entradas Extrato - Saídas Consolidadas)", "Valor": formatar_reais(total_extrato_inputs + total_overall_outputs)}
     ]
 
     df_summary = pd.DataFrame(summary_list)
@@ -161,8 +219,8 @@ def generate_general_financial_summary(inputs_extrato_df: pd.DataFrame, outputs_
     total_pix_recebido = inputs_extrato_df[inputs_extrato_df['specific_category'] == 'PIX Recebido']['value'].sum() if not inputs_extrato_df.empty else 0
     total_pix_enviado = outputs_extrato_df[outputs_extrato_df['specific_category'] == 'PIX Enviado']['value'].sum() if not outputs_extrato_df.empty else 0
 
-    df_summary.loc[len(df_summary)] = {"Métrica": "Total PIX Recebido", "Valor": f"R$ {total_pix_recebido:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')}
-    df_summary.loc[len(df_summary)] = {"Métrica": "Total PIX Enviado", "Valor": f"R$ {total_pix_enviado:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')}
-    df_summary.loc[len(df_summary)] = {"Métrica": "Saldo Líquido de PIX", "Valor": f"R$ {(total_pix_recebido + total_pix_enviado):,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')}
+    df_summary.loc[len(df_summary)] = {"Métrica": "Total PIX Recebido", "Valor": formatar_reais(total_pix_recebido)}
+    df_summary.loc[len(df_summary)] = {"Métrica": "Total PIX Enviado", "Valor": formatar_reais(total_pix_enviado)}
+    df_summary.loc[len(df_summary)] = {"Métrica": "Saldo Líquido de PIX", "Valor": formatar_reais(total_pix_recebido + total_pix_enviado)}
 
     return df_summary
\ No newline at end of file
@@ -0,0 +1,115 @@
+# AgregadosAnalise (análise incremental) contra as funções de análise aplicadas a todas as transações de uma vez.
+# Os módulos de attached_assets dependem uns dos outros pelo namespace da sessão, então são executados em sequência
+# em um namespace comum.
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+_ASSETS = Path(__file__).resolve().parent.parent / 'attached_assets'
+_MODULOS = ('config', 'data_parsing', 'categorization_logic', 'financial_analysis', 'report_generation')
+_TEXTO_FATURA = 'Limite total: R$ 5.000,00\nPagamento mínimo ou parcial'
+
+
+@pytest.fixture(scope='module')
+def sessao():
+    namespace = {'__name__': 'sessao'}
+    for prefixo in _MODULOS:
+        caminho = next(_ASSETS.glob(f'{prefixo}_*.py'))
+        exec(compile(caminho.read_text(encoding='utf-8'), str(caminho), 'exec'), namespace)
+    return namespace
+
+
+def _documento(linhas: list[tuple]) -> pd.DataFrame:
+    return pd.DataFrame([
+        {'date': pd.Timestamp(data) if data else None, 'description': descricao, 'value': valor, 'currency': 'BRL',
+         'doc_type': doc_type, 'original_type_op': 'PIX'}
+        for data, descricao, valor, doc_type in linhas
+    ])
+
+
+def _documento_aleatorio(semente: int, n: int) -> pd.DataFrame:
+    aleatorio = np.random.default_rng(semente)
+    palavras = ['PIX RECEBIDO', 'PIX ENVIADO', 'IFOOD', 'UBER', 'BET365', 'ESTORNO LOJA', 'PAGAMENTO FATURA',
+                'SUPERMERCADO', 'FARMACIA', 'NETFLIX', 'salario', 'betano pix']
+    datas = pd.Timestamp('2024-01-01') + pd.to_timedelta(aleatorio.integers(0, 90 * 24 * 60, n), unit='min')
+    return pd.DataFrame({
+        'date': datas,
+        'description': [palavras[i] + f' {i % 5}' for i in aleatorio.integers(len(palavras), size=n)],
+        'value': np.round(aleatorio.choice([-1, 1], n) * aleatorio.gamma(1.2, 400, n), 2),
+        'currency': 'BRL',
+        'doc_type': aleatorio.choice(['extrato_bancario', 'fatura_cartao'], n, p=[0.7, 0.3]),
+        'original_type_op': 'PIX',
+    })
+
+
+def _documentos() -> list[pd.DataFrame]:
+    return [
+        _documento([
+            ('2024-03-01 02:15', 'PIX Bet365 deposito', -150.0, 'extrato_bancario'),
+            ('2024-03-01 10:00', 'Salario empresa', 5000.0, 'extrato_bancario'),
+            ('2024-03-02 11:00', 'Supermercado', -320.5, 'extrato_bancario'),
+            ('2024-03-03 12:00', 'IFOOD', -60.0, 'fatura_cartao'),
+        ]),
+        # Documento inteiro sem datas: apostas entram com DATA 'N/I'
+        _documento([
+            (None, 'Pagamento Blaze apostas', -200.0, 'extrato_bancario'),
+            (None, 'Farmacia', -45.9, 'extrato_bancario'),
+        ]),
+        _documento_aleatorio(1, 400),
+        _documento([
+            ('2024-03-05 03:40', 'Betano pix', -500.0, 'extrato_bancario'),
+            ('2024-03-05 09:00', 'PIX recebido Fulano', 1200.0, 'extrato_bancario'),
+            (None, 'Pagamento fatura', 800.0, 'fatura_cartao'),
+        ]),
+    ]
+
+
+def _resultados_reconstruidos(sessao, transacoes: pd.DataFrame, metadados: dict) -> dict:
+    contexto = sessao['ContextoAnalise'](transacoes)
+    entradas, saidas, _, _ = contexto.transacoes_categorizadas()
+    return {
+        'apostas': sessao['detectar_apostas_aprimorado'](contexto),
+        'suspeitas': sessao['detectar_movimentacoes_suspeitas'](contexto) + sessao['detectar_padroes_janelas'](contexto),
+        'risco': sessao['analyze_risk'](contexto, metadados),
+        'resumo': sessao['generate_extrato_summary'](entradas, saidas),
+        'mensal': sessao['group_by_month'](contexto.df),
+        'score': sessao['calculate_score'](contexto.df.loc[contexto.extrato, ['value']]),
+    }
+
+
+def _resultados_incrementais(sessao, agregados, metadados: dict) -> dict:
+    return {
+        'apostas': list(agregados.apostas),
+        'suspeitas': agregados.movimentacoes_suspeitas(),
+        'risco': agregados.indicadores_risco(metadados),
+        'resumo': sessao['formatar_resumo_extrato'](agregados.totais_categoria),
+        'mensal': agregados.resumo_mensal(),
+        'score': agregados.score(),
+    }
+
+
+def test_incremental_igual_a_reconstrucao_documento_a_documento(sessao):
+    metadados = sessao['extrair_metadados_fatura'](_TEXTO_FATURA)
+    agregados = sessao['AgregadosAnalise']()
+    lotes = []
+    for documento in _documentos():
+        # Como FinancialAnalysisSystem._update_aggregates: o índice do lote continua a numeração global
+        lote = documento.set_axis(pd.RangeIndex(sum(map(len, lotes)), sum(map(len, lotes)) + len(documento)))
+        lotes.append(lote)
+        agregados.incorporar(sessao['ContextoAnalise'](lote))
+
+        esperado = _resultados_reconstruidos(sessao, pd.concat(lotes), metadados)
+        obtido = _resultados_incrementais(sessao, agregados, metadados)
+        assert obtido['apostas'] == esperado['apostas']
+        assert obtido['suspeitas'] == esperado['suspeitas']
+        assert obtido['risco'] == esperado['risco']
+        pd.testing.assert_frame_equal(obtido['resumo'], esperado['resumo'], check_index_type=False)
+        assert obtido['mensal'].keys() == esperado['mensal'].keys()
+        for mes, totais in esperado['mensal'].items():
+            assert obtido['mensal'][mes] == pytest.approx(totais)
+        assert obtido['score'] == esperado['score']
+
+    assert any(aposta['DATA'] == 'N/I' for aposta in agregados.apostas)
@@ -0,0 +1,89 @@
+# Testes de categorization_logic. Os módulos de attached_assets dependem uns dos outros pelo namespace da
+# sessão (os imports entre eles ficam comentados), então são executados em sequência em um namespace comum.
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+_ASSETS = Path(__file__).resolve().parent.parent / 'attached_assets'
+_MODULOS = ('config', 'categorization_logic')
+
+
+@pytest.fixture
+def sessao():
+    # Um namespace por teste: os testes alteram as tabelas de regras
+    namespace = {'__name__': 'sessao'}
+    for prefixo in _MODULOS:
+        caminho = next(_ASSETS.glob(f'{prefixo}_*.py'))
+        exec(compile(caminho.read_text(encoding='utf-8'), str(caminho), 'exec'), namespace)
+    return namespace
+
+
+def _categorias(sessao, descricao: str) -> tuple[str, str, str]:
+    """Categoria pelo autômato, pelo cache e pela varredura de referência."""
+    return (sessao['categorizar_transacao_granular'](descricao), sessao['_CACHE_CATEGORIAS'].categorizar(descricao),
+            sessao['_categorizar_transacao_granular_por_varredura'](descricao))
+
+
+def test_termo_acrescentado_a_uma_categoria(sessao):
+    assert _categorias(sessao, 'zzfoo') == ('Outros/Diversos',) * 3
+    versao = sessao['versao_regras_categorizacao']()
+    sessao['CATEGORIAS_GRANULARES']['Alimentação'].append('zzfoo')
+    assert _categorias(sessao, 'zzfoo') == ('Alimentação',) * 3
+    assert sessao['versao_regras_categorizacao']() != versao
+
+
+def test_termo_trocado_sem_mudar_tamanhos(sessao):
+    sessao['categorizar_transacao_granular']('xpto')
+    sessao['CATEGORIAS_GRANULARES']['Educação'][0] = 'xpto'
+    assert _categorias(sessao, 'xpto') == ('Educação',) * 3
+
+
+def test_categoria_nova_nao_colide_com_os_bits_das_processadoras(sessao):
+    sessao['categorizar_transacao_granular']('yyterm')
+    sessao['CATEGORIAS_GRANULARES']['Nova Categoria'] = ['yyterm']
+    assert _categorias(sessao, 'yyterm') == ('Nova Categoria',) * 3
+    assert _categorias(sessao, 'stone') == ('Serviços Essenciais e Contas',) * 3
+    categorias = sessao['categorize_batch'](pd.Series(['yyterm', 'ifood', None]))
+    assert list(categorias) == ['Nova Categoria', 'Alimentação', 'Outros/Diversos']
+
+
+def test_site_de_apostas_acrescentado(sessao):
+    sessao['categorizar_transacao_granular']('novabet')
+    sessao['SITES_APOSTAS'].append('novabet')
+    assert _categorias(sessao, 'novabet') == ('Apostas e Jogos de Azar',) * 3
+
+
+@pytest.mark.parametrize('descricao, categoria', [
+    ('blaze', 'Apostas e Jogos de Azar'),
+    ('aposta online', 'Apostas e Jogos de Azar'),
+    # Processadora sem site de apostas: o termo genérico de aposta não vale
+    ('cielo aposta', 'Serviços Essenciais e Contas'),
+    ('Pagamento Blaze apostas', 'Serviços Essenciais e Contas'),
+    ('cielo aposta restaurante', 'Alimentação'),
+    ('stone', 'Serviços Essenciais e Contas'),
+    # Processadora com site de apostas explícito
+    ('cielo blaze', 'Apostas e Jogos de Azar'),
+    ('getnet stake', 'Apostas e Jogos de Azar'),
+    # Sem processadora, vence a primeira categoria na ordem de CATEGORIAS_GRANULARES
+    ('restaurante blaze', 'Alimentação'),
+    ('pix bet365', 'Taxas e Juros (Extrato/Fatura)'),
+    ('xyz', 'Outros/Diversos'),
+])
+def test_precedencia_processadoras_e_apostas(sessao, descricao, categoria):
+    assert _categorias(sessao, descricao) == (categoria,) * 3
+
+
+def test_automato_igual_a_varredura(sessao):
+    # Cada termo isolado e combinações de termos de tabelas diferentes (termos sobrepostos, processadoras e sites)
+    termos = sorted({termo for termos in sessao['_tabela_categorias']().values() for termo in termos}
+                    | set(sessao['PROCESSADORAS_PAGAMENTO_NAO_APOSTA']) | set(sessao['SITES_APOSTAS']))
+    aleatorio = np.random.default_rng(42)
+    descricoes = termos + [' '.join(aleatorio.choice(termos, size=aleatorio.integers(2, 5))) for _ in range(3000)]
+    descricoes += [descricao.upper() + ' 123' for descricao in descricoes[:200]]
+
+    varredura = [sessao['_categorizar_transacao_granular_por_varredura'](descricao) for descricao in descricoes]
+    assert [sessao['categorizar_transacao_granular'](descricao) for descricao in descricoes] == varredura
+    assert list(sessao['categorize_batch'](pd.Series(descricoes))) == varredura
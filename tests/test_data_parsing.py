@@ -0,0 +1,91 @@
+# Testes de data_parsing. Os módulos de attached_assets têm nomes com timestamp (células do
+# Code Interpreter), então são carregados pelo caminho do arquivo.
+
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+_ASSETS = Path(__file__).resolve().parent.parent / 'attached_assets'
+
+
+def _carregar(prefixo: str):
+    caminho = next(_ASSETS.glob(f'{prefixo}_*.py'))
+    spec = importlib.util.spec_from_file_location(prefixo, caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+@pytest.fixture(scope='module')
+def data_parsing():
+    return _carregar('data_parsing')
+
+
+@pytest.mark.parametrize('valor', ['01/01/1500', '31/12/9999', '0001-01-02', '01/01/0202', '02', 'mar', '13sep'])
+def test_parse_date_series_fora_do_intervalo_vira_nat(data_parsing, valor):
+    datas = pd.Series([valor, '15/03/2024'])
+    resultado = data_parsing.parse_date_series(datas, current_year=2024)
+    assert resultado.dtype == 'datetime64[ns]'
+    assert pd.isna(resultado.iloc[0])
+    assert resultado.iloc[1] == pd.Timestamp(2024, 3, 15)
+
+
+def test_parse_date_series_coluna_mista(data_parsing):
+    datas = pd.Series(['15/03/2024', '2024-03-16', '17/03', None, '', '01/01/1500'])
+    resultado = data_parsing.parse_date_series(datas, current_year=2024)
+    esperado = [pd.Timestamp(2024, 3, 15), pd.Timestamp(2024, 3, 16), pd.Timestamp(2024, 3, 17)]
+    assert resultado.iloc[:3].tolist() == esperado
+    assert resultado.iloc[3:].isna().all()
+
+
+# Casos difíceis para parse_financial_values: separadores dos dois padrões, sinais unicode, moedas, texto em
+# volta, precisão além de float64, dígitos não ASCII e células que não são texto
+_CORPUS_VALORES = [
+    'R$ 1.234,56', 'R$ -1.234,56', '-R$ 20.000,00', '1,234.56', '1.234.567,89', '1,234,567.89', '123,45', '123.45',
+    '1,234,567', '1.234', '−50,00', '–50,00', 'US$ 10.50', '15%', '15,5 %', '  R$ 0,99  ', '', '   ', '-', 'abc',
+    '1.2.3', '--5', '5-', ',50', '.50', '1.', 'R$ 1.234,56 D', 'Saldo R$ 5.851,34', '12345678901234567890,123456',
+    '0,1234567890123456789', '9.876.543,210987654321', '١٢٣,٤٥',
+    42, 3.5, -7, float('nan'), None, True,
+]
+
+
+def _valor_escalar(data_parsing, valor) -> float:
+    resultado = data_parsing.parse_financial_value(valor)
+    return np.nan if resultado is None else resultado
+
+
+@pytest.mark.parametrize('valor', _CORPUS_VALORES, ids=repr)
+def test_parse_financial_values_igual_ao_escalar(data_parsing, valor):
+    resultado = data_parsing.parse_financial_values(pd.Series([valor], dtype=object))
+    np.testing.assert_array_equal(resultado, [_valor_escalar(data_parsing, valor)])
+
+
+def test_parse_financial_values_coluna_com_todo_o_corpus(data_parsing):
+    # Na mesma coluna, os casos passam juntos pelos mesmos caminhos vetorizados
+    resultado = data_parsing.parse_financial_values(pd.Series(_CORPUS_VALORES, dtype=object))
+    np.testing.assert_array_equal(resultado, [_valor_escalar(data_parsing, valor) for valor in _CORPUS_VALORES])
+
+
+_VALORES_FORMATACAO = [0.0, -0.0, 0.005, 0.015, 0.125, 2.675, 999.995, -7261.315, 1_000.0, -1_234_567.89, 1e-300, -1e-10,
+                       45035996273704.96, 1e15, -1e15 + 0.005, 1e16, 1.5e17, 1e20, float('nan'), float('inf'), float('-inf')]
+
+
+def _reais_f_string(x: float) -> str:
+    return f"R$ {x:,.2f}".translate(str.maketrans(',.', '.,'))
+
+
+@pytest.mark.parametrize('valor', _VALORES_FORMATACAO, ids=repr)
+def test_formatar_reais_escalar_igual_a_coluna(data_parsing, valor):
+    coluna = data_parsing.formatar_reais(pd.Series([valor, 1.0]))
+    assert data_parsing.formatar_reais(valor) == coluna.iloc[0] == _reais_f_string(valor)
+    assert data_parsing.formatar_percentuais(valor, ',') == data_parsing.formatar_percentuais(pd.Series([valor]), ',').iloc[0]
+
+
+def test_formatar_reais_coluna_igual_a_f_string(data_parsing):
+    # Valores com 3 casas caem perto de meio centavo, onde round(|x| * 100) pode divergir do valor binário exato
+    aleatorio = np.random.default_rng(0)
+    valores = np.concatenate([np.round(aleatorio.uniform(-1e4, 1e4, 20_000), 3), aleatorio.uniform(-1e9, 1e9, 5_000)])
+    assert data_parsing.formatar_reais(valores).tolist() == [_reais_f_string(x) for x in valores]
@@ -0,0 +1,56 @@
+# Testes de dataframe_parsers. Os módulos de attached_assets dependem uns dos outros pelo namespace da
+# sessão (os imports entre eles ficam comentados), então são executados em sequência em um namespace comum.
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+_ASSETS = Path(__file__).resolve().parent.parent / 'attached_assets'
+_MODULOS = ('config', 'data_parsing', 'bank_specific_parsers', 'dataframe_parsers')
+
+
+@pytest.fixture(scope='module')
+def sessao():
+    namespace = {'__name__': 'sessao'}
+    for prefixo in _MODULOS:
+        caminho = next(_ASSETS.glob(f'{prefixo}_*.py'))
+        exec(compile(caminho.read_text(encoding='utf-8'), str(caminho), 'exec'), namespace)
+    return namespace
+
+
+_PARSERS = ['process_dataframe_generic', 'process_nubank_extrato_csv', 'process_nubank_fatura_csv',
+            'process_inter_extrato_csv', 'process_inter_fatura_csv', 'process_caixa_extrato_csv',
+            'process_picpay_fatura_csv']
+_COLUNAS = ['Data', 'Data Mov.', 'Data da transação', 'Histórico', 'Descrição', 'Estabelecimento',
+            'Identificador', 'Tipo', 'Valor', 'Débito', 'Crédito']
+
+
+@pytest.mark.parametrize('parser', _PARSERS)
+@pytest.mark.parametrize('linhas', [0, 3])
+def test_colunas_float_vazias_ou_so_nan(sessao, parser, linhas):
+    # Colunas vazias ou só com NaN chegam como float (ex.: planilha sem linhas, pd.read_csv de colunas em branco)
+    df = pd.DataFrame({coluna: np.full(linhas, np.nan) for coluna in _COLUNAS})
+    resultado = sessao[parser](df, 'extrato_bancario')
+    assert resultado.empty
+    assert list(resultado.columns) == sessao['COLUNAS_TRANSACAO']
+
+
+@pytest.mark.parametrize('colunas', [('Data', 'Histórico', 'Valor'), ('Data', 'Descrição', 'Valor', 'Tipo')])
+def test_colunas_genericas_nao_escolhem_parser_de_banco(sessao, colunas):
+    tabela = pd.DataFrame(columns=list(colunas))
+    for doc_type in ('desconhecido', 'extrato_bancario', 'fatura_cartao'):
+        assert sessao['selecionar_parser']('csv', doc_type, 'Desconhecido', table=tabela) is None
+
+
+def test_parser_pelo_banco_detectado(sessao):
+    tabela = pd.DataFrame(columns=['Data', 'Descrição', 'Valor', 'Tipo'])
+    parser = sessao['selecionar_parser']('csv', 'fatura_cartao', 'PicPay', table=tabela)
+    assert parser['nome'] == 'PicPay Fatura CSV'
+
+
+def test_colunas_nao_trocam_o_doc_type_detectado(sessao):
+    tabela = pd.DataFrame(columns=['Data da transação', 'Estabelecimento', 'Valor'])
+    assert sessao['selecionar_parser']('csv', 'desconhecido', 'Desconhecido', table=tabela)['nome'] == 'Nubank Fatura CSV'
+    assert sessao['selecionar_parser']('csv', 'extrato_bancario', 'Desconhecido', table=tabela) is None